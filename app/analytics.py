@@ -0,0 +1,183 @@
+"""
+Savollar tahlili (item analysis) — bitta guruhlangan SQL so‘rovda.
+
+Har bir savol uchun:
+- qiyinlik: to‘g‘ri javoblar ulushi;
+- variantlar taqsimoti (A/B/C/D — distraktorlar tahlili);
+- diskriminatsiya: yuqori 27% va quyi 27% urinishlar (ball bo‘yicha)
+  to‘g‘ri javob ulushlari farqi.
+
+Urinishlar window funksiya bilan tartiblanadi, `answers` bilan bir marta
+join qilinib `question_id` bo‘yicha guruhlanadi — savol boshiga alohida so‘rov yo‘q,
+og‘ir ish bazada (async drayver orqali) bajariladi. Arxivdagi urinishlar
+(archive.py) reytingda birga, javoblari esa blob'dan thread'da ochilib qo‘shiladi. Natija
+yakunlangan urinishlar soni o‘zgarmaguncha keshda turadi.
+"""
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+
+from sqlalchemy import and_, case, func, select, union_all
+
+from .archive import unpack_answers
+from .cache import LRUCache, TestSnapshot
+from .models import Answer, Attempt, AttemptArchive, FINISHED_STATUSES
+
+GROUP_SHARE = 27  # yuqori/quyi guruh, %
+
+
+@dataclass(frozen=True, slots=True)
+class ItemStats:
+    question_id: int
+    answered: int
+    correct: int
+    chosen: dict[str, int]
+    top_n: int
+    top_correct: int
+    bottom_n: int
+    bottom_correct: int
+
+    @property
+    def difficulty(self) -> float | None:
+        return self.correct / self.answered if self.answered else None
+
+    @property
+    def discrimination(self) -> float | None:
+        if not self.top_n or not self.bottom_n:
+            return None
+        return self.top_correct / self.top_n - self.bottom_correct / self.bottom_n
+
+
+@dataclass(frozen=True, slots=True)
+class TestReport:
+    attempts: int
+    group_size: int
+    items: dict[int, ItemStats]  # question_id -> stats
+
+
+# test_id -> (yakunlangan urinishlar soni, hisobot)
+_reports: LRUCache[int, tuple[int, TestReport]] = LRUCache(maxsize=128)
+
+
+def _sum_if(cond):
+    return func.coalesce(func.sum(case((cond, 1), else_=0)), 0)
+
+
+async def _finished_count(session, test_id: int) -> int:
+    # (test_id, status, id) index bo‘yicha — jadvalga tegmaydi; arxivda esa (test_id, id)
+    q = await session.execute(
+        select(func.count(Attempt.id)).where(
+            Attempt.test_id == test_id, Attempt.status.in_(FINISHED_STATUSES)
+        )
+    )
+    r = await session.execute(select(func.count(AttemptArchive.id)).where(AttemptArchive.test_id == test_id))
+    return int(q.scalar() or 0) + int(r.scalar() or 0)
+
+
+def _add_archived(counts: dict[int, list[int]], rows, k: int, attempts: int) -> None:
+    for rn, blob in rows:
+        in_top, in_bottom = rn <= k, rn > attempts - k
+        for qid, chosen, ok in unpack_answers(blob):
+            c = counts.setdefault(qid, [0] * 10)
+            c[0] += 1
+            c[1] += ok
+            c[2 + "ABCD".index(chosen)] += 1
+            if in_top:
+                c[6] += 1
+                c[7] += ok
+            if in_bottom:
+                c[8] += 1
+                c[9] += ok
+
+
+async def _compute(session, test_id: int, attempts: int) -> TestReport:
+    # reyting issiq va arxivdagi urinishlar bo‘yicha birgalikda
+    scored = union_all(
+        select(Attempt.id, Attempt.score)
+        .where(Attempt.test_id == test_id, Attempt.status.in_(FINISHED_STATUSES)),
+        select(AttemptArchive.id, AttemptArchive.score).where(AttemptArchive.test_id == test_id),
+    ).subquery()
+    ranked = (
+        select(
+            scored.c.id.label("attempt_id"),
+            func.row_number().over(order_by=(scored.c.score.desc(), scored.c.id)).label("rn"),
+        )
+        .subquery()
+    )
+    k = attempts * GROUP_SHARE // 100
+    top = ranked.c.rn <= k
+    bottom = ranked.c.rn > attempts - k
+    correct = Answer.is_correct == True  # noqa: E712
+
+    q = await session.execute(
+        select(
+            Answer.question_id,
+            func.count(),
+            _sum_if(correct),
+            *(_sum_if(Answer.chosen == letter) for letter in "ABCD"),
+            _sum_if(top),
+            _sum_if(and_(top, correct)),
+            _sum_if(bottom),
+            _sum_if(and_(bottom, correct)),
+        )
+        .join(ranked, ranked.c.attempt_id == Answer.attempt_id)
+        .group_by(Answer.question_id)
+    )
+    counts: dict[int, list[int]] = {}
+    for qid, *row in q.all():
+        counts[qid] = list(row)
+
+    # arxivdagi javoblar blob'da: ochish va qo‘shish event loop'dan tashqarida (hisobot keshlanadi)
+    aq = await session.execute(
+        select(ranked.c.rn, AttemptArchive.answers)
+        .join(ranked, ranked.c.attempt_id == AttemptArchive.id)
+        .where(AttemptArchive.test_id == test_id)
+    )
+    archived = aq.all()
+    if archived:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, _add_archived, counts, archived, k, attempts)
+
+    items = {}
+    for qid, (n, ok, a, b, c, d, tn, tc, bn, bc) in counts.items():
+        items[qid] = ItemStats(qid, n, ok, dict(zip("ABCD", (a, b, c, d))), tn, tc, bn, bc)
+    return TestReport(attempts, k, items)
+
+
+async def get_report(session, test_id: int) -> TestReport:
+    attempts = await _finished_count(session, test_id)
+    cached = _reports.get(test_id)
+    if cached and cached[0] == attempts:
+        return cached[1]
+    report = await _compute(session, test_id, attempts)
+    _reports.set(test_id, (attempts, report))
+    return report
+
+
+def _pct(x: float | None) -> str:
+    return "—" if x is None else f"{round(x * 100)}%"
+
+
+def render_report(snap: TestSnapshot, report: TestReport) -> list[str]:
+    """Qatorlar ro‘yxati (xabarlarga bo‘lish chaqiruvchida)."""
+    lines = [
+        f"📈 {snap.public_id} — {snap.title}",
+        f"Yakunlangan urinishlar: {report.attempts} · yuqori/quyi guruh: {report.group_size} tadan",
+        "✅ — qiyinlik (to‘g‘ri javoblar), D — diskriminatsiya, * — to‘g‘ri variant\n",
+    ]
+    for q in snap.questions:
+        item = report.items.get(q.id)
+        if not item:
+            lines.append(f"{q.order_index}. javoblar yo‘q")
+            continue
+        d = item.discrimination
+        dist = ", ".join(
+            f"{letter}{'*' if letter == q.correct else ''} {item.chosen[letter]}" for letter in "ABCD"
+        )
+        warn = " ⚠️" if d is not None and d < 0.2 else ""
+        lines.append(
+            f"{q.order_index}. ✅ {_pct(item.difficulty)} ({item.correct}/{item.answered})"
+            f" · D={'—' if d is None else f'{d:.2f}'}{warn} · {dist}"
+        )
+    return lines
@@ -0,0 +1,245 @@
+"""
+Issiq/sovuq qatlamlar: eski yakunlangan urinishlarni `attempts_archive` ga ko‘chirish.
+
+`answers` jadvalida har urinishning har savoli uchun bitta qator bor, shuning
+uchun u eng tez o‘sadi. `ArchiveJob` `ARCHIVE_AFTER_DAYS` kundan eski yakunlangan
+urinishlarni bo‘laklab (`ARCHIVE_BATCH`) ko‘chiradi:
+
+- urinish `attempts_archive` ga bitta qator bo‘lib tushadi, javoblari esa bitta
+  siqilgan blob'ga (`pack_answers`: savol id delta-varint + 1 bayt, keyin zlib);
+- `answers` va `attempts` dagi qatorlari o‘chiriladi.
+
+Arxivdagi id jonli urinishlar bilan to‘qnashmaydi: SQLite'da `attempts`
+AUTOINCREMENT bilan (m010), o‘chirilgan id qayta berilmaydi.
+
+Har bo‘lak alohida qisqa tranzaksiya. Bo‘laklar orasida pauza bor, shuning uchun
+imtihondagi yozuvlar kutib qolmaydi.
+
+Ko‘chirishdan keyin SQLite'da bo‘shagan sahifalar `PRAGMA incremental_vacuum`
+bilan kichik qadamlarda qaytariladi (to‘liq VACUUM bazani qulflab qo‘yadi).
+Buning uchun bazada `auto_vacuum=INCREMENTAL` bo‘lishi kerak. Yangi bazalarda bu
+avtomatik (db.py). Eski bazaga bir marta, bot to‘xtatilgan holda:
+
+    python -m app.archive --vacuum
+
+PostgreSQL'da joyni autovacuum qaytaradi.
+
+Yig‘ma natijalar arxivdan keyin ham so‘raladi:
+- `test_best`, gistogramma va `user_stats` urinishlarga bog‘liq emas;
+- tarix, "Kimlar ishlagan", savollar tahlili va sertifikat ikkala jadvalni ham o‘qiydi.
+
+Qo‘lda ishga tushirish:  python -m app.archive --once
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import zlib
+from collections import defaultdict
+from datetime import timedelta
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from .models import FINISHED_STATUSES, Answer, Attempt, AttemptArchive
+from .utils import now_utc
+
+log = logging.getLogger(__name__)
+
+_LETTERS = "ABCD"
+_COLUMNS = (
+    "id", "test_id", "telegram_id", "started_at", "finished_at", "score", "total",
+    "percent", "time_spent_sec", "status", "shuffle_seed",
+)
+
+
+# ===================== Packing =====================
+
+def pack_answers(answers) -> bytes:
+    """[(question_id, chosen, is_correct), ...] -> siqilgan bayt."""
+    out = bytearray()
+    prev = 0
+    for question_id, chosen, is_correct in sorted(answers):
+        delta = question_id - prev
+        prev = question_id
+        while delta >= 0x80:
+            out.append((delta & 0x7F) | 0x80)
+            delta >>= 7
+        out.append(delta)
+        out.append(_LETTERS.index(chosen) | (4 if is_correct else 0))
+    return zlib.compress(bytes(out), 9)
+
+
+def unpack_answers(blob: bytes) -> list[tuple[int, str, bool]]:
+    data = zlib.decompress(blob)
+    result = []
+    i = question_id = 0
+    while i < len(data):
+        delta = shift = 0
+        while True:
+            b = data[i]
+            i += 1
+            delta |= (b & 0x7F) << shift
+            shift += 7
+            if b < 0x80:
+                break
+        question_id += delta
+        flags = data[i]
+        i += 1
+        result.append((question_id, _LETTERS[flags & 3], bool(flags & 4)))
+    return result
+
+
+# ===================== Job =====================
+
+class ArchiveJob:
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        sessionmaker,
+        after_days: int,
+        batch_size: int = 500,
+        interval: float = 3600,
+        pause: float = 0.05,
+        vacuum_pages: int = 256,
+    ):
+        self.engine = engine
+        self.sessionmaker = sessionmaker
+        self.after_days = after_days
+        self.batch_size = batch_size
+        self.interval = interval
+        self.pause = pause
+        self.vacuum_pages = vacuum_pages
+
+        self.archived = 0
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                log.exception("Arxivlash xatosi")
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self) -> int:
+        cutoff = now_utc() - timedelta(days=self.after_days)
+        moved = 0
+        while True:
+            n = await self._move_chunk(cutoff)
+            moved += n
+            if n < self.batch_size:
+                break
+            # jonli imtihonlar yozuvchini olishi uchun
+            await asyncio.sleep(self.pause)
+        if moved:
+            self.archived += moved
+            pages = await self._vacuum()
+            log.info("Arxiv: %s ta urinish ko‘chirildi, %s sahifa bo‘shatildi", moved, pages)
+        return moved
+
+    async def _move_chunk(self, cutoff) -> int:
+        async with self.sessionmaker() as session:
+            # eski urinishlar jadval boshida: PK bo‘yicha skan tez to‘xtaydi
+            q = await session.execute(
+                select(*(getattr(Attempt, c) for c in _COLUMNS))
+                .where(Attempt.status.in_(FINISHED_STATUSES), Attempt.finished_at < cutoff)
+                .order_by(Attempt.id)
+                .limit(self.batch_size)
+            )
+            rows = q.all()
+            if not rows:
+                return 0
+            ids = [r.id for r in rows]
+
+            q = await session.execute(
+                select(Answer.attempt_id, Answer.question_id, Answer.chosen, Answer.is_correct)
+                .where(Answer.attempt_id.in_(ids))
+            )
+            answers = defaultdict(list)
+            for attempt_id, question_id, chosen, is_correct in q.all():
+                answers[attempt_id].append((question_id, chosen, is_correct))
+
+            await session.execute(
+                insert(AttemptArchive.__table__),
+                [{**r._asdict(), "answers": pack_answers(answers[r.id])} for r in rows],
+            )
+            await session.execute(delete(Answer).where(Answer.attempt_id.in_(ids)))
+            await session.execute(delete(Attempt).where(Attempt.id.in_(ids)))
+            await session.commit()
+        return len(rows)
+
+    async def _vacuum(self) -> int:
+        """Bo‘sh sahifalarni kichik qadamlarda OS'ga qaytaradi. Qaytaradi: sahifalar soni."""
+        if self.engine.dialect.name != "sqlite":
+            return 0
+        freed = 0
+        async with self.engine.connect() as conn:
+            mode = (await conn.exec_driver_sql("PRAGMA auto_vacuum")).scalar()
+            if mode != 2:
+                log.warning("Arxiv: auto_vacuum=INCREMENTAL emas, joy qaytarilmaydi (python -m app.archive --vacuum)")
+                return 0
+            # sqlite3 `execute` pragma'ni bir qadam (bir sahifa) bajaradi, executescript — oxirigacha
+            raw = (await conn.get_raw_connection()).driver_connection
+            while True:
+                free = (await conn.exec_driver_sql("PRAGMA freelist_count")).scalar()
+                if not free:
+                    break
+                step = min(free, self.vacuum_pages)
+                await raw.executescript(f"PRAGMA incremental_vacuum({step})")
+                freed += step
+                await asyncio.sleep(self.pause)
+        return freed
+
+
+async def enable_incremental_vacuum(engine: AsyncEngine) -> None:
+    """Eski SQLite bazani auto_vacuum=INCREMENTAL ga o‘tkazadi (to‘liq VACUUM — bot to‘xtatilgan holda)."""
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+        await conn.exec_driver_sql("VACUUM")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from .config import load_config
+    from .db import EngineProfile, create_tables, get_engine, init_engine
+    from .migrations import run_migrations
+
+    async def _main(args):
+        config = load_config()
+        days = config.archive_after_days if args.days is None else args.days
+        if args.once and days <= 0:
+            # 0 — "o‘chirilgan": cutoff = hozir, ya'ni barcha yakunlangan urinishlar ko‘chardi
+            raise SystemExit("Arxivlash o‘chirilgan (kun soni 0): --days N (N > 0) bering")
+        sessionmaker = init_engine(config.db_url, EngineProfile.from_config(config))
+        await create_tables()
+        await run_migrations()
+        engine = get_engine()
+        if args.vacuum:
+            if engine.dialect.name != "sqlite":
+                raise SystemExit("--vacuum faqat SQLite uchun")
+            await enable_incremental_vacuum(engine)
+            print("auto_vacuum=INCREMENTAL yoqildi")
+        if args.once:
+            job = ArchiveJob(engine, sessionmaker, days, batch_size=config.archive_batch)
+            print(f"Ko‘chirildi: {await job.run_once()}")
+        await engine.dispose()
+
+    p = argparse.ArgumentParser(description="Urinishlarni arxivlash")
+    p.add_argument("--once", action="store_true", help="hozir bir marta arxivlash")
+    p.add_argument("--days", type=int, default=None, help="standart: ARCHIVE_AFTER_DAYS")
+    p.add_argument("--vacuum", action="store_true", help="eski SQLite bazada incremental vacuum'ni yoqish")
+    asyncio.run(_main(p.parse_args()))
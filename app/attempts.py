@@ -0,0 +1,134 @@
+"""
+Urinishni yozish/yakunlash — har biri bitta tranzaksiya ichida.
+
+Javob `INSERT ... ON CONFLICT DO NOTHING` bilan yoziladi (unique
+answers(attempt_id, question_id)), ball esa serverda `score = score + :delta`
+bilan oshiriladi. Oxirgi savolda yakunlash ham shu UPDATE ichida bo‘ladi,
+shuning uchun tez-tez bosishlar (double-tap) ballni ikki marta sanamaydi.
+Yakunlangan urinish shu tranzaksiyada reytingga (`stats`) ham qo‘shiladi.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import case, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import stats
+from .db import dialect_insert
+from .models import Attempt, Answer
+from .utils import seconds_between
+
+
+@dataclass(frozen=True, slots=True)
+class AttemptResult:
+    score: int
+    total: int
+    percent: int
+    time_spent_sec: int
+    finished: bool
+    better_than: int | None = None  # boshqa ishtirokchilarning necha foizidan yaxshiroq
+
+
+async def _finish_stats(
+    session: AsyncSession, attempt: Attempt, status: str, row, time_spent: int, now: datetime,
+) -> int | None:
+    await stats.record_finish(
+        session,
+        test_id=attempt.test_id,
+        telegram_id=attempt.telegram_id,
+        attempt_id=attempt.id,
+        status=status,
+        score=row.score,
+        total=row.total,
+        percent=row.percent,
+        time_spent_sec=time_spent,
+        finished_at=now,
+    )
+    return await stats.better_than(session, attempt.test_id, row.percent)
+
+
+def percent_sql(score):
+    # utils.percent_of bilan bir xil: (score * 200 + total) // (2 * total)
+    return case(
+        (Attempt.total > 0, (score * 200 + Attempt.total) // (2 * Attempt.total)),
+        else_=0,
+    )
+
+
+async def record_answer(
+    session: AsyncSession,
+    attempt: Attempt,
+    question_id: int,
+    chosen: str,
+    is_correct: bool,
+    finish: bool,
+    now: datetime,
+) -> AttemptResult | None:
+    """Javobni yozadi. None — bu savolga javob berilgan yoki urinish yopilgan."""
+    ins = (
+        dialect_insert(Answer.__table__)
+        .values(attempt_id=attempt.id, question_id=question_id, chosen=chosen, is_correct=is_correct)
+        .on_conflict_do_nothing(index_elements=["attempt_id", "question_id"])
+    )
+    if (await session.execute(ins)).rowcount != 1:
+        await session.rollback()
+        return None
+
+    delta = 1 if is_correct else 0
+    values: dict = {"score": Attempt.score + delta}
+    time_spent = seconds_between(attempt.started_at, now)
+    if finish:
+        values.update(
+            status="finished",
+            finished_at=now,
+            time_spent_sec=time_spent,
+            percent=percent_sql(Attempt.score + delta),
+        )
+
+    q = await session.execute(
+        update(Attempt)
+        .where(Attempt.id == attempt.id, Attempt.status == "in_progress")
+        .values(**values)
+        .returning(Attempt.score, Attempt.total, Attempt.percent)
+        .execution_options(synchronize_session=False)
+    )
+    row = q.one_or_none()
+    if row is None:
+        await session.rollback()
+        return None
+
+    better = await _finish_stats(session, attempt, "finished", row, time_spent, now) if finish else None
+    await session.commit()
+    return AttemptResult(row.score, row.total, row.percent, time_spent, finish, better)
+
+
+async def finalize_attempt(
+    session: AsyncSession,
+    attempt: Attempt,
+    status: str,
+    now: datetime,
+) -> AttemptResult | None:
+    """Urinishni yopadi (masalan, timeout). None — allaqachon yopilgan."""
+    time_spent = seconds_between(attempt.started_at, now)
+    q = await session.execute(
+        update(Attempt)
+        .where(Attempt.id == attempt.id, Attempt.status == "in_progress")
+        .values(
+            status=status,
+            finished_at=now,
+            time_spent_sec=time_spent,
+            percent=percent_sql(Attempt.score),
+        )
+        .returning(Attempt.score, Attempt.total, Attempt.percent)
+        .execution_options(synchronize_session=False)
+    )
+    row = q.one_or_none()
+    if row is None:
+        await session.rollback()
+        return None
+
+    better = await _finish_stats(session, attempt, status, row, time_spent, now)
+    await session.commit()
+    return AttemptResult(row.score, row.total, row.percent, time_spent, True, better)
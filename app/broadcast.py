@@ -0,0 +1,169 @@
+"""
+Barcha ro‘yxatdan o‘tganlarga e'lon yuborish (qayta ishga tushsa davom etadi).
+
+Qabul qiluvchilar `users` jadvalidan keyset bo‘laklarda (id > kursor) o‘qiladi,
+har bo‘lakdan keyin (to‘xtatilganda esa yuborilgan qismidan keyin) kursor va
+hisoblagichlar bazaga yoziladi. Restartdan keyin `running` holatdagi e'lonlar
+shu kursordan davom etadi; faqat kutilmagan crash bo‘lsa oxirgi bo‘lakning
+bir qismi qayta yuborilishi mumkin. Botni bloklaganlar `is_blocked` bilan
+belgilanadi va keyingi e'lonlarda o‘tkazib yuboriladi.
+Xotira bo‘lak hajmiga bog‘liq, foydalanuvchilar soniga emas.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest, TelegramForbiddenError
+from sqlalchemy import select, update
+
+from .cache import invalidate_identity
+from .models import Broadcast, User
+from .outbound import Outbox, bulk_priority
+from .utils import now_utc
+
+log = logging.getLogger(__name__)
+
+
+class BroadcastRunner:
+    def __init__(self, bot: Bot, outbox: Outbox, sessionmaker, batch_size: int = 50, concurrency: int = 30):
+        self.bot = bot
+        self.outbox = outbox
+        self.sessionmaker = sessionmaker
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self._tasks: dict[int, asyncio.Task] = {}
+
+    async def resume_all(self, owns=None) -> None:
+        """`owns` (shard rejimi): faqat shu worker'ga tegishli adminning e'lonlari."""
+        async with self.sessionmaker() as session:
+            q = await session.execute(
+                select(Broadcast.id, Broadcast.created_by).where(Broadcast.status == "running")
+            )
+            for broadcast_id, created_by in q.all():
+                if owns is None or owns(created_by):
+                    self.start(broadcast_id)
+
+    async def create(self, text: str, created_by: int) -> int:
+        async with self.sessionmaker() as session:
+            b = Broadcast(text=text, created_by=created_by, status="running")
+            session.add(b)
+            await session.commit()
+            broadcast_id = b.id
+        self.start(broadcast_id)
+        return broadcast_id
+
+    def start(self, broadcast_id: int) -> None:
+        if broadcast_id not in self._tasks:
+            self._tasks[broadcast_id] = asyncio.create_task(self._run(broadcast_id))
+
+    async def stop(self) -> None:
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        self._tasks.clear()
+
+    async def _send(self, chat_id: int, text: str) -> str:
+        try:
+            await self.bot.send_message(chat_id, text)
+            return "sent"
+        except TelegramForbiddenError:
+            return "blocked"
+        except TelegramBadRequest as e:
+            return "blocked" if "chat not found" in str(e).lower() else "failed"
+        except TelegramAPIError:
+            return "failed"
+
+    async def _checkpoint(self, broadcast_id: int, rows, results: list[str]) -> None:
+        blocked = [row.telegram_id for row, r in zip(rows, results) if r == "blocked"]
+        async with self.sessionmaker() as session:
+            if blocked:
+                await session.execute(
+                    update(User).where(User.telegram_id.in_(blocked)).values(is_blocked=True)
+                )
+            await session.execute(
+                update(Broadcast)
+                .where(Broadcast.id == broadcast_id)
+                .values(
+                    last_user_id=rows[-1].id,
+                    sent=Broadcast.sent + results.count("sent"),
+                    failed=Broadcast.failed + results.count("failed"),
+                    blocked=Broadcast.blocked + len(blocked),
+                )
+            )
+            await session.commit()
+        for tg_id in blocked:
+            invalidate_identity(tg_id)
+
+    async def _run(self, broadcast_id: int) -> None:
+        try:
+            with bulk_priority():
+                await self._run_batches(broadcast_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            log.exception("Broadcast %s xatosi", broadcast_id)
+        finally:
+            self._tasks.pop(broadcast_id, None)
+
+    async def _run_batches(self, broadcast_id: int) -> None:
+        async with self.sessionmaker() as session:
+            b = await session.get(Broadcast, broadcast_id)
+            if not b or b.status != "running":
+                return
+            text, cursor, created_by = b.text, b.last_user_id, b.created_by
+
+        sem = asyncio.Semaphore(self.concurrency)
+
+        while True:
+            async with self.sessionmaker() as session:
+                q = await session.execute(
+                    select(User.id, User.telegram_id)
+                    .where(User.id > cursor, User.is_blocked == False)  # noqa: E712
+                    .order_by(User.id)
+                    .limit(self.batch_size)
+                )
+                batch = q.all()
+
+            if not batch:
+                break
+
+            results: list[str | None] = [None] * len(batch)
+
+            async def send_one(i: int, chat_id: int) -> None:
+                async with sem:
+                    results[i] = await self._send(chat_id, text)
+
+            try:
+                await asyncio.gather(*(send_one(i, row.telegram_id) for i, row in enumerate(batch)))
+            except asyncio.CancelledError:
+                # to‘xtatilganda (restart) yuborib bo‘lingan qismni saqlab qolamiz
+                done = next((i for i, r in enumerate(results) if r is None), len(results))
+                if done:
+                    await self._checkpoint(broadcast_id, batch[:done], results[:done])
+                raise
+
+            await self._checkpoint(broadcast_id, batch, results)
+            cursor = batch[-1].id
+
+        async with self.sessionmaker() as session:
+            await session.execute(
+                update(Broadcast)
+                .where(Broadcast.id == broadcast_id)
+                .values(status="done", finished_at=now_utc())
+            )
+            await session.commit()
+            b = await session.get(Broadcast, broadcast_id)
+
+        self.outbox.send_message(
+            created_by,
+            f"📣 E'lon #{broadcast_id} yakunlandi.\n"
+            f"• Yuborildi: {b.sent}\n"
+            f"• Bloklagan: {b.blocked}\n"
+            f"• Xatolik: {b.failed}",
+        )
@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Generic, Hashable, TypeVar
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import Test, Question, User
+from .shuffle import LETTERS, option_order, question_slot
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    """Kichik, chegaralangan LRU (bitta event loop ichida ishlatiladi, lock kerak emas).
+
+    `ttl` berilsa, yozuv shuncha sekunddan keyin eskirgan hisoblanadi.
+    """
+
+    def __init__(self, maxsize: int, ttl: float | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[K, tuple[float, V]] = OrderedDict()
+
+    def get(self, key: K) -> V | None:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires, value = item
+        if self.ttl is not None and expires < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: K, value: V) -> None:
+        expires = time.monotonic() + self.ttl if self.ttl is not None else 0.0
+        self._data[key] = (expires, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: K) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+# ===================== Test snapshots =====================
+
+@dataclass(frozen=True, slots=True)
+class QuestionSnapshot:
+    id: int
+    order_index: int
+    correct: str  # A/B/C/D
+    text: str  # tayyor render qilingan savol matni (asl tartibda)
+    q_text: str
+    options: dict[str, str]  # asl harf -> variant matni
+
+    def render(self, number: int, order: str = LETTERS) -> str:
+        """`order` — ko‘rsatiladigan A–D ortidagi asl harflar (shuffle.option_order)."""
+        if order == LETTERS and number == self.order_index:
+            return self.text
+        return render_question(number, self.q_text, [self.options[c] for c in order])
+
+
+@dataclass(frozen=True, slots=True)
+class TestSnapshot:
+    test_id: int
+    public_id: str
+    title: str
+    duration_sec: int
+    questions: tuple[QuestionSnapshot, ...]  # order_index bo‘yicha tartiblangan
+    by_index: dict[int, QuestionSnapshot]
+
+    @property
+    def total(self) -> int:
+        return len(self.questions)
+
+    def question(self, order_index: int) -> QuestionSnapshot | None:
+        return self.by_index.get(order_index)
+
+    def at(self, position: int, seed: int | None, total: int) -> tuple[QuestionSnapshot | None, str]:
+        """Urinishdagi pozitsiya bo‘yicha savol va variantlar tartibi; seed None — asl tartib.
+
+        `total` — urinish boshlangandagi savollar soni (`Attempt.total`), snapshot'niki emas:
+        admin savol qo‘shib tursa ham urinishdagi tartib o‘zgarmaydi.
+        """
+        if seed is None:
+            return self.question(position), LETTERS
+        if not 1 <= position <= total:
+            return None, LETTERS
+        slot = question_slot(seed, total, position)
+        if slot >= self.total:
+            return None, LETTERS
+        question = self.questions[slot]
+        return question, option_order(seed, question.id)
+
+
+def render_question(q_index: int, q_text: str, options) -> str:
+    a, b, c, d = options
+    return (
+        f"🧪 Savol {q_index}\n\n"
+        f"{q_text}\n\n"
+        f"A) {a}\n"
+        f"B) {b}\n"
+        f"C) {c}\n"
+        f"D) {d}\n"
+    )
+
+
+_test_snapshots: LRUCache[int, TestSnapshot] = LRUCache(maxsize=256)
+
+
+async def get_test_snapshot(sessionmaker, test_id: int, session: AsyncSession | None = None) -> TestSnapshot | None:
+    """session berilsa o‘sha ulanishda o‘qiladi — handler ichida pool'dan ikkinchi ulanish olinmaydi."""
+    snap = _test_snapshots.get(test_id)
+    if snap is not None:
+        return snap
+
+    if session is None:
+        async with sessionmaker() as session:
+            return await _load_test_snapshot(session, test_id)
+    return await _load_test_snapshot(session, test_id)
+
+
+async def _load_test_snapshot(session: AsyncSession, test_id: int) -> TestSnapshot | None:
+    test = await session.get(Test, test_id)
+    if not test:
+        return None
+    q = await session.execute(
+        select(Question).where(Question.test_id == test_id).order_by(Question.order_index)
+    )
+    questions = []
+    for question in q.scalars().all():
+        options = (question.a_text, question.b_text, question.c_text, question.d_text)
+        questions.append(QuestionSnapshot(
+            id=question.id,
+            order_index=question.order_index,
+            correct=question.correct.upper(),
+            text=render_question(question.order_index, question.q_text, options),
+            q_text=question.q_text,
+            options=dict(zip(LETTERS, options)),
+        ))
+    questions = tuple(questions)
+
+    snap = TestSnapshot(
+        test_id=test.id,
+        public_id=test.public_id,
+        title=test.title,
+        duration_sec=test.duration_sec,
+        questions=questions,
+        by_index={question.order_index: question for question in questions},
+    )
+    _test_snapshots.set(test_id, snap)
+    return snap
+
+
+def invalidate_test(test_id: int) -> None:
+    _test_snapshots.pop(test_id)
+
+
+def set_snapshot_ttl(ttl: float | None) -> None:
+    """Bir nechta jarayonda invalidate_test boshqalarga yetmaydi — snapshot'lar TTL bilan eskiradi."""
+    _test_snapshots.ttl = ttl
+    _test_snapshots.clear()
+
+
+# ===================== User identity =====================
+
+@dataclass(frozen=True, slots=True)
+class UserIdentity:
+    registered: bool
+    is_admin: bool = False
+    is_superadmin: bool = False
+    is_blocked: bool = False
+    full_name: str | None = None
+
+
+UNREGISTERED = UserIdentity(registered=False)
+
+# ro‘yxatdan o‘tmaganlar ham keshlanadi (negative cache)
+_identities: LRUCache[int, UserIdentity] = LRUCache(maxsize=50_000, ttl=300)
+
+
+async def get_identity(sessionmaker, tg_id: int) -> UserIdentity:
+    ident = _identities.get(tg_id)
+    if ident is not None:
+        return ident
+
+    async with sessionmaker() as session:
+        q = await session.execute(
+            select(User.full_name, User.is_admin, User.is_superadmin, User.is_blocked).where(User.telegram_id == tg_id)
+        )
+        row = q.one_or_none()
+
+    if row is None:
+        ident = UNREGISTERED
+    else:
+        ident = UserIdentity(
+            registered=True,
+            is_admin=bool(row.is_admin),
+            is_superadmin=bool(row.is_superadmin),
+            is_blocked=bool(row.is_blocked),
+            full_name=row.full_name,
+        )
+    _identities.set(tg_id, ident)
+    return ident
+
+
+def invalidate_identity(tg_id: int) -> None:
+    _identities.pop(tg_id)
+
+
+def set_identity_ttl(ttl: float | None) -> None:
+    """Shard rejimi: admin huquqi yoki blok o‘zgarsa, boshqa worker'lar buni TTL orqali ko‘radi."""
+    _identities.ttl = ttl
+    _identities.clear()
@@ -0,0 +1,92 @@
+"""
+Sertifikat rasmini chizish — ProcessPoolExecutor worker'larida ishlaydi.
+
+Bu modul ataylab yengil: Pillow'dan boshqa narsaga bog‘liq emas (aiogram/handler
+kodini yuklamaydi), shuning uchun worker jarayonlari tez ishga tushadi. Shablon va shriftlar
+`init_worker` da har bir worker uchun bir marta yuklanadi.
+"""
+from __future__ import annotations
+
+import io
+
+from PIL import Image, ImageDraw, ImageFont
+
+SIZE = (1600, 1131)  # A4, landscape
+
+_FALLBACK_FONTS = (
+    "DejaVuSans.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "arial.ttf",
+)
+
+_template: Image.Image | None = None
+_font_path: str | None = None
+_fonts: dict[int, ImageFont.FreeTypeFont] = {}
+
+
+def _load_font(path: str | None) -> str | None:
+    for candidate in ((path,) if path else ()) + _FALLBACK_FONTS:
+        try:
+            ImageFont.truetype(candidate, 12)
+            return candidate
+        except OSError:
+            continue
+    return None
+
+
+def init_worker(template_path: str | None, font_path: str | None) -> None:
+    global _template, _font_path
+    _template = None
+    if template_path:
+        _template = Image.open(template_path).convert("RGB").resize(SIZE)
+    _font_path = _load_font(font_path)
+    _fonts.clear()
+
+
+def ping() -> bool:
+    return True
+
+
+def _font(size: int):
+    font = _fonts.get(size)
+    if font is None:
+        if _font_path:
+            font = ImageFont.truetype(_font_path, size)
+        else:
+            font = ImageFont.load_default(size=size)
+        _fonts[size] = font
+    return font
+
+
+def _blank() -> Image.Image:
+    img = Image.new("RGB", SIZE, "#fdfbf4")
+    draw = ImageDraw.Draw(img)
+    w, h = SIZE
+    draw.rectangle((30, 30, w - 30, h - 30), outline="#1f3a5f", width=8)
+    draw.rectangle((50, 50, w - 50, h - 50), outline="#c9a43b", width=3)
+    return img
+
+
+def render_certificate(data: dict) -> bytes:
+    """data: full_name, title, score, total, percent, date, serial. PNG baytlar qaytaradi."""
+    img = _template.copy() if _template is not None else _blank()
+    draw = ImageDraw.Draw(img)
+    cx = SIZE[0] // 2
+
+    def line(y: int, text: str, size: int, fill: str = "#1f2933") -> None:
+        # uzun ism/test nomi ramkadan chiqmasin
+        while size > 20 and draw.textlength(text, font=_font(size)) > SIZE[0] - 200:
+            size -= 4
+        draw.text((cx, y), text, font=_font(size), fill=fill, anchor="mm")
+
+    line(200, "SERTIFIKAT", 110, "#1f3a5f")
+    line(330, "Ushbu sertifikat", 40)
+    line(450, data["full_name"], 80, "#0b2545")
+    line(570, f"«{data['title']}» testini muvaffaqiyatli topshirganligini tasdiqlaydi", 38)
+    line(680, f"Natija: {data['score']}/{data['total']} ({data['percent']}%)", 52, "#1f3a5f")
+    line(900, f"Sana: {data['date']}", 32)
+    line(960, f"Seriya raqami: {data['serial']}", 32, "#52606d")
+
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
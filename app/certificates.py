@@ -0,0 +1,262 @@
+"""
+Sertifikatlar: seriya raqami, render va yuborish.
+
+- Seriya raqami `C{attempt_id}-{HMAC}` — soxtalashtirib bo‘lmaydi va bazaga
+  murojaat qilmasdan tekshiriladi.
+- Rasm `ProcessPoolExecutor` da chiziladi (`cert_render`), event loop bloklanmaydi.
+- Yuborilgan sertifikatning Telegram `file_id` si saqlanadi: qayta so‘ralganda
+  qayta chizilmaydi va yuklanmaydi, shunchaki `file_id` bilan yuboriladi.
+- Batch rejim testning har bir o‘tgan ishtirokchisiga (eng yaxshi urinishi bo‘yicha)
+  sertifikat yuboradi.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import hashlib
+import hmac
+import logging
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramForbiddenError
+from aiogram.types import BufferedInputFile
+from sqlalchemy import select, update
+
+from . import cert_render
+from .cache import LRUCache
+from .db import dialect_insert
+from .models import Attempt, AttemptArchive, Certificate, FINISHED_STATUSES, Test, TestBest, User
+from .outbound import Outbox, bulk_priority
+
+log = logging.getLogger(__name__)
+
+_SERIAL_RE = re.compile(r"^C(\d{1,12})-([0-9A-F]{12})$")
+
+
+def _tag(secret: str, attempt_id: int) -> str:
+    digest = hmac.new(secret.encode(), f"cert:{attempt_id}".encode(), hashlib.sha256).hexdigest()
+    return digest[:12].upper()
+
+
+def make_serial(secret: str, attempt_id: int) -> str:
+    return f"C{attempt_id}-{_tag(secret, attempt_id)}"
+
+
+def parse_serial(secret: str, serial: str) -> int | None:
+    """attempt_id — agar seriya raqami shu kalit bilan imzolangan bo‘lsa, aks holda None."""
+    m = _SERIAL_RE.match((serial or "").strip().upper())
+    if not m:
+        return None
+    attempt_id = int(m.group(1))
+    if not hmac.compare_digest(m.group(2), _tag(secret, attempt_id)):
+        return None
+    return attempt_id
+
+
+class CertificateRenderer:
+    def __init__(self, template: str = "", font: str = "", workers: int = 2):
+        self.workers = workers
+        self._warmup: asyncio.Future | None = None
+        # spawn: worker'lar ishlayotgan event loop/thread'lar nusxasini olmaydi
+        self._pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=cert_render.init_worker,
+            initargs=(template or None, font or None),
+        )
+
+    def start(self) -> None:
+        # worker'larni oldindan ishga tushiramiz — birinchi sertifikat jarayon start'ini kutmaydi
+        loop = asyncio.get_running_loop()
+        self._warmup = asyncio.gather(
+            *(loop.run_in_executor(self._pool, cert_render.ping) for _ in range(self.workers)),
+            return_exceptions=True,
+        )
+
+    async def render(self, data: dict) -> bytes:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, cert_render.render_certificate, data)
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+class CertificateService:
+    def __init__(
+        self,
+        bot: Bot,
+        outbox: Outbox,
+        sessionmaker,
+        renderer: CertificateRenderer,
+        secret: str,
+        min_percent: int,
+        batch_concurrency: int = 4,
+    ):
+        self.bot = bot
+        self.outbox = outbox
+        self.sessionmaker = sessionmaker
+        self.renderer = renderer
+        self.secret = secret
+        self.min_percent = min_percent
+        self.batch_concurrency = batch_concurrency
+
+        # bitta urinish uchun parallel so‘rovlar bitta render/yuklashni kutadi
+        self._locks: LRUCache[int, asyncio.Lock] = LRUCache(maxsize=4096)
+        self._tasks: set[asyncio.Task] = set()
+
+    def eligible(self, status: str, percent: int) -> bool:
+        return status in FINISHED_STATUSES and percent >= self.min_percent
+
+    async def _get_or_create(self, attempt_id: int) -> Certificate | None:
+        async with self.sessionmaker() as session:
+            cert = (
+                await session.execute(select(Certificate).where(Certificate.attempt_id == attempt_id))
+            ).scalar_one_or_none()
+
+            row = None
+            # eski urinish arxivga ko‘chgan bo‘lishi mumkin (archive.py)
+            for model in (Attempt, AttemptArchive):
+                q = await session.execute(
+                    select(model, User.full_name, Test.title)
+                    .join(User, User.telegram_id == model.telegram_id)
+                    .join(Test, Test.id == model.test_id)
+                    .where(model.id == attempt_id)
+                )
+                row = q.one_or_none()
+                if row:
+                    break
+            att = row[0] if row else None
+
+            if cert:
+                # sertifikat urinishdan uzoq yashaydi: urinish o‘chirilgan bo‘lsa ham qayta yuboriladi
+                if att is None:
+                    return cert
+                if (
+                    cert.telegram_id == att.telegram_id
+                    and cert.test_title == row.title
+                    and cert.issued_at == (att.finished_at or att.started_at)
+                ):
+                    return cert
+                # id o‘chirilgan urinishdan qayta ishlatilgan (eski SQLite bazalar, m010 gacha):
+                # seriya band, boshqa odamning sertifikatini berib bo‘lmaydi
+                log.warning("Sertifikat %s boshqa urinishga tegishli (attempt_id=%s)", cert.serial, attempt_id)
+                return None
+
+            if not att or not self.eligible(att.status, att.percent):
+                return None
+
+            await session.execute(
+                dialect_insert(Certificate.__table__)
+                .values(
+                    attempt_id=att.id,
+                    serial=make_serial(self.secret, att.id),
+                    telegram_id=att.telegram_id,
+                    full_name=row.full_name,
+                    test_title=row.title,
+                    score=att.score,
+                    total=att.total,
+                    percent=att.percent,
+                    issued_at=att.finished_at or att.started_at,
+                )
+                .on_conflict_do_nothing(index_elements=["attempt_id"])
+            )
+            await session.commit()
+            return (
+                await session.execute(select(Certificate).where(Certificate.attempt_id == attempt_id))
+            ).scalar_one()
+
+    async def send(self, chat_id: int, attempt_id: int) -> bool:
+        """Sertifikatni yuboradi. False — urinish topilmadi yoki sertifikatga yetmaydi."""
+        lock = self._locks.get(attempt_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks.set(attempt_id, lock)
+
+        async with lock:
+            cert = await self._get_or_create(attempt_id)
+            if cert is None:
+                return False
+
+            caption = f"🎓 Sertifikat: {cert.serial}"
+            if cert.file_id:
+                await self.bot.send_document(chat_id, cert.file_id, caption=caption)
+                return True
+
+            png = await self.renderer.render({
+                "full_name": cert.full_name,
+                "title": cert.test_title,
+                "score": cert.score,
+                "total": cert.total,
+                "percent": cert.percent,
+                "date": cert.issued_at.strftime("%d.%m.%Y"),
+                "serial": cert.serial,
+            })
+            msg = await self.bot.send_document(
+                chat_id,
+                BufferedInputFile(png, filename=f"sertifikat_{cert.serial}.png"),
+                caption=caption,
+            )
+            async with self.sessionmaker() as session:
+                await session.execute(
+                    update(Certificate)
+                    .where(Certificate.id == cert.id)
+                    .values(file_id=msg.document.file_id)
+                )
+                await session.commit()
+            return True
+
+    # ===================== Batch =====================
+
+    async def start_batch(self, test_id: int, admin_chat_id: int) -> int:
+        """Testdan o‘tgan, hali sertifikat olmagan ishtirokchilar soni; yuborish fonda."""
+        async with self.sessionmaker() as session:
+            q = await session.execute(
+                select(TestBest.telegram_id, TestBest.attempt_id)
+                .outerjoin(Certificate, Certificate.attempt_id == TestBest.attempt_id)
+                .where(
+                    TestBest.test_id == test_id,
+                    TestBest.percent >= self.min_percent,
+                    Certificate.file_id.is_(None),
+                )
+            )
+            targets = q.all()
+
+        if targets:
+            task = asyncio.create_task(self._run_batch(targets, admin_chat_id))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return len(targets)
+
+    async def _run_batch(self, targets, admin_chat_id: int) -> None:
+        sem = asyncio.Semaphore(self.batch_concurrency)
+        sent = failed = 0
+
+        async def one(telegram_id: int, attempt_id: int) -> None:
+            nonlocal sent, failed
+            async with sem:
+                try:
+                    if await self.send(telegram_id, attempt_id):
+                        sent += 1
+                except TelegramForbiddenError:
+                    failed += 1
+                except TelegramAPIError as e:
+                    failed += 1
+                    log.info("Sertifikat %s yuborilmadi: %s", attempt_id, e)
+
+        with bulk_priority():
+            await asyncio.gather(*(one(t.telegram_id, t.attempt_id) for t in targets))
+
+        self.outbox.send_message(
+            admin_chat_id,
+            f"🎓 Sertifikatlar yuborildi.\n• Yuborildi: {sent}\n• Xatolik: {failed}",
+        )
+
+    async def stop(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        self.renderer.close()
@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+import hashlib
 import os
 from dotenv import load_dotenv
 
@@ -10,18 +11,142 @@ def _parse_admin_ids(raw: str) -> set[int]:
         return set()
     return {int(x.strip()) for x in raw.split(",") if x.strip().isdigit()}
 
+def _default_webhook_secret(token: str) -> str:
+    # barcha instance'larda bir xil bo‘lishi uchun tokendan hosil qilamiz
+    return hashlib.sha256(f"webhook:{token}".encode()).hexdigest()
+
 @dataclass(frozen=True)
 class Config:
     bot_token: str
     admin_ids: set[int]
     db_url: str
 
+    # "polling" yoki "webhook"
+    delivery_mode: str = "polling"
+    webhook_base_url: str = ""
+    webhook_path: str = "/webhook"
+    webhook_secret: str = ""
+
+    # "sql" (bazada, TTL bilan) yoki "memory"
+    fsm_storage: str = "sql"
+    fsm_ttl_sec: int = 24 * 3600
+
+    # keyingi savolni yangi xabar o‘rniga oldingi xabarni tahrirlab ko‘rsatish
+    question_edit_mode: bool = False
+    # har bir urinishda savollar va variantlar tartibini aralashtirish (shuffle.py)
+    shuffle_questions: bool = True
+
+    # Telegram limitlari: global ≈30 msg/s, bitta chatga ≈1 msg/s
+    outbound_global_rate: float = 30
+    outbound_chat_rate: float = 1
+
+    # sertifikatlar: seriya raqami HMAC kaliti, minimal foiz, ixtiyoriy shablon/shrift
+    cert_secret: str = ""
+    cert_min_percent: int = 60
+    cert_template: str = ""
+    cert_font: str = ""
+    cert_workers: int = 2
+
+    # DB ulanish profili (db.EngineProfile): DB_TUNED=0 — standart sozlamalar
+    db_tuned: bool = True
+    # None — backend bo‘yicha (SQLite 5+10, PostgreSQL 10+20)
+    db_pool_size: int | None = None
+    db_max_overflow: int | None = None
+    db_pool_timeout: float = 30
+    sqlite_busy_timeout_ms: int = 30000
+    sqlite_cache_mb: int = 64
+    sqlite_mmap_mb: int = 256
+    pg_statement_cache_size: int = 500
+
+    # javoblar write-behind jurnali (journal.AnswerJournal): bufer + lokal log, guruhlab commit
+    answer_journal: bool = False
+    answer_journal_path: str = "./answers.journal"
+    answer_journal_flush_ms: int = 5
+    answer_journal_batch: int = 500
+
+    # eski yakunlangan urinishlarni arxivga ko‘chirish (archive.ArchiveJob); 0 — o‘chirilgan
+    archive_after_days: int = 180
+    archive_batch: int = 500
+    archive_interval_min: int = 60
+
+    # shard rejimi (sharding.py): SHARD_WORKERS>0 — ingress + shuncha worker jarayon
+    shard_workers: int = 0
+    shard_base_port: int = 18100
+    # worker'ga ingress beradi (SHARD_NAME/SHARD_NODES/SHARD_PORT), qo‘lda berilmaydi
+    shard_name: str = ""
+    shard_nodes: tuple[str, ...] = ()
+    shard_port: int = 0
+
+    # self-hosted Bot API server (masalan, http://127.0.0.1:8081); bo‘sh — api.telegram.org
+    bot_api_url: str = ""
+
+    @property
+    def webhook_url(self) -> str:
+        return self.webhook_base_url.rstrip("/") + self.webhook_path
+
+def _optional_int(raw: str) -> int | None:
+    raw = (raw or "").strip()
+    return int(raw) if raw else None
+
+def _default_cert_secret(token: str) -> str:
+    return hashlib.sha256(f"cert:{token}".encode()).hexdigest()
+
 def load_config() -> Config:
     token = os.getenv("BOT_TOKEN", "").strip()
     if not token:
         raise RuntimeError("BOT_TOKEN .env da yo‘q!")
+
+    delivery_mode = os.getenv("DELIVERY_MODE", "polling").strip().lower()
+    if delivery_mode not in {"polling", "webhook"}:
+        raise RuntimeError("DELIVERY_MODE faqat polling yoki webhook bo‘lishi mumkin!")
+    webhook_base_url = os.getenv("WEBHOOK_URL", "").strip()
+    if delivery_mode == "webhook" and not webhook_base_url:
+        raise RuntimeError("DELIVERY_MODE=webhook uchun WEBHOOK_URL .env da yo‘q!")
+
+    fsm_storage = os.getenv("FSM_STORAGE", "sql").strip().lower()
+    shard_workers = int(os.getenv("SHARD_WORKERS", "0"))
+    if shard_workers and fsm_storage != "sql":
+        # chat boshqa worker'ga ko‘chganda FSM holati bazadan o‘qilishi kerak
+        raise RuntimeError("SHARD_WORKERS uchun FSM_STORAGE=sql bo‘lishi kerak!")
+
     return Config(
         bot_token=token,
         admin_ids=_parse_admin_ids(os.getenv("ADMIN_IDS", "")),
         db_url=os.getenv("DB_URL", "sqlite+aiosqlite:///./quizbot.sqlite3").strip(),
+        delivery_mode=delivery_mode,
+        webhook_base_url=webhook_base_url,
+        webhook_path="/" + os.getenv("WEBHOOK_PATH", "/webhook").strip().strip("/"),
+        webhook_secret=os.getenv("WEBHOOK_SECRET", "").strip() or _default_webhook_secret(token),
+        fsm_storage=fsm_storage,
+        fsm_ttl_sec=int(os.getenv("FSM_TTL_SEC", str(24 * 3600))),
+        question_edit_mode=os.getenv("QUESTION_EDIT_MODE", "0").strip().lower() in {"1", "true", "yes"},
+        shuffle_questions=os.getenv("SHUFFLE_QUESTIONS", "1").strip().lower() in {"1", "true", "yes"},
+        outbound_global_rate=float(os.getenv("OUTBOUND_GLOBAL_RATE", "30")),
+        outbound_chat_rate=float(os.getenv("OUTBOUND_CHAT_RATE", "1")),
+        cert_secret=os.getenv("CERT_SECRET", "").strip() or _default_cert_secret(token),
+        cert_min_percent=int(os.getenv("CERT_MIN_PERCENT", "60")),
+        cert_template=os.getenv("CERT_TEMPLATE", "").strip(),
+        cert_font=os.getenv("CERT_FONT", "").strip(),
+        cert_workers=int(os.getenv("CERT_WORKERS", "2")),
+        db_tuned=os.getenv("DB_TUNED", "1").strip().lower() in {"1", "true", "yes"},
+        db_pool_size=_optional_int(os.getenv("DB_POOL_SIZE", "")),
+        db_max_overflow=_optional_int(os.getenv("DB_MAX_OVERFLOW", "")),
+        db_pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        sqlite_busy_timeout_ms=int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "30000")),
+        sqlite_cache_mb=int(os.getenv("SQLITE_CACHE_MB", "64")),
+        sqlite_mmap_mb=int(os.getenv("SQLITE_MMAP_MB", "256")),
+        pg_statement_cache_size=int(os.getenv("PG_STATEMENT_CACHE_SIZE", "500")),
+        answer_journal=os.getenv("ANSWER_JOURNAL", "0").strip().lower() in {"1", "true", "yes"},
+        answer_journal_path=os.getenv("ANSWER_JOURNAL_PATH", "./answers.journal").strip(),
+        answer_journal_flush_ms=int(os.getenv("ANSWER_JOURNAL_FLUSH_MS", "5")),
+        answer_journal_batch=int(os.getenv("ANSWER_JOURNAL_BATCH", "500")),
+        archive_after_days=int(os.getenv("ARCHIVE_AFTER_DAYS", "180")),
+        archive_batch=int(os.getenv("ARCHIVE_BATCH", "500")),
+        archive_interval_min=int(os.getenv("ARCHIVE_INTERVAL_MIN", "60")),
+        shard_workers=shard_workers,
+        shard_base_port=int(os.getenv("SHARD_BASE_PORT", "18100")),
+        shard_name=os.getenv("SHARD_NAME", "").strip(),
+        shard_nodes=tuple(n for n in os.getenv("SHARD_NODES", "").split(",") if n),
+        shard_port=int(os.getenv("SHARD_PORT", "0")),
+        bot_api_url=os.getenv("BOT_API_URL", "").strip(),
     )
\ No newline at end of file
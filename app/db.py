@@ -1,15 +1,108 @@
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from dataclasses import dataclass
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession, AsyncEngine
 from sqlalchemy.orm import DeclarativeBase
 
+from .metrics import TimedQueuePool, instrument_engine
+
 class Base(DeclarativeBase):
     pass
 
-_engine = None
+@dataclass(frozen=True)
+class EngineProfile:
+    """
+    Ulanish sozlamalari (config.py orqali). tuned=False — SQLAlchemy/SQLite standartlari.
+
+    SQLite: WAL (o‘quvchilar yozuvchini kutmaydi), synchronous=NORMAL (WAL'da
+    har commit'da fsync yo‘q, faqat checkpoint'da), busy_timeout, page cache va mmap.
+    PostgreSQL (asyncpg): pool o‘lchami va prepared statement keshi.
+
+    pool_size/max_overflow None bo‘lsa backend bo‘yicha tanlanadi: SQLite'da yozuvchi
+    bitta, ortiqcha ulanishlar faqat busy_timeout ichida navbat kutadi.
+    """
+    tuned: bool = True
+    pool_size: int | None = None
+    max_overflow: int | None = None
+    pool_timeout: float = 30
+    sqlite_busy_timeout_ms: int = 30000
+    sqlite_cache_mb: int = 64
+    sqlite_mmap_mb: int = 256
+    pg_statement_cache_size: int = 500
+    pg_pool_recycle_sec: int = 1800
+
+    @classmethod
+    def from_config(cls, config) -> "EngineProfile":
+        return cls(
+            tuned=config.db_tuned,
+            pool_size=config.db_pool_size,
+            max_overflow=config.db_max_overflow,
+            pool_timeout=config.db_pool_timeout,
+            sqlite_busy_timeout_ms=config.sqlite_busy_timeout_ms,
+            sqlite_cache_mb=config.sqlite_cache_mb,
+            sqlite_mmap_mb=config.sqlite_mmap_mb,
+            pg_statement_cache_size=config.pg_statement_cache_size,
+        )
+
+_engine: AsyncEngine | None = None
 _sessionmaker: async_sessionmaker[AsyncSession] | None = None
 
-def init_engine(db_url: str) -> async_sessionmaker[AsyncSession]:
+def _sqlite_pragmas(engine: Engine, profile: EngineProfile, memory: bool) -> None:
+    pragmas = [
+        f"PRAGMA busy_timeout = {profile.sqlite_busy_timeout_ms}",
+        f"PRAGMA cache_size = -{profile.sqlite_cache_mb * 1024}",
+        "PRAGMA temp_store = MEMORY",
+    ]
+    if not memory:
+        pragmas += [
+            # faqat yangi (bo‘sh) bazada kuchga kiradi; eskisi uchun: python -m app.archive --vacuum
+            "PRAGMA auto_vacuum = INCREMENTAL",
+            "PRAGMA journal_mode = WAL",
+            "PRAGMA synchronous = NORMAL",
+            f"PRAGMA mmap_size = {profile.sqlite_mmap_mb * 1024 * 1024}",
+        ]
+
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_conn, record):
+        cursor = dbapi_conn.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+# (pool_size, max_overflow)
+_POOL_DEFAULTS = {"sqlite": (5, 10), "postgresql": (10, 20)}
+
+def _engine_kwargs(db_url: str, profile: EngineProfile) -> dict:
+    backend = make_url(db_url).get_backend_name()
+    memory = ":memory:" in db_url
+    kwargs = {}
+    if not memory:
+        # pool'dan ulanish kutish vaqtini o‘lchaydi (/metrics)
+        kwargs["poolclass"] = TimedQueuePool
+    if not profile.tuned:
+        return kwargs
+
+    if not memory:
+        pool_size, max_overflow = _POOL_DEFAULTS.get(backend, (10, 20))
+        kwargs.update(
+            pool_size=pool_size if profile.pool_size is None else profile.pool_size,
+            max_overflow=max_overflow if profile.max_overflow is None else profile.max_overflow,
+            pool_timeout=profile.pool_timeout,
+        )
+    if backend == "postgresql":
+        kwargs["pool_recycle"] = profile.pg_pool_recycle_sec
+        if make_url(db_url).get_driver_name() == "asyncpg":
+            kwargs["connect_args"] = {"prepared_statement_cache_size": profile.pg_statement_cache_size}
+    return kwargs
+
+def init_engine(db_url: str, profile: EngineProfile | None = None) -> async_sessionmaker[AsyncSession]:
     global _engine, _sessionmaker
-    _engine = create_async_engine(db_url, echo=False, future=True)
+    profile = profile or EngineProfile()
+    _engine = create_async_engine(db_url, echo=False, future=True, **_engine_kwargs(db_url, profile))
+    if profile.tuned and _engine.dialect.name == "sqlite":
+        _sqlite_pragmas(_engine.sync_engine, profile, memory=":memory:" in db_url)
+    instrument_engine(_engine.sync_engine)
     _sessionmaker = async_sessionmaker(bind=_engine, expire_on_commit=False)
     return _sessionmaker
 
@@ -18,7 +111,23 @@ def get_sessionmaker() -> async_sessionmaker[AsyncSession]:
         raise RuntimeError("DB sessionmaker init qilinmagan. init_engine() chaqiring!")
     return _sessionmaker
 
+def get_engine() -> AsyncEngine:
+    if _engine is None:
+        raise RuntimeError("DB engine init qilinmagan. init_engine() chaqiring!")
+    return _engine
+
+def dialect_insert(table):
+    """ON CONFLICT qo‘llab-quvvatlaydigan insert (SQLite va PostgreSQL)."""
+    name = get_engine().dialect.name
+    if name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        raise RuntimeError(f"{name} uchun upsert qo‘llab-quvvatlanmaydi")
+    return insert(table)
+
 async def create_tables() -> None:
-    from .models import User, Test, Question, Attempt, Answer  # noqa
+    from .models import User, Test, Question, Attempt, Answer, SchemaVersion, FsmRecord, Broadcast, TestScoreHist, TestBest, Certificate, IdSequence, UserStats, AttemptArchive  # noqa
     async with _engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
\ No newline at end of file
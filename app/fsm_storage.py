@@ -0,0 +1,205 @@
+"""
+SQLAlchemy engine ustidagi FSM storage.
+
+- o‘qish: kichik LRU cache orqali (miss bo‘lsa bitta SELECT)
+- yozish: cache'ga darhol, bazaga esa `flush_interval` da bir tranzaksiyada (batch)
+- TTL: oxirgi yozuvdan `ttl` sekund o‘tgan holatlar bo‘sh hisoblanadi va
+  bazadan davriy ravishda o‘chiriladi
+- flush'lar ketma-ket (lock); `close()` boshlangan flush'ni uzmaydi, tugashini
+  kutadi va qolganini yozadi
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Mapping
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey, StateType
+from sqlalchemy import delete
+
+from .cache import LRUCache
+from .db import dialect_insert
+from .models import FsmRecord
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class _Entry:
+    state: str | None = None
+    data: dict[str, Any] = field(default_factory=dict)
+    updated: float = field(default_factory=time.time)
+
+    @property
+    def empty(self) -> bool:
+        return self.state is None and not self.data
+
+
+def _key(key: StorageKey) -> str:
+    return ":".join(
+        str(part) if part is not None else ""
+        for part in (key.bot_id, key.chat_id, key.user_id, key.thread_id, key.business_connection_id, key.destiny)
+    )
+
+
+class SqlStorage(BaseStorage):
+    def __init__(
+        self,
+        sessionmaker,
+        ttl: int = 24 * 3600,
+        cache_size: int = 10_000,
+        flush_interval: float = 0.5,
+        sweep_interval: float = 600,
+    ):
+        self.sessionmaker = sessionmaker
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.sweep_interval = sweep_interval
+
+        self._cache: LRUCache[str, _Entry] = LRUCache(maxsize=cache_size)
+        self._dirty: dict[str, _Entry] = {}
+        self._task: asyncio.Task | None = None
+        self._tick: asyncio.Future | None = None
+        # bir vaqtda bitta flush: keyingi chaqiruv oldingisi yozib bo‘lishini kutadi
+        self._flush_lock = asyncio.Lock()
+        self._last_sweep = time.monotonic()
+
+    # ---------- BaseStorage ----------
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        entry = await self._load(_key(key))
+        entry.state = state.state if isinstance(state, State) else state
+        self._touch(_key(key), entry)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        return (await self._load(_key(key))).state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        entry = await self._load(_key(key))
+        entry.data = dict(data)
+        self._touch(_key(key), entry)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        return dict((await self._load(_key(key))).data)
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        if self._tick:
+            # fon flush yozish o‘rtasida to‘xtatilmaydi — tugashini kutamiz
+            await self._tick
+            self._tick = None
+        await self.flush()
+
+    # ---------- internals ----------
+
+    def size(self) -> int:
+        return len(self._cache)
+
+    def reset_cache(self) -> None:
+        """Keshni tashlab yuboradi (flush'dan keyin): keyingi o‘qishlar bazadan."""
+        self._cache.clear()
+
+    def _expired(self, entry: _Entry) -> bool:
+        return time.time() - entry.updated > self.ttl
+
+    async def _load(self, k: str) -> _Entry:
+        entry = self._dirty.get(k) or self._cache.get(k)
+        if entry is None:
+            async with self.sessionmaker() as session:
+                row = await session.get(FsmRecord, k)
+            if row is None:
+                entry = _Entry(updated=0)
+            else:
+                entry = _Entry(
+                    state=row.state,
+                    data=json.loads(row.data or "{}"),
+                    updated=(row.updated_at - datetime(1970, 1, 1)).total_seconds(),
+                )
+            self._cache.set(k, entry)
+
+        if not entry.empty and self._expired(entry):
+            entry = _Entry(updated=0)
+            self._cache.set(k, entry)
+        return entry
+
+    def _touch(self, k: str, entry: _Entry) -> None:
+        entry.updated = time.time()
+        self._cache.set(k, entry)
+        self._dirty[k] = entry
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            # cancel (close) yozuvni yarmida uzmasin: flush alohida task'da, shield ostida
+            self._tick = asyncio.ensure_future(self._flush_and_sweep())
+            await asyncio.shield(self._tick)
+
+    async def _flush_and_sweep(self) -> None:
+        try:
+            await self.flush()
+            if time.monotonic() - self._last_sweep > self.sweep_interval:
+                await self.sweep()
+        except Exception:
+            log.exception("FSM storage flush xatosi")
+
+    async def flush(self) -> None:
+        async with self._flush_lock:
+            await self._flush_locked()
+
+    async def _flush_locked(self) -> None:
+        if not self._dirty:
+            return
+        batch, self._dirty = self._dirty, {}
+
+        upserts = [
+            {
+                "key": k,
+                "state": e.state,
+                "data": json.dumps(e.data, ensure_ascii=False),
+                "updated_at": datetime.utcfromtimestamp(e.updated),
+            }
+            for k, e in batch.items()
+            if not e.empty
+        ]
+        removed = [k for k, e in batch.items() if e.empty]
+
+        try:
+            async with self.sessionmaker() as session:
+                if upserts:
+                    stmt = dialect_insert(FsmRecord.__table__)
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=["key"],
+                        set_={
+                            "state": stmt.excluded.state,
+                            "data": stmt.excluded.data,
+                            "updated_at": stmt.excluded.updated_at,
+                        },
+                    )
+                    await session.execute(stmt, upserts)
+                if removed:
+                    await session.execute(delete(FsmRecord).where(FsmRecord.key.in_(removed)))
+                await session.commit()
+        except BaseException:
+            # keyingi flush'da qayta uriniladi (yangi yozuvlar ustun); cancel'da ham yo‘qolmaydi
+            for k, e in batch.items():
+                self._dirty.setdefault(k, e)
+            raise
+
+    async def sweep(self) -> None:
+        self._last_sweep = time.monotonic()
+        cutoff = datetime.utcnow() - timedelta(seconds=self.ttl)
+        async with self.sessionmaker() as session:
+            await session.execute(delete(FsmRecord).where(FsmRecord.updated_at < cutoff))
+            await session.commit()
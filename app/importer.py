@@ -0,0 +1,189 @@
+"""
+Savollarni fayldan o‘qish (CSV / JSON / JSON Lines / oddiy matn).
+
+Fayl qatorma-qator (stream) o‘qiladi, har bir xato qator raqami bilan
+qaytariladi; bitta ham xato bo‘lsa test yaratilmaydi.
+
+CSV:   savol,a,b,c,d,javob   (sarlavha qatori ixtiyoriy)
+JSON:  [{"q": ..., "a": ..., "b": ..., "c": ..., "d": ..., "correct": "B"}, ...]
+JSONL: har qatorda bitta shunday obyekt
+TXT:
+    1. Savol matni
+    A) variant
+    B) variant
+    C) variant
+    D) variant
+    Javob: B
+    (savollar orasida bo‘sh qator)
+"""
+from __future__ import annotations
+
+import csv
+import json
+import re
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+
+MAX_QUESTIONS = 200
+LETTERS = ("A", "B", "C", "D")
+
+
+@dataclass(frozen=True, slots=True)
+class ParsedQuestion:
+    q_text: str
+    a_text: str
+    b_text: str
+    c_text: str
+    d_text: str
+    correct: str
+
+
+def _validate(where: str, q_text, options, correct, errors: list[str]) -> ParsedQuestion | None:
+    q_text = str(q_text or "").strip()
+    options = [str(o or "").strip() for o in options]
+    correct = str(correct or "").strip().upper()
+
+    if len(q_text) < 2:
+        errors.append(f"{where}: savol matni bo‘sh")
+        return None
+    for letter, opt in zip(LETTERS, options):
+        if not opt:
+            errors.append(f"{where}: {letter} varianti bo‘sh")
+            return None
+    if correct not in LETTERS:
+        errors.append(f"{where}: javob A/B/C/D bo‘lishi kerak (berilgan: {correct or '—'})")
+        return None
+    return ParsedQuestion(q_text, *options, correct)
+
+
+def _parse_csv(lines: Iterable[str], errors: list[str]) -> Iterator[ParsedQuestion]:
+    reader = csv.reader(lines)
+    for row in reader:
+        where = f"{reader.line_num}-qator"
+        if not any(cell.strip() for cell in row):
+            continue
+        if reader.line_num == 1 and row[-1].strip().lower() in {"javob", "correct", "answer"}:
+            continue
+        if len(row) != 6:
+            errors.append(f"{where}: 6 ta ustun kerak (savol,a,b,c,d,javob), {len(row)} ta berilgan")
+            continue
+        q = _validate(where, row[0], row[1:5], row[5], errors)
+        if q:
+            yield q
+
+
+def _from_obj(where: str, obj, errors: list[str]) -> ParsedQuestion | None:
+    if not isinstance(obj, dict):
+        errors.append(f"{where}: obyekt kutilgan")
+        return None
+    return _validate(
+        where,
+        obj.get("q") or obj.get("question"),
+        [obj.get("a"), obj.get("b"), obj.get("c"), obj.get("d")],
+        obj.get("correct") or obj.get("answer"),
+        errors,
+    )
+
+
+def _parse_jsonl(lines: Iterable[str], errors: list[str]) -> Iterator[ParsedQuestion]:
+    for line_no, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        where = f"{line_no}-qator"
+        try:
+            obj = json.loads(line)
+        except json.JSONDecodeError as e:
+            errors.append(f"{where}: JSON xato ({e.msg})")
+            continue
+        q = _from_obj(where, obj, errors)
+        if q:
+            yield q
+
+
+def _parse_json(lines: Iterable[str], errors: list[str]) -> Iterator[ParsedQuestion]:
+    try:
+        data = json.loads("".join(lines))
+    except json.JSONDecodeError as e:
+        errors.append(f"{e.lineno}-qator: JSON xato ({e.msg})")
+        return
+    if isinstance(data, dict):
+        data = data.get("questions")
+    if not isinstance(data, list):
+        errors.append("JSON ro‘yxat (yoki {\"questions\": [...]}) bo‘lishi kerak")
+        return
+    for i, obj in enumerate(data, start=1):
+        q = _from_obj(f"{i}-savol", obj, errors)
+        if q:
+            yield q
+
+
+_OPTION_RE = re.compile(r"^([A-Da-d])[\)\.:]\s*(.*)$")
+_ANSWER_RE = re.compile(r"^(javob|answer|to‘g‘ri|togri)\s*[:\-]\s*(.*)$", re.IGNORECASE)
+_NUMBER_RE = re.compile(r"^\d+[\)\.]\s*")
+
+
+def _parse_txt(lines: Iterable[str], errors: list[str]) -> Iterator[ParsedQuestion]:
+    block: list[str] = []
+    start = 0
+
+    def flush() -> ParsedQuestion | None:
+        where = f"{start}-qator"
+        q_parts: list[str] = []
+        options: dict[str, str] = {}
+        correct = ""
+        for raw in block:
+            m = _OPTION_RE.match(raw)
+            a = _ANSWER_RE.match(raw)
+            if a:
+                correct = a.group(2)
+            elif m:
+                options[m.group(1).upper()] = m.group(2)
+            elif options:
+                # variant davomi (ko‘p qatorli variant)
+                last = list(options)[-1]
+                options[last] += "\n" + raw
+            else:
+                q_parts.append(raw)
+        q_text = _NUMBER_RE.sub("", "\n".join(q_parts), count=1)
+        return _validate(where, q_text, [options.get(x) for x in LETTERS], correct, errors)
+
+    for line_no, line in enumerate(lines, start=1):
+        line = line.rstrip("\r\n")
+        if line.strip():
+            if not block:
+                start = line_no
+            block.append(line.strip())
+            continue
+        if block:
+            q = flush()
+            if q:
+                yield q
+            block = []
+    if block:
+        q = flush()
+        if q:
+            yield q
+
+
+def parse_questions(filename: str, lines: Iterable[str]) -> tuple[list[ParsedQuestion], list[str]]:
+    name = (filename or "").lower()
+    errors: list[str] = []
+    if name.endswith(".csv"):
+        parser = _parse_csv
+    elif name.endswith(".jsonl"):
+        parser = _parse_jsonl
+    elif name.endswith(".json"):
+        parser = _parse_json
+    else:
+        parser = _parse_txt
+
+    questions: list[ParsedQuestion] = []
+    for q in parser(lines, errors):
+        questions.append(q)
+        if len(questions) > MAX_QUESTIONS:
+            errors.append(f"Savollar soni {MAX_QUESTIONS} tadan oshmasin")
+            break
+
+    if not questions and not errors:
+        errors.append("Faylda savol topilmadi")
+    return questions, errors
@@ -0,0 +1,349 @@
+"""
+Javoblar uchun write-behind jurnal (ixtiyoriy, ANSWER_JOURNAL=1).
+
+Oddiy rejimda har bir javob — alohida yozish tranzaksiyasi. SQLite'da yozuvchi
+bitta, shuning uchun imtihon paytida tranzaksiyalar navbatga tiziladi. Jurnal
+rejimida esa:
+
+- javob jarayon ichidagi buferga va lokal append-only log'ga yoziladi,
+  tap shu zahoti tasdiqlanadi;
+- fon task buferni har `flush_interval` sekundda yoki `batch_size` yozuvda
+  BITTA tranzaksiyada bazaga yozadi: `answers` ga multi-row INSERT va
+  `attempts.score` ga UPDATE'lar;
+- oxirgi savol yoki timeout bo‘lsa urinish yopilishidan oldin bufer yoziladi,
+  ball va reyting doim to‘liq bo‘ladi;
+- "bu savolga javob berilganmi" tekshiruvi buferdagi javoblarni ham hisobga
+  oladi, `pending_score` esa hali yozilmagan ballni beradi;
+- to‘xtashda bufer oxirigacha yoziladi. Ishga tushishda esa qolgan log
+  segmentlari qayta o‘ynaladi;
+- batch `ISOLATE_AFTER` marta ketma-ket yozilmasa, yozuvma-yozuv yoziladi:
+  constraint'ga zid yozuv (masalan, imtihon paytida test o‘chirilgan) log qilinib
+  tashlanadi, qolgan javoblar va `flush()` kutuvchilari to‘xtab qolmaydi.
+
+Log segmentlarga bo‘lingan: har flush'da yangi segment ochiladi, eskisi commit'dan
+keyin o‘chiriladi. Yozuv `os.write` bilan darhol OS'ga tushadi, ya'ni jarayon
+yiqilsa ham yo‘qolmaydi. Qayta o‘ynash idempotent: ball faqat haqiqatan qo‘shilgan
+javoblar uchun oshiriladi (`ON CONFLICT DO NOTHING ... RETURNING`).
+
+Jurnal bitta urinishning barcha javoblari bitta jarayonga kelishini talab qiladi:
+bitta instance yoki chat bo‘yicha sharding.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import glob
+import logging
+import os
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from .attempts import AttemptResult, finalize_attempt
+from .db import dialect_insert
+from .models import Answer, Attempt
+from .utils import seconds_between
+
+log = logging.getLogger(__name__)
+
+# shuncha ketma-ket xatodan keyin batch yozuvma-yozuv yoziladi (buzilganlari tashlanadi)
+ISOLATE_AFTER = 3
+
+
+@dataclass(frozen=True, slots=True)
+class _Record:
+    attempt_id: int
+    question_id: int
+    chosen: str
+    is_correct: bool
+
+    def encode(self) -> bytes:
+        return f"{self.attempt_id} {self.question_id} {self.chosen} {int(self.is_correct)}\n".encode()
+
+    @classmethod
+    def decode(cls, line: str) -> "_Record":
+        attempt_id, question_id, chosen, is_correct = line.split()
+        return cls(int(attempt_id), int(question_id), chosen, is_correct == "1")
+
+
+class AnswerJournal:
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        sessionmaker,
+        path: str,
+        flush_interval: float = 0.005,
+        batch_size: int = 500,
+    ):
+        self.engine = engine
+        self.sessionmaker = sessionmaker
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+
+        self._buffer: list[_Record] = []
+        # attempt_id -> javob berilgan savollar (bazadagi + buferdagi); urinish yopilguncha
+        self._answered: dict[int, set[int]] = {}
+        # attempt_id -> hali bazaga yozilmagan to‘g‘ri javoblar soni
+        self._pending: dict[int, int] = defaultdict(int)
+        # qabul qilingan/bazaga yozilgan yozuvlar soni (FIFO) — flush() kutuvchilari uchun
+        self._accepted = 0
+        self._committed = 0
+        self._waiters: list[tuple[int, asyncio.Future]] = []
+
+        self._seq = 0
+        self._first_seq = 0
+        self._fd: int | None = None
+        self._conn: AsyncConnection | None = None
+        self._wake = asyncio.Event()
+        self._full = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def depth(self) -> int:
+        return len(self._buffer)
+
+    # ===================== lifecycle =====================
+
+    async def start(self) -> None:
+        # flush uchun alohida doimiy ulanish: handler'lar pool'ni band qilsa ham flush kutib qolmaydi
+        self._conn = await self.engine.connect()
+        segments = sorted(glob.glob(f"{self.path}.*"), key=_segment_no)
+        if segments:
+            replayed = await self._replay(segments)
+            log.info("Javoblar jurnali: %s ta yozuv qayta o‘ynaldi", replayed)
+            self._seq = _segment_no(segments[-1])
+        self._open_segment()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        # qolganini yozib chiqamiz
+        while self._buffer:
+            try:
+                await self._flush_once()
+            except Exception:
+                log.exception("Javoblar jurnali: flush xatosi, yozuvma-yozuv yozamiz")
+                await self._flush_once(isolate=True)
+        if self._fd is not None:
+            os.close(self._fd)
+            os.remove(self._segment_path(self._seq))
+            self._fd = None
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+    # ===================== handler API =====================
+
+    def track(self, attempt_id: int) -> None:
+        """Yangi urinish — javoblari yo‘qligi ma'lum, bazadan o‘qish shart emas."""
+        self._answered.setdefault(attempt_id, set())
+
+    def forget(self, attempt_id: int) -> None:
+        self._answered.pop(attempt_id, None)
+
+    def forget_all(self) -> None:
+        """flush()'dan keyin: javob berilgan savollar kerak bo‘lganda bazadan qayta o‘qiladi."""
+        self._answered.clear()
+
+    def pending_score(self, attempt_id: int) -> int:
+        return self._pending.get(attempt_id, 0)
+
+    async def accept(self, attempt_id: int, question_id: int, chosen: str, is_correct: bool) -> bool:
+        """Javobni buferga oladi. False — bu savolga javob berilgan."""
+        answered = self._answered.get(attempt_id)
+        if answered is None:
+            async with self.sessionmaker() as session:
+                q = await session.execute(select(Answer.question_id).where(Answer.attempt_id == attempt_id))
+                answered = self._answered.setdefault(attempt_id, set(q.scalars().all()))
+        if question_id in answered:
+            return False
+        answered.add(question_id)
+
+        record = _Record(attempt_id, question_id, chosen, is_correct)
+        os.write(self._fd, record.encode())
+        self._buffer.append(record)
+        self._accepted += 1
+        if is_correct:
+            self._pending[attempt_id] += 1
+        self._wake.set()
+        if len(self._buffer) >= self.batch_size:
+            self._full.set()
+        return True
+
+    async def flush(self) -> None:
+        """Hozirgacha qabul qilingan barcha javoblar bazaga yozilishini kutadi."""
+        if self._committed >= self._accepted:
+            return
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append((self._accepted, fut))
+        self._wake.set()
+        self._full.set()
+        await fut
+
+    async def record(
+        self,
+        attempt: Attempt,
+        question_id: int,
+        chosen: str,
+        is_correct: bool,
+        finish: bool,
+        now: datetime,
+    ) -> AttemptResult | None:
+        """`attempts.record_answer` ning jurnal varianti (handler session'ini ushlab turmaydi)."""
+        if not await self.accept(attempt.id, question_id, chosen, is_correct):
+            return None
+        time_spent = seconds_between(attempt.started_at, now)
+        if not finish:
+            score = attempt.score + self.pending_score(attempt.id)
+            return AttemptResult(score, attempt.total, 0, time_spent, False)
+
+        await self.flush()
+        self.forget(attempt.id)
+        async with self.sessionmaker() as session:
+            return await finalize_attempt(session, attempt, "finished", now)
+
+    # ===================== flush =====================
+
+    async def _run(self) -> None:
+        failures = 0
+        while True:
+            await self._wake.wait()
+            if len(self._buffer) < self.batch_size and not self._full.is_set():
+                # guruhlash oynasi: shu vaqt ichida kelganlar bitta commit'ga tushadi
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval)
+            self._wake.clear()
+            self._full.clear()
+            try:
+                await self._flush_once(isolate=failures >= ISOLATE_AFTER)
+                failures = 0
+            except Exception:
+                failures += 1
+                log.exception("Javoblar jurnali: flush xatosi, qayta urinamiz")
+                self._wake.set()
+                await asyncio.sleep(0.5)
+
+    async def _flush_once(self, isolate: bool = False) -> None:
+        batch = self._buffer[: self.batch_size]
+        if not batch:
+            return
+        del self._buffer[: len(batch)]
+
+        # shu paytdan keyingi yozuvlar yangi segmentga tushadi
+        old_seq = self._seq
+        if not self._buffer:
+            os.close(self._fd)
+            self._open_segment()
+
+        try:
+            await (self._write_each(batch) if isolate else self._write(batch))
+        except BaseException:
+            self._buffer[:0] = batch
+            raise
+        self._committed += len(batch)
+        self._resolve_waiters()
+
+        for r in batch:
+            if r.is_correct:
+                left = self._pending[r.attempt_id] - 1
+                if left > 0:
+                    self._pending[r.attempt_id] = left
+                else:
+                    self._pending.pop(r.attempt_id, None)
+        if self._seq != old_seq:
+            # eski segmentdagi barcha yozuvlar endi bazada
+            for seq in range(self._first_seq, self._seq):
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(self._segment_path(seq))
+            self._first_seq = self._seq
+
+    async def _write(self, batch: list[_Record]) -> int:
+        """Bitta tranzaksiya. Qaytaradi: haqiqatan qo‘shilgan javoblar soni."""
+        conn = self._conn
+        async with conn.begin():
+            q = await conn.execute(
+                dialect_insert(Answer.__table__)
+                .on_conflict_do_nothing(index_elements=["attempt_id", "question_id"])
+                .returning(Answer.attempt_id, Answer.is_correct),
+                [
+                    {"attempt_id": r.attempt_id, "question_id": r.question_id,
+                     "chosen": r.chosen, "is_correct": r.is_correct}
+                    for r in batch
+                ],
+            )
+            deltas: dict[int, int] = defaultdict(int)
+            inserted = 0
+            for attempt_id, is_correct in q.all():
+                inserted += 1
+                if is_correct:
+                    deltas[attempt_id] += 1
+
+            if deltas:
+                table = Attempt.__table__
+                await conn.execute(
+                    update(table)
+                    .where(table.c.id == bindparam("b_id"), table.c.status == "in_progress")
+                    .values(score=table.c.score + bindparam("b_delta")),
+                    [{"b_id": attempt_id, "b_delta": delta} for attempt_id, delta in deltas.items()],
+                )
+        return inserted
+
+    async def _write_each(self, batch: list[_Record]) -> int:
+        """Har yozuv alohida tranzaksiyada; constraint'ga zid yozuv log qilinib tashlanadi."""
+        inserted = 0
+        for r in batch:
+            try:
+                inserted += await self._write([r])
+            except (IntegrityError, DataError) as e:
+                log.error("Javoblar jurnali: yozuv tashlab yuborildi %s: %s", r, e.orig)
+        return inserted
+
+    def _resolve_waiters(self) -> None:
+        waiting = []
+        for target, fut in self._waiters:
+            if target > self._committed:
+                waiting.append((target, fut))
+            elif not fut.done():
+                fut.set_result(None)
+        self._waiters = waiting
+
+    # ===================== log =====================
+
+    def _segment_path(self, seq: int) -> str:
+        return f"{self.path}.{seq:08d}"
+
+    def _open_segment(self) -> None:
+        self._seq += 1
+        if not self._first_seq:
+            self._first_seq = self._seq
+        self._fd = os.open(self._segment_path(self._seq), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+
+    async def _replay(self, segments: list[str]) -> int:
+        records: list[_Record] = []
+        for segment in segments:
+            with open(segment, encoding="utf-8") as f:
+                for line in f:
+                    if line.endswith("\n"):  # oxirgi chala qator — yiqilish paytida yozilgan
+                        records.append(_Record.decode(line))
+        for i in range(0, len(records), self.batch_size):
+            chunk = records[i: i + self.batch_size]
+            try:
+                await self._write(chunk)
+            except (IntegrityError, DataError):
+                await self._write_each(chunk)
+        for segment in segments:
+            os.remove(segment)
+        return len(records)
+
+
+def _segment_no(path: str) -> int:
+    return int(path.rsplit(".", 1)[1])
@@ -1,8 +1,10 @@
-from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup
+from functools import cache
+
+from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import ReplyKeyboardBuilder, InlineKeyboardBuilder
-from aiogram.types import InlineKeyboardMarkup
-from aiogram.utils.keyboard import InlineKeyboardBuilder
 
+# statik klaviaturalar bir marta quriladi va qayta ishlatiladi
+@cache
 def kb_main_user() -> ReplyKeyboardMarkup:
     b = ReplyKeyboardBuilder()
     b.add(
@@ -13,6 +15,7 @@ def kb_main_user() -> ReplyKeyboardMarkup:
     b.adjust(2, 1)
     return b.as_markup(resize_keyboard=True)
 
+@cache
 def kb_main_admin() -> ReplyKeyboardMarkup:
     b = ReplyKeyboardBuilder()
     b.add(
@@ -20,25 +23,54 @@ def kb_main_admin() -> ReplyKeyboardMarkup:
         KeyboardButton(text="👥 Kimlar ishlagan"),
         KeyboardButton(text="📥 Testlar ro‘yxati"),
         KeyboardButton(text="🗑 Test o‘chirish"),
+        KeyboardButton(text="📤 Fayldan yuklash"),
+        KeyboardButton(text="📣 E'lon yuborish"),
+        KeyboardButton(text="📈 Savollar tahlili"),
+        KeyboardButton(text="🎓 Sertifikat berish"),
     )
     b.add(
         KeyboardButton(text="🧪 Test ishlash"),
         KeyboardButton(text="📊 Natijalarim"),
     )
-    b.adjust(2, 1, 2)
+    b.adjust(2, 2, 2, 2, 2)
     return b.as_markup(resize_keyboard=True)
 
 def kb_abcd(attempt_id: int, q_index: int) -> InlineKeyboardMarkup:
-    ib = InlineKeyboardBuilder()
-    for letter in ["A", "B", "C", "D"]:
-        ib.button(text=letter, callback_data=f"ans:{attempt_id}:{q_index}:{letter}")
-    ib.adjust(4)
-    return ib.as_markup()
-def kb_page(public_id: str, page: int, page_size: int, has_prev: bool, has_next: bool) -> InlineKeyboardMarkup:
+    # hot path: builder'siz, to‘g‘ridan-to‘g‘ri bitta qator
+    return InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(text=letter, callback_data=f"ans:{attempt_id}:{q_index}:{letter}")
+        for letter in ("A", "B", "C", "D")
+    ]])
+
+def kb_certificate(attempt_id: int) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(text="🎓 Sertifikat olish", callback_data=f"cert:{attempt_id}")
+    ]])
+
+def kb_page(
+    public_id: str,
+    page: int,
+    page_size: int,
+    has_prev: bool,
+    has_next: bool,
+    first_id: int = 0,
+    last_id: int = 0,
+) -> InlineKeyboardMarkup:
+    # keyset: "p{first_id}" — shu id dan kattalar, "n{last_id}" — shu id dan kichiklar
+    kb = InlineKeyboardBuilder()
+    if has_prev:
+        kb.button(text="⬅️ Oldingi", callback_data=f"who:{public_id}:{page-1}:{page_size}:p{first_id}")
+    if has_next:
+        kb.button(text="Keyingi ➡️", callback_data=f"who:{public_id}:{page+1}:{page_size}:n{last_id}")
+    kb.adjust(2)
+    return kb.as_markup()
+
+def kb_history(page: int, has_prev: bool, has_next: bool, first_id: int = 0, last_id: int = 0) -> InlineKeyboardMarkup:
+    # kb_page bilan bir xil keyset: foydalanuvchi callback'dan emas, from_user'dan olinadi
     kb = InlineKeyboardBuilder()
     if has_prev:
-        kb.button(text="⬅️ Oldingi", callback_data=f"who:{public_id}:{page-1}:{page_size}")
+        kb.button(text="⬅️ Oldingi", callback_data=f"hist:{page-1}:p{first_id}")
     if has_next:
-        kb.button(text="Keyingi ➡️", callback_data=f"who:{public_id}:{page+1}:{page_size}")
+        kb.button(text="Keyingi ➡️", callback_data=f"hist:{page+1}:n{last_id}")
     kb.adjust(2)
-    return kb.as_markup()
\ No newline at end of file
+    return kb.as_markup()
@@ -1,28 +1,104 @@
 import os
 import asyncio
 from aiohttp import web
+from sqlalchemy import func, select, text
 
 from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.fsm.storage.memory import MemoryStorage
-
-from .config import load_config
-from .db import init_engine, create_tables
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+
+from .config import load_config, Config
+from .db import EngineProfile, init_engine, create_tables, get_engine
+from .migrations import run_migrations
+from .fsm_storage import SqlStorage
+from .scheduler import TimeoutSweeper
+from .outbound import RateLimiter, RateLimitMiddleware, Outbox
+from .broadcast import BroadcastRunner
+from .certificates import CertificateRenderer, CertificateService
+from .verify import CertificateVerifier
+from .journal import AnswerJournal
+from .archive import ArchiveJob
+from .sharding import run_ingress, serve_worker, worker_owns
+from . import metrics
 from .routers import all_routers
+from .models import Attempt
+
+
+def _register_gauges(dp: Dispatcher) -> None:
+    sessionmaker = dp["sessionmaker"]
+
+    async def attempts_in_progress():
+        # literal shart — SQLite partial index'ni (ix_attempts_in_progress) ishlata oladi
+        async with sessionmaker() as session:
+            q = await session.execute(
+                select(func.count()).select_from(Attempt).where(text("status = 'in_progress'"))
+            )
+            return q.scalar()
+
+    metrics.REGISTRY.gauge("attempts_in_progress", "Ochiq urinishlar", attempts_in_progress)
+    if hasattr(dp.storage, "size"):
+        metrics.REGISTRY.gauge("fsm_storage_keys", "FSM keshidagi kalitlar", dp.storage.size)
+    if "sweeper" in dp.workflow_data:
+        metrics.REGISTRY.gauge("timeout_sweeper_pending", "Sweeper heap'idagi deadline'lar", lambda: dp["sweeper"].pending)
+    if "outbox" in dp.workflow_data:
+        metrics.REGISTRY.gauge("outbox_depth", "Outbox navbatidagi xabarlar", lambda: dp["outbox"].depth)
+    if dp.workflow_data.get("archiver"):
+        metrics.REGISTRY.gauge("archived_attempts", "Shu jarayon arxivga ko‘chirgan urinishlar", lambda: dp["archiver"].archived)
+    if dp.workflow_data.get("journal"):
+        metrics.REGISTRY.gauge("answer_journal_depth", "Bazaga hali yozilmagan javoblar", lambda: dp["journal"].depth)
+
+
+def make_bot(config: Config) -> Bot:
+    if config.bot_api_url:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(config.bot_api_url))
+        return Bot(token=config.bot_token, session=session)
+    return Bot(token=config.bot_token)
+
+
+def build_web_app(sessionmaker, config: Config) -> web.Application:
+    """Umumiy endpoint'lar: health, /verify/{serial}, /metrics."""
+    app = web.Application()
+
+    async def health(_request):
+        return web.Response(text="ok")
+
+    app.router.add_get("/", health)
+    app.router.add_get("/health", health)
+
+    verifier = CertificateVerifier(sessionmaker, config.cert_secret)
+    app.router.add_get("/verify/{serial}", verifier.handle)
+
+    async def metrics_handler(_request):
+        return web.Response(
+            body=(await metrics.REGISTRY.render()).encode(),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
+
+    app.router.add_get("/metrics", metrics_handler)
+    return app
 
 
-async def start_web_server() -> web.AppRunner:
+async def start_web_server(dp: Dispatcher, bot: Bot, config: Config) -> web.AppRunner:
     """
     Render Web Service port-scan uchun: 0.0.0.0:$PORT ga HTTP server ochib turadi.
+    DELIVERY_MODE=webhook bo‘lsa, Telegram update'lari ham shu serverga keladi.
+    /verify/{serial} — sertifikatni tekshirish sahifasi, /metrics — Prometheus.
     """
     port = int(os.getenv("PORT", "10000"))
 
-    app = web.Application()
+    app = build_web_app(dp["sessionmaker"], config)
+    _register_gauges(dp)
 
-    async def health(_request):
-        return web.Response(text="ok")
-
-    app.router.add_get("/", health)
-    app.router.add_get("/health", health)
+    if config.delivery_mode == "webhook":
+        # secret token tekshiriladi, update esa fonda qayta ishlanadi (javob darhol qaytadi)
+        SimpleRequestHandler(
+            dispatcher=dp,
+            bot=bot,
+            handle_in_background=True,
+            secret_token=config.webhook_secret,
+        ).register(app, path=config.webhook_path)
 
     runner = web.AppRunner(app)
     await runner.setup()
@@ -34,24 +110,123 @@ async def start_web_server() -> web.AppRunner:
 async def main():
     config = load_config()
 
-    sessionmaker = init_engine(config.db_url)
+    sessionmaker = init_engine(config.db_url, EngineProfile.from_config(config))
     await create_tables()
-
-    bot = Bot(token=config.bot_token)
-    dp = Dispatcher(storage=MemoryStorage())
+    await run_migrations()
+
+    bot = make_bot(config)
+    if config.shard_workers and not config.shard_name:
+        # ingress: update'larni qabul qilib, chat bo‘yicha worker jarayonlarga tarqatadi
+        routing = Dispatcher()
+        routing.include_routers(*all_routers)
+        try:
+            await run_ingress(
+                config, bot, routing.resolve_used_update_types(),
+                build_web_app(sessionmaker, config),
+            )
+        finally:
+            await bot.session.close()
+            await get_engine().dispose()
+        return
+
+    limiter = RateLimiter(global_rate=config.outbound_global_rate, chat_rate=config.outbound_chat_rate)
+    bot.session.middleware(RateLimitMiddleware(limiter))
+    if config.fsm_storage == "memory":
+        storage = MemoryStorage()
+    else:
+        storage = SqlStorage(sessionmaker, ttl=config.fsm_ttl_sec)
+    dp = Dispatcher(storage=storage)
 
     # dependency injection
     dp["config"] = config
     dp["sessionmaker"] = sessionmaker
 
+    outbox = Outbox(bot)
+    outbox.start()
+    dp["outbox"] = outbox
+
+    # sweeper'dan oldin: yiqilishdan qolgan log qayta o‘ynalib, ballar to‘liq bo‘lsin
+    journal = None
+    if config.answer_journal:
+        # har bir worker o‘z log'iga yozadi, qayta ishga tushganda o‘zinikini o‘ynaydi
+        path = config.answer_journal_path
+        if config.shard_name:
+            path = f"{path}.{config.shard_name}"
+        journal = AnswerJournal(
+            get_engine(), sessionmaker, path,
+            flush_interval=config.answer_journal_flush_ms / 1000,
+            batch_size=config.answer_journal_batch,
+        )
+        await journal.start()
+    dp["journal"] = journal
+
+    owns = worker_owns(config)
+    sweeper = TimeoutSweeper(outbox, sessionmaker, journal=journal, owns=owns)
+    await sweeper.start()
+    dp["sweeper"] = sweeper
+
+    broadcaster = BroadcastRunner(bot, outbox, sessionmaker)
+    await broadcaster.resume_all(owns)
+    dp["broadcaster"] = broadcaster
+
+    # shard rejimida faqat bitta worker (w0 doim bor) arxivlaydi
+    archiver = None
+    if config.archive_after_days and config.shard_name in ("", "w0"):
+        archiver = ArchiveJob(
+            get_engine(), sessionmaker, config.archive_after_days,
+            batch_size=config.archive_batch,
+            interval=config.archive_interval_min * 60,
+        )
+        archiver.start()
+    dp["archiver"] = archiver
+
+    renderer = CertificateRenderer(config.cert_template, config.cert_font, workers=config.cert_workers)
+    renderer.start()
+    certs = CertificateService(
+        bot, outbox, sessionmaker, renderer,
+        secret=config.cert_secret,
+        min_percent=config.cert_min_percent,
+    )
+    dp["certs"] = certs
+
     for r in all_routers:
         dp.include_router(r)
-
-    # ✅ Render uchun port ochamiz (bot bilan parallel ishlaydi)
-    await start_web_server()
-
-    await dp.start_polling(bot)
+    metrics.install(dp, all_routers, bot)
+
+    runner = None
+    try:
+        if config.shard_name:
+            # shard worker: update'lar ingress'dan keladi, public port ingress'da
+            _register_gauges(dp)
+            await serve_worker(dp, bot, config, limiter)
+            return
+        # ✅ Render uchun port ochamiz (bot bilan parallel ishlaydi)
+        runner = await start_web_server(dp, bot, config)
+        if config.delivery_mode == "webhook":
+            await bot.set_webhook(
+                config.webhook_url,
+                secret_token=config.webhook_secret,
+                allowed_updates=dp.resolve_used_update_types(),
+            )
+            await asyncio.Event().wait()
+        else:
+            # oldin webhook o‘rnatilgan bo‘lsa getUpdates ishlamaydi
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
+    finally:
+        await sweeper.stop()
+        if journal:
+            await journal.stop()
+        await broadcaster.stop()
+        if archiver:
+            await archiver.stop()
+        await certs.stop()
+        if runner:
+            await runner.cleanup()
+        await outbox.stop()
+        await dp.storage.close()
+        await bot.session.close()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
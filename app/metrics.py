@@ -0,0 +1,238 @@
+"""
+Prometheus text formatidagi metrikalar (GET /metrics) — tashqi kutubxonasiz.
+
+Manbalar:
+- `UpdateMetricsMiddleware` (dp.update outer) — update soni/davomiyligi va
+  har bir update'dagi DB so‘rovlar/commit'lar soni;
+- `HandlerMetricsMiddleware` (router'larning inner middleware'i) — handler latency;
+- `TelegramMetricsMiddleware` (bot.session) — Bot API so‘rovlari davomiyligi;
+- `instrument_engine` — SQLAlchemy event'lari: so‘rovlar, commit'lar, davomiylik;
+- `TimedQueuePool` — pool'dan ulanish olishni kutish vaqti;
+- gauge'lar (FSM, ochiq urinishlar, navbatlar) faqat scrape paytida o‘qiladi.
+
+Har bir kuzatuv — bitta `perf_counter` farqi va `bisect`, lock yo‘q (bitta event
+loop), shuning uchun production'da doim yoqiq turishi mumkin.
+"""
+from __future__ import annotations
+
+import contextvars
+import inspect
+import time
+from bisect import bisect_left
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod
+from aiogram.types import TelegramObject, Update
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+COUNT_BUCKETS = (0, 1, 2, 3, 4, 6, 8, 12, 16, 32)
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{str(v).replace(chr(34), "")}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels, value: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in self._values.items():
+            lines.append(f"{self.name}{_labels(self.labels, key)} {_num(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # labels -> [bucket'lar bo‘yicha soni (+Inf bilan), yig‘indi]
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def totals(self, *labels) -> tuple[int, float]:
+        """(kuzatuvlar soni, yig‘indi)."""
+        series = self._series.get(labels)
+        if series is None:
+            return 0, 0.0
+        return sum(series[0]), series[1]
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = 'le="%s"' % ("+Inf" if bound == float("inf") else _num(bound))
+                lines.append(f"{self.name}_bucket{_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {_num(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list[Counter | Histogram] = []
+        self._gauges: list[tuple[str, str, Callable[[], Any]]] = []
+
+    def add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, help: str, fn: Callable[[], Any]) -> None:
+        """fn scrape paytida chaqiriladi (sync yoki async)."""
+        self._gauges = [g for g in self._gauges if g[0] != name] + [(name, help, fn)]
+
+    async def render(self) -> str:
+        lines: list[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for name, help, fn in self._gauges:
+            value = fn()
+            if inspect.isawaitable(value):
+                value = await value
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge", f"{name} {_num(value)}"]
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+UPDATES = REGISTRY.add(Counter("bot_updates_total", "Qayta ishlangan update'lar", ("type",)))
+UPDATE_ERRORS = REGISTRY.add(Counter("bot_update_errors_total", "Xato bilan tugagan update'lar", ("type",)))
+UPDATE_SECONDS = REGISTRY.add(Histogram("bot_update_duration_seconds", "Update'ni to‘liq qayta ishlash vaqti", ("type",)))
+HANDLER_SECONDS = REGISTRY.add(Histogram("bot_handler_duration_seconds", "Handler ichidagi vaqt", ("handler",)))
+UPDATE_QUERIES = REGISTRY.add(
+    Histogram("bot_update_db_queries", "Bitta update'dagi DB so‘rovlar soni", buckets=COUNT_BUCKETS)
+)
+UPDATE_COMMITS = REGISTRY.add(
+    Histogram("bot_update_db_commits", "Bitta update'dagi commit'lar soni", buckets=COUNT_BUCKETS)
+)
+TELEGRAM_SECONDS = REGISTRY.add(Histogram("telegram_api_duration_seconds", "Bot API so‘rovlari", ("method",)))
+DB_QUERY_SECONDS = REGISTRY.add(Histogram("db_query_duration_seconds", "DB so‘rovlari davomiyligi", buckets=DB_BUCKETS))
+DB_COMMITS = REGISTRY.add(Counter("db_commits_total", "Commit'lar"))
+POOL_WAIT_SECONDS = REGISTRY.add(
+    Histogram("db_pool_checkout_seconds", "Pool'dan ulanish olishni kutish", buckets=DB_BUCKETS)
+)
+
+# joriy update'dagi [so‘rovlar, commit'lar]; greenlet orqali SQLAlchemy event'larigacha yetib boradi
+_update_db: contextvars.ContextVar[list[int] | None] = contextvars.ContextVar("metrics_update_db", default=None)
+
+
+# ===================== aiogram =====================
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: dict[str, Any],
+    ) -> Any:
+        kind = event.event_type
+        counts = [0, 0]
+        token = _update_db.set(counts)
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            UPDATE_ERRORS.inc(kind)
+            raise
+        finally:
+            UPDATE_SECONDS.observe(time.perf_counter() - start, kind)
+            UPDATES.inc(kind)
+            UPDATE_QUERIES.observe(counts[0])
+            UPDATE_COMMITS.observe(counts[1])
+            _update_db.reset(token)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        name = data["handler"].callback.__name__
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - start, name)
+
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod):
+        start = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        finally:
+            TELEGRAM_SECONDS.observe(time.perf_counter() - start, type(method).__name__)
+
+
+def install(dp, routers, bot: Bot) -> None:
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    for router in routers:
+        router.message.middleware(HandlerMetricsMiddleware())
+        router.callback_query.middleware(HandlerMetricsMiddleware())
+    # rate limit'dan keyin ulanadi — faqat API vaqtini o‘lchaydi
+    bot.session.middleware(TelegramMetricsMiddleware())
+
+
+# ===================== SQLAlchemy =====================
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            POOL_WAIT_SECONDS.observe(time.perf_counter() - start)
+
+
+def instrument_engine(engine: Engine) -> None:
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info["metrics_t"] = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info.pop("metrics_t", None)
+        if start is not None:
+            DB_QUERY_SECONDS.observe(time.perf_counter() - start)
+        counts = _update_db.get()
+        if counts is not None:
+            counts[0] += 1
+
+    @event.listens_for(engine, "commit")
+    def _commit(conn):
+        DB_COMMITS.inc()
+        counts = _update_db.get()
+        if counts is not None:
+            counts[1] += 1
@@ -0,0 +1,189 @@
+"""
+Versiyalangan sxema migratsiyalari.
+
+Har bir migratsiya sinxron `fn(conn)` bo‘lib, alohida tranzaksiyada ishlaydi va
+`schema_version` jadvaliga yoziladi. Yangi baza uchun `create_tables()` allaqachon
+hamma narsani yaratgan bo‘ladi, shuning uchun migratsiyalar idempotent yoziladi
+(avval inspector bilan tekshiradi).
+
+Qo‘lda ishga tushirish:  python -m app.migrations
+"""
+from __future__ import annotations
+
+import asyncio
+from typing import Callable
+
+from sqlalchemy import Connection, func, inspect, select, text
+from sqlalchemy.schema import CreateTable
+
+from .db import get_engine
+from .models import (
+    Question, Attempt, Answer, SchemaVersion, TestBest, TestScoreHist, IdSequence, UserStats, AttemptArchive,
+    Certificate,
+)
+from .stats import user_stats_rebuild
+
+
+def _add_column(conn: Connection, table: str, column: str, ddl: str) -> None:
+    cols = {c["name"] for c in inspect(conn).get_columns(table)}
+    if column not in cols:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def _create_index(conn: Connection, table, name: str) -> None:
+    index = next(i for i in table.indexes if i.name == name)
+    index.create(conn, checkfirst=True)
+
+
+# ===================== Migrations =====================
+
+def m001_user_admin_flags(conn: Connection) -> None:
+    # avvalgi migrate_add_is_admin.py / migrate_add_is_superadmin.py
+    _add_column(conn, "users", "is_admin", "BOOLEAN NOT NULL DEFAULT false")
+    _add_column(conn, "users", "is_superadmin", "BOOLEAN NOT NULL DEFAULT false")
+
+
+def m002_hot_path_indexes(conn: Connection) -> None:
+    # unique index qo‘yishdan oldin takroriy javoblarni tozalaymiz (eng birinchisi qoladi)
+    conn.execute(text(
+        "DELETE FROM answers WHERE id NOT IN "
+        "(SELECT MIN(id) FROM answers GROUP BY attempt_id, question_id)"
+    ))
+    _create_index(conn, Question.__table__, "ix_questions_test_order")
+    _create_index(conn, Answer.__table__, "uq_answers_attempt_question")
+    _create_index(conn, Attempt.__table__, "ix_attempts_user_status")
+    _create_index(conn, Attempt.__table__, "ix_attempts_test_status")
+
+
+def m003_user_blocked_flag(conn: Connection) -> None:
+    _add_column(conn, "users", "is_blocked", "BOOLEAN NOT NULL DEFAULT false")
+
+
+def m004_test_leaderboard(conn: Connection) -> None:
+    # mavjud yakunlangan urinishlardan reyting jadvallarini to‘ldiramiz
+    TestBest.__table__.create(conn, checkfirst=True)
+    TestScoreHist.__table__.create(conn, checkfirst=True)
+    if conn.execute(select(TestBest.test_id).limit(1)).first():
+        return
+    conn.execute(text(
+        "INSERT INTO test_best "
+        "(test_id, telegram_id, attempt_id, score, total, percent, time_spent_sec, finished_at) "
+        "SELECT test_id, telegram_id, id, score, total, percent, time_spent_sec, "
+        "COALESCE(finished_at, started_at) FROM ("
+        "  SELECT a.*, ROW_NUMBER() OVER ("
+        "    PARTITION BY test_id, telegram_id ORDER BY percent DESC, time_spent_sec, id"
+        "  ) AS rn FROM attempts a WHERE status IN ('finished', 'timeout')"
+        ") ranked WHERE rn = 1"
+    ))
+    conn.execute(text(
+        "INSERT INTO test_score_hist (test_id, percent, count) "
+        "SELECT test_id, percent, COUNT(*) FROM test_best GROUP BY test_id, percent"
+    ))
+
+
+def m005_in_progress_index(conn: Connection) -> None:
+    _create_index(conn, Attempt.__table__, "ix_attempts_in_progress")
+
+
+def m006_id_sequences(conn: Connection) -> None:
+    # public_ids: eski tasodifiy ID'lar (5 raqam) yangi oraliqlarga tushmaydi, ko‘chirish shart emas
+    IdSequence.__table__.create(conn, checkfirst=True)
+
+
+def m007_user_stats(conn: Connection) -> None:
+    # "📊 Natijalarim" yig‘masi va tarix sahifalash indeksi; mavjud urinishlardan to‘ldiramiz
+    UserStats.__table__.create(conn, checkfirst=True)
+    _create_index(conn, Attempt.__table__, "ix_attempts_user_id")
+    if conn.execute(select(UserStats.telegram_id).limit(1)).first():
+        return
+    conn.execute(user_stats_rebuild())
+
+
+def m008_attempt_shuffle_seed(conn: Connection) -> None:
+    # eski (ochiq) urinishlar NULL bilan asl tartibda davom etadi
+    _add_column(conn, "attempts", "shuffle_seed", "INTEGER")
+
+
+def m009_attempts_archive(conn: Connection) -> None:
+    # ko‘chirish ArchiveJob'da, fonda; bu yerda faqat jadval
+    AttemptArchive.__table__.create(conn, checkfirst=True)
+
+
+def m010_attempts_autoincrement(conn: Connection) -> None:
+    # SQLite AUTOINCREMENT'siz eng katta id o‘chirilsa, uni qayta beradi — arxiv va
+    # sertifikatlar bilan to‘qnashadi. Jadvalni AUTOINCREMENT bilan qayta quramiz
+    # (PostgreSQL sequence'lari id'ni qayta bermaydi)
+    if conn.dialect.name != "sqlite":
+        return
+    ddl = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'attempts'")).scalar()
+    if "AUTOINCREMENT" not in ddl.upper():
+        table = Attempt.__table__
+        cols = ", ".join(c.name for c in table.columns)
+        create = str(CreateTable(table).compile(dialect=conn.dialect))
+        conn.execute(text(create.replace("CREATE TABLE attempts ", "CREATE TABLE attempts_new ", 1)))
+        conn.execute(text(f"INSERT INTO attempts_new ({cols}) SELECT {cols} FROM attempts"))
+        conn.execute(text("DROP TABLE attempts"))
+        conn.execute(text("ALTER TABLE attempts_new RENAME TO attempts"))
+        for index in table.indexes:
+            index.create(conn)
+
+    # hisoblagich: avval berilgan har qanday attempt id'dan katta
+    used = [
+        select(func.max(Attempt.id)).scalar_subquery(),
+        select(func.max(AttemptArchive.id)).scalar_subquery(),
+        select(func.max(Certificate.attempt_id)).scalar_subquery(),
+        select(func.max(Answer.attempt_id)).scalar_subquery(),
+        select(func.max(TestBest.attempt_id)).scalar_subquery(),
+    ]
+    top = max(v or 0 for v in conn.execute(select(*used)).one())
+    conn.execute(text("DELETE FROM sqlite_sequence WHERE name = 'attempts'"))
+    conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('attempts', :seq)"), {"seq": top})
+
+
+MIGRATIONS: list[tuple[int, Callable[[Connection], None]]] = [
+    (1, m001_user_admin_flags),
+    (2, m002_hot_path_indexes),
+    (3, m003_user_blocked_flag),
+    (4, m004_test_leaderboard),
+    (5, m005_in_progress_index),
+    (6, m006_id_sequences),
+    (7, m007_user_stats),
+    (8, m008_attempt_shuffle_seed),
+    (9, m009_attempts_archive),
+    (10, m010_attempts_autoincrement),
+]
+
+
+async def run_migrations() -> list[int]:
+    engine = get_engine()
+
+    async with engine.begin() as conn:
+        await conn.run_sync(SchemaVersion.__table__.create, checkfirst=True)
+        q = await conn.execute(select(SchemaVersion.version))
+        applied = set(q.scalars().all())
+
+    done = []
+    for version, fn in MIGRATIONS:
+        if version in applied:
+            continue
+        async with engine.begin() as conn:
+            await conn.run_sync(fn)
+            await conn.execute(
+                SchemaVersion.__table__.insert().values(version=version, name=fn.__name__)
+            )
+        done.append(version)
+    return done
+
+
+if __name__ == "__main__":
+    from .config import load_config
+    from .db import EngineProfile, init_engine, create_tables
+
+    async def _main():
+        config = load_config()
+        init_engine(config.db_url, EngineProfile.from_config(config))
+        await create_tables()
+        done = await run_migrations()
+        print(f"✅ Migratsiyalar: {done or 'yangi migratsiya yo‘q'}")
+
+    asyncio.run(_main())
@@ -1,4 +1,4 @@
-from sqlalchemy import String, Integer, Boolean, ForeignKey, DateTime, Text
+from sqlalchemy import String, Integer, Boolean, ForeignKey, DateTime, Text, Index, LargeBinary, false, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from datetime import datetime
 from .db import Base
@@ -10,6 +10,9 @@ class User(Base):
     telegram_id: Mapped[int] = mapped_column(Integer, unique=True, index=True)
     full_name: Mapped[str] = mapped_column(String(255))
     phone: Mapped[str | None] = mapped_column(String(50), nullable=True)
+    is_admin: Mapped[bool] = mapped_column(Boolean, default=False, server_default=false())
+    is_superadmin: Mapped[bool] = mapped_column(Boolean, default=False, server_default=false())
+    is_blocked: Mapped[bool] = mapped_column(Boolean, default=False, server_default=false())  # botni bloklagan
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
     attempts: Mapped[list["Attempt"]] = relationship(back_populates="user")
@@ -33,6 +36,9 @@ class Test(Base):
 
 class Question(Base):
     __tablename__ = "questions"
+    __table_args__ = (
+        Index("ix_questions_test_order", "test_id", "order_index"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     test_id: Mapped[int] = mapped_column(ForeignKey("tests.id"))
@@ -47,8 +53,25 @@ class Question(Base):
     test: Mapped["Test"] = relationship(back_populates="questions")
     answers: Mapped[list["Answer"]] = relationship(back_populates="question")
 
+FINISHED_STATUSES = ("finished", "timeout")
+
 class Attempt(Base):
     __tablename__ = "attempts"
+    __table_args__ = (
+        Index("ix_attempts_user_status", "telegram_id", "status", "id"),
+        Index("ix_attempts_test_status", "test_id", "status", "id"),
+        # foydalanuvchi tarixi: keyset sahifalash (telegram_id, id) bo‘yicha
+        Index("ix_attempts_user_id", "telegram_id", "id"),
+        # faqat ochiq urinishlar — /metrics dagi sanash uchun kichik index
+        Index(
+            "ix_attempts_in_progress", "id",
+            sqlite_where=text("status = 'in_progress'"),
+            postgresql_where=text("status = 'in_progress'"),
+        ),
+        # SQLite oxirgi o‘chirilgan (arxivga ko‘chgan) id'ni qayta bermasin:
+        # attempts_archive, certificates va test_best shu id bilan bog‘langan
+        {"sqlite_autoincrement": True},
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     test_id: Mapped[int] = mapped_column(ForeignKey("tests.id"))
@@ -63,6 +86,8 @@ class Attempt(Base):
     time_spent_sec: Mapped[int] = mapped_column(Integer, default=0)
 
     status: Mapped[str] = mapped_column(String(20), default="in_progress")  # finished / timeout / in_progress
+    # savol/variant tartibi shu sondan hisoblanadi (shuffle.py); NULL — asl tartib
+    shuffle_seed: Mapped[int | None] = mapped_column(Integer, nullable=True)
 
     test: Mapped["Test"] = relationship(back_populates="attempts")
     user: Mapped["User"] = relationship(back_populates="attempts", primaryjoin="User.telegram_id==Attempt.telegram_id")
@@ -70,6 +95,9 @@ class Attempt(Base):
 
 class Answer(Base):
     __tablename__ = "answers"
+    __table_args__ = (
+        Index("uq_answers_attempt_question", "attempt_id", "question_id", unique=True),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     attempt_id: Mapped[int] = mapped_column(ForeignKey("attempts.id"))
@@ -78,4 +106,115 @@ class Answer(Base):
     is_correct: Mapped[bool] = mapped_column(Boolean, default=False)
 
     attempt: Mapped["Attempt"] = relationship(back_populates="answers")
-    question: Mapped["Question"] = relationship(back_populates="answers")
\ No newline at end of file
+    question: Mapped["Question"] = relationship(back_populates="answers")
+
+class SchemaVersion(Base):
+    __tablename__ = "schema_version"
+
+    version: Mapped[int] = mapped_column(Integer, primary_key=True)
+    name: Mapped[str] = mapped_column(String(255))
+    applied_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class FsmRecord(Base):
+    __tablename__ = "fsm_states"
+
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    state: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    data: Mapped[str] = mapped_column(Text, default="{}")  # JSON
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+
+class Broadcast(Base):
+    __tablename__ = "broadcasts"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    text: Mapped[str] = mapped_column(Text)
+    created_by: Mapped[int] = mapped_column(Integer)
+    status: Mapped[str] = mapped_column(String(20), default="running")  # running / done
+    last_user_id: Mapped[int] = mapped_column(Integer, default=0)  # keyset kursor (users.id)
+    sent: Mapped[int] = mapped_column(Integer, default=0)
+    failed: Mapped[int] = mapped_column(Integer, default=0)
+    blocked: Mapped[int] = mapped_column(Integer, default=0)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+class TestScoreHist(Base):
+    # har test uchun foydalanuvchilarning eng yaxshi foizlari taqsimoti (0..100)
+    __tablename__ = "test_score_hist"
+
+    test_id: Mapped[int] = mapped_column(ForeignKey("tests.id"), primary_key=True)
+    percent: Mapped[int] = mapped_column(Integer, primary_key=True)
+    count: Mapped[int] = mapped_column(Integer, default=0)
+
+class TestBest(Base):
+    # har test + foydalanuvchi uchun eng yaxshi urinish (reyting shu jadvaldan)
+    __tablename__ = "test_best"
+    __table_args__ = (
+        Index("ix_test_best_rank", "test_id", text("percent DESC"), "time_spent_sec", "attempt_id"),
+    )
+
+    test_id: Mapped[int] = mapped_column(ForeignKey("tests.id"), primary_key=True)
+    telegram_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    attempt_id: Mapped[int] = mapped_column(Integer)
+    score: Mapped[int] = mapped_column(Integer, default=0)
+    total: Mapped[int] = mapped_column(Integer, default=0)
+    percent: Mapped[int] = mapped_column(Integer, default=0)
+    time_spent_sec: Mapped[int] = mapped_column(Integer, default=0)
+    finished_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class Certificate(Base):
+    # ma'lumotlar nusxalanadi: test/urinish o‘chirilsa ham sertifikat tekshiriladigan bo‘lib qoladi
+    __tablename__ = "certificates"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    attempt_id: Mapped[int] = mapped_column(Integer, unique=True, index=True)
+    serial: Mapped[str] = mapped_column(String(32), unique=True, index=True)
+    telegram_id: Mapped[int] = mapped_column(Integer, index=True)
+    full_name: Mapped[str] = mapped_column(String(255))
+    test_title: Mapped[str] = mapped_column(String(255))
+    score: Mapped[int] = mapped_column(Integer)
+    total: Mapped[int] = mapped_column(Integer)
+    percent: Mapped[int] = mapped_column(Integer)
+    file_id: Mapped[str | None] = mapped_column(String(255), nullable=True)  # Telegram file_id (qayta yuborish uchun)
+    issued_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+class IdSequence(Base):
+    # monoton hisoblagichlar (public_ids) va ularning permutatsiya kaliti
+    __tablename__ = "id_sequences"
+
+    name: Mapped[str] = mapped_column(String(32), primary_key=True)
+    value: Mapped[int] = mapped_column(Integer, default=0)
+    key: Mapped[str] = mapped_column(String(64))
+
+class UserStats(Base):
+    # foydalanuvchi bo‘yicha yig‘ma natijalar (stats.record_finish yangilaydi)
+    __tablename__ = "user_stats"
+
+    telegram_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)  # yakunlangan (finished + timeout)
+    timeouts: Mapped[int] = mapped_column(Integer, default=0)
+    percent_sum: Mapped[int] = mapped_column(Integer, default=0)
+    best_percent: Mapped[int] = mapped_column(Integer, default=0)
+    tests: Mapped[int] = mapped_column(Integer, default=0)  # turli testlar soni
+    last_finished_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+class AttemptArchive(Base):
+    # sovuq qatlam (archive.py): eski yakunlangan urinishlar, javoblari siqilgan blob'da
+    __tablename__ = "attempts_archive"
+    __table_args__ = (
+        Index("ix_attempts_archive_user_id", "telegram_id", "id"),
+        Index("ix_attempts_archive_test_id", "test_id", "id"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)  # asl attempts.id
+    test_id: Mapped[int] = mapped_column(ForeignKey("tests.id"))
+    telegram_id: Mapped[int] = mapped_column(Integer)
+    started_at: Mapped[datetime] = mapped_column(DateTime)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    score: Mapped[int] = mapped_column(Integer, default=0)
+    total: Mapped[int] = mapped_column(Integer, default=0)
+    percent: Mapped[int] = mapped_column(Integer, default=0)
+    time_spent_sec: Mapped[int] = mapped_column(Integer, default=0)
+    status: Mapped[str] = mapped_column(String(20))
+    shuffle_seed: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    answers: Mapped[bytes] = mapped_column(LargeBinary)  # archive.pack_answers
+    archived_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,210 @@
+"""
+Chiquvchi xabarlar uchun rate limit va navbat.
+
+- `RateLimiter`: global (≈30 msg/s) va har bir chat uchun token bucket.
+- `RateLimitMiddleware`: bot session'iga ulanadi — barcha send/edit so‘rovlari
+  (handler'lardagi `message.answer` ham) limitdan o‘tadi, `TelegramRetryAfter`
+  kelsa kutib, qayta yuboriladi.
+- `Outbox`: ommaviy xabarlar (timeout, e'lon, sertifikat) uchun navbat.
+  Handler darhol qaytadi, xabarlar ruxsat etilgan maksimal tezlikda ketadi.
+  Bitta chat xabarlari tartibi saqlanadi, interaktiv javoblar ommaviylardan
+  oldin o‘tadi.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import contextvars
+import itertools
+import logging
+import time
+from collections import deque
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter
+from aiogram.methods import SendMessage, TelegramMethod
+
+from .cache import LRUCache
+
+log = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+BULK = 10
+
+# Outbox worker'lari ichida True bo‘ladi — limiter ularni interaktivlardan keyin qo‘yadi
+_bulk: contextvars.ContextVar[bool] = contextvars.ContextVar("outbound_bulk", default=False)
+
+_LIMITED_PREFIXES = ("Send", "Edit", "Copy", "Forward")
+
+
+@contextlib.contextmanager
+def bulk_priority():
+    """Ichidagi barcha so‘rovlar ommaviy (past prioritet) hisoblanadi."""
+    token = _bulk.set(True)
+    try:
+        yield
+    finally:
+        _bulk.reset(token)
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated", "blocked_until")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def wait_time(self, now: float) -> float:
+        """Token olish uchun qancha kutish kerak (0 — hozir mumkin)."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self) -> None:
+        self.tokens -= 1
+
+    def block(self, seconds: float) -> None:
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class RateLimiter:
+    def __init__(self, global_rate: float = 30, chat_rate: float = 1, chat_burst: float = 3, max_chats: int = 50_000):
+        # global limit tekis taqsimlanadi (burst yo‘q), chat'ga esa kichik burst ruxsat
+        self.global_bucket = TokenBucket(global_rate, 1)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self._chats: LRUCache[int, TokenBucket] = LRUCache(maxsize=max_chats)
+        self._interactive_waiting = 0
+
+    def _chat(self, chat_id: int | str | None) -> TokenBucket | None:
+        if chat_id is None:
+            return None
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._chats.set(chat_id, bucket)
+        return bucket
+
+    async def acquire(self, chat_id: int | str | None, bulk: bool = False) -> None:
+        chat = self._chat(chat_id)
+        while True:
+            now = time.monotonic()
+            if bulk and self._interactive_waiting:
+                # interaktiv javoblar navbatda — ularga yo‘l beramiz
+                await asyncio.sleep(1 / self.global_bucket.rate)
+                continue
+
+            wait = max(self.global_bucket.wait_time(now), chat.wait_time(now) if chat else 0.0)
+            if wait <= 0:
+                self.global_bucket.consume()
+                if chat:
+                    chat.consume()
+                return
+
+            if bulk:
+                await asyncio.sleep(wait)
+                continue
+            self._interactive_waiting += 1
+            try:
+                await asyncio.sleep(wait)
+            finally:
+                self._interactive_waiting -= 1
+
+    def retry_after(self, chat_id: int | str | None, seconds: float) -> None:
+        # Telegram flood control — shu chat (yoki chat bo‘lmasa hammasi) to‘xtaydi
+        bucket = self._chat(chat_id) or self.global_bucket
+        bucket.block(seconds)
+
+
+class RateLimitMiddleware(BaseRequestMiddleware):
+    def __init__(self, limiter: RateLimiter, max_retries: int = 3):
+        self.limiter = limiter
+        self.max_retries = max_retries
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot: Bot, method: TelegramMethod):
+        limited = type(method).__name__.startswith(_LIMITED_PREFIXES)
+        chat_id = getattr(method, "chat_id", None)
+
+        for attempt in range(self.max_retries + 1):
+            if limited:
+                await self.limiter.acquire(chat_id, bulk=_bulk.get())
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt >= self.max_retries:
+                    raise
+                self.limiter.retry_after(chat_id, e.retry_after)
+                log.warning("Flood control: %s, %ss kutamiz", type(method).__name__, e.retry_after)
+
+
+class Outbox:
+    def __init__(self, bot: Bot, workers: int = 8):
+        self.bot = bot
+        self.workers = workers
+
+        # chat_id -> navbatdagi so‘rovlar; tayyor chatlar esa priority queue'da
+        self._pending: dict[int | str, deque[tuple[int, TelegramMethod]]] = {}
+        self._ready: asyncio.PriorityQueue[tuple[int, int, int | str]] = asyncio.PriorityQueue()
+        self._seq = itertools.count()
+        self._depth = 0
+        self._tasks: list[asyncio.Task] = []
+
+    @property
+    def depth(self) -> int:
+        return self._depth
+
+    def submit(self, method: TelegramMethod, priority: int = BULK) -> None:
+        chat_id = getattr(method, "chat_id", None)
+        key = chat_id if chat_id is not None else f"_{next(self._seq)}"
+        queue = self._pending.get(key)
+        if queue is None:
+            queue = self._pending[key] = deque()
+            self._ready.put_nowait((priority, next(self._seq), key))
+        queue.append((priority, method))
+        self._depth += 1
+
+    def send_message(self, chat_id: int, text: str, priority: int = BULK, **kwargs) -> None:
+        self.submit(SendMessage(chat_id=chat_id, text=text, **kwargs), priority)
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, drain_timeout: float = 10) -> None:
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(self._ready.join(), timeout=drain_timeout)
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        self._tasks = []
+
+    async def _worker(self) -> None:
+        while True:
+            _, _, key = await self._ready.get()
+            queue = self._pending[key]
+            priority, method = queue.popleft()
+            self._depth -= 1
+            token = _bulk.set(priority >= BULK)
+            try:
+                await self.bot(method)
+            except TelegramAPIError as e:
+                log.info("Outbox: %s yuborilmadi: %s", type(method).__name__, e)
+            except Exception:
+                log.exception("Outbox xatosi")
+            finally:
+                _bulk.reset(token)
+                # chat ichidagi tartib saqlanadi: keyingisi faqat shu yerdan navbatga qo‘yiladi
+                if queue:
+                    self._ready.put_nowait((queue[0][0], next(self._seq), key))
+                else:
+                    del self._pending[key]
+                self._ready.task_done()
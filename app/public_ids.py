@@ -0,0 +1,87 @@
+"""
+Testlar uchun qisqa, takrorlanmaydigan va taxmin qilib bo‘lmaydigan public ID.
+
+Ishlash tartibi:
+- `id_sequences` jadvalidagi hisoblagich test yaratish tranzaksiyasi ichida
+  `UPDATE ... RETURNING` bilan oshiriladi. Navbatdagi n monoton, takrorlanmaydi
+  va bo‘shliq qoldirmaydi.
+- n kalitli permutatsiyadan o‘tadi: 4 raundli Feistel (HMAC-SHA256) va cycle-walking.
+  Bu joriy "daraja" oralig‘ining bijeksiyasi, shuning uchun ketma-ket testlarning
+  ID'lari tasodifiyga o‘xshaydi, lekin hech qachon to‘qnashmaydi.
+- Daraja to‘lsa, ID bir raqamga uzayadi: T100000–T999999 (900 ming),
+  keyin T1000000–T9999999 va hokazo. Uzunliklar har xil bo‘lgani uchun
+  darajalar ham o‘zaro to‘qnashmaydi.
+- Eski tasodifiy ID'lar (T10000–T99999, 5 raqam) hech bir darajaga tushmaydi.
+
+Natija: har bir yangi test uchun bitta INSERT, qayta urinish yo‘q, narx O(1).
+Kalit jadvalda birinchi ishlatilganda yaratiladi. U o‘zgarmasligi kerak,
+token o‘zgarsa ham.
+"""
+from __future__ import annotations
+
+import hashlib
+import hmac
+import secrets
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .db import dialect_insert
+from .models import IdSequence
+
+TEST_PUBLIC_ID = "test_public_id"
+
+FIRST_WIDTH = 6
+_ROUNDS = 4
+
+
+def _feistel(key: bytes, width: int, x: int, half_bits: int) -> int:
+    mask = (1 << half_bits) - 1
+    left, right = x >> half_bits, x & mask
+    for r in range(_ROUNDS):
+        digest = hmac.new(key, f"{width}:{r}:{right}".encode(), hashlib.sha256).digest()
+        left, right = right, left ^ (int.from_bytes(digest[:8], "big") & mask)
+    return (left << half_bits) | right
+
+
+def permute(key: bytes, width: int, n: int) -> int:
+    """[0, 9·10^(width-1)) oralig‘ining kalitli permutatsiyasi."""
+    size = 9 * 10 ** (width - 1)
+    if not 0 <= n < size:
+        raise ValueError(f"n={n} {width} xonali oraliqdan tashqarida")
+    half_bits = ((size - 1).bit_length() + 1) // 2
+    x = n
+    # domen (2^(2h)) oraliqdan katta: tashqariga chiqsa yana aylantiramiz —
+    # permutatsiya sikli albatta oraliqqa qaytadi; o‘rtacha ≤ 4 qadam
+    while True:
+        x = _feistel(key, width, x, half_bits)
+        if x < size:
+            return x
+
+
+def format_public_id(key: bytes, n: int) -> str:
+    """n-chi (0 dan) test uchun public ID."""
+    width = FIRST_WIDTH
+    while n >= 9 * 10 ** (width - 1):
+        n -= 9 * 10 ** (width - 1)
+        width += 1
+    return f"T{10 ** (width - 1) + permute(key, width, n)}"
+
+
+async def allocate_public_id(session: AsyncSession, name: str = TEST_PUBLIC_ID) -> str:
+    """Hisoblagichni shu session tranzaksiyasida oshiradi; test INSERT'i bilan birga commit qilinsin."""
+    stmt = (
+        update(IdSequence)
+        .where(IdSequence.name == name)
+        .values(value=IdSequence.value + 1)
+        .returning(IdSequence.value, IdSequence.key)
+    )
+    row = (await session.execute(stmt)).one_or_none()
+    if row is None:
+        await session.execute(
+            dialect_insert(IdSequence.__table__)
+            .values(name=name, value=0, key=secrets.token_hex(32))
+            .on_conflict_do_nothing(index_elements=["name"])
+        )
+        row = (await session.execute(stmt)).one()
+    return format_public_id(bytes.fromhex(row.key), row.value - 1)
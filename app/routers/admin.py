@@ -1,15 +1,24 @@
 from __future__ import annotations
 
-from aiogram import Router, F
-from aiogram.types import Message
+import contextlib
+import io
+
+from aiogram import Bot, Router, F
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import Message, CallbackQuery
 from aiogram.filters import BaseFilter
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
 
-from sqlalchemy import select, func
+from sqlalchemy import delete, select, func, insert, union_all
 
-from ..models import Test, Question, Attempt, User
-from ..utils import make_test_public_id
+from ..models import Test, Question, Attempt, AttemptArchive, User, FINISHED_STATUSES
+from ..public_ids import allocate_public_id
+from ..cache import LRUCache, invalidate_test, get_identity, invalidate_identity, get_test_snapshot
+from ..keyboards import kb_page
+from ..importer import parse_questions, MAX_QUESTIONS
+from .. import stats
+from ..analytics import get_report, render_report
 
 router = Router()
 
@@ -20,10 +29,8 @@ class AdminOnly(BaseFilter):
         if message.from_user.id in config.admin_ids:
             return True
 
-        async with sessionmaker() as session:
-            q = await session.execute(select(User).where(User.telegram_id == message.from_user.id))
-            u = q.scalar_one_or_none()
-        return bool(u and u.is_admin)
+        ident = await get_identity(sessionmaker, message.from_user.id)
+        return ident.is_admin
 
 class SuperAdminOnly(BaseFilter):
     async def __call__(self, message: Message, config, sessionmaker) -> bool:
@@ -31,19 +38,12 @@ class SuperAdminOnly(BaseFilter):
         if message.from_user.id in config.admin_ids:
             return True
 
-        async with sessionmaker() as session:
-            q = await session.execute(select(User).where(User.telegram_id == message.from_user.id))
-            u = q.scalar_one_or_none()
-        return bool(u and u.is_superadmin)
+        ident = await get_identity(sessionmaker, message.from_user.id)
+        return ident.is_superadmin
+
+
 # ===================== FSMs =====================
-@router.message(SuperAdminOnly(), F.text == "👑 Admin qo‘shish")
-async def add_admin_start(message: Message, state: FSMContext):
-    await state.set_state(AddAdminFSM.waiting_user_id)
-    await message.answer("Admin qilinadigan user telegram ID sini yuboring:")
-@router.message(SuperAdminOnly(), F.text == "❌ Adminni olish")
-async def remove_admin_start(message: Message, state: FSMContext):
-    await state.set_state(RemoveAdminFSM.waiting_user_id)
-    await message.answer("Adminlikdan olinadigan user telegram ID sini yuboring:")
+
 class CreateTestFSM(StatesGroup):
     title = State()
     duration_min = State()
@@ -57,6 +57,12 @@ class CreateTestFSM(StatesGroup):
     correct = State()
 
 
+class ImportTestFSM(StatesGroup):
+    title = State()
+    duration_min = State()
+    document = State()
+
+
 class AdminWhoFSM(StatesGroup):
     waiting_test_id = State()
 
@@ -69,6 +75,18 @@ class AdminManageFSM(StatesGroup):
     waiting_user_id = State()
 
 
+class BroadcastFSM(StatesGroup):
+    waiting_text = State()
+
+
+class AnalyticsFSM(StatesGroup):
+    waiting_test_id = State()
+
+
+class CertBatchFSM(StatesGroup):
+    waiting_test_id = State()
+
+
 # ===================== Create Test =====================
 
 @router.message(AdminOnly(), F.text == "➕ Test yaratish")
@@ -120,9 +138,10 @@ async def admin_create_test_qcount(message: Message, state: FSMContext, sessionm
         return
 
     data = await state.get_data()
-    public_id = make_test_public_id()
 
     async with sessionmaker() as session:
+        # hisoblagich + test — bitta tranzaksiya, to‘qnashuv yo‘q
+        public_id = await allocate_public_id(session)
         test = Test(
             public_id=public_id,
             title=data["title"],
@@ -204,6 +223,7 @@ async def admin_correct(message: Message, state: FSMContext, sessionmaker):
         )
         session.add(q)
         await session.commit()
+    invalidate_test(test_id)
 
     if q_index >= q_total:
         await state.clear()
@@ -215,6 +235,113 @@ async def admin_correct(message: Message, state: FSMContext, sessionmaker):
     await message.answer(f"{q_index + 1}-savol matnini yuboring:")
 
 
+# ===================== Import Test (file) =====================
+
+MAX_IMPORT_BYTES = 2 * 1024 * 1024
+
+
+@router.message(AdminOnly(), F.text == "📤 Fayldan yuklash")
+async def admin_import_start(message: Message, state: FSMContext):
+    await state.clear()
+    await state.set_state(ImportTestFSM.title)
+    await message.answer("🧩 Test nomini kiriting:")
+
+
+@router.message(ImportTestFSM.title)
+async def admin_import_title(message: Message, state: FSMContext):
+    title = (message.text or "").strip()
+    if len(title) < 3:
+        await message.answer("Kamida 3 belgi bo‘lsin. Qayta kiriting:")
+        return
+
+    await state.update_data(title=title)
+    await state.set_state(ImportTestFSM.duration_min)
+    await message.answer("⏳ Test vaqti (daqiqada). Masalan: 20")
+
+
+@router.message(ImportTestFSM.duration_min)
+async def admin_import_duration(message: Message, state: FSMContext):
+    raw = (message.text or "").strip()
+    if not raw.isdigit() or not 0 < int(raw) <= 300:
+        await message.answer("1..300 oralig‘ida son kiriting.")
+        return
+
+    await state.update_data(duration_sec=int(raw) * 60)
+    await state.set_state(ImportTestFSM.document)
+    await message.answer(
+        "📤 Savollar faylini yuboring (.csv, .json, .jsonl yoki .txt).\n\n"
+        "CSV: savol,a,b,c,d,javob\n"
+        "TXT: savol, keyin A) B) C) D) qatorlari va «Javob: B»; savollar orasida bo‘sh qator."
+    )
+
+
+@router.message(ImportTestFSM.document, F.document)
+async def admin_import_document(message: Message, state: FSMContext, sessionmaker, bot: Bot):
+    doc = message.document
+    if doc.file_size and doc.file_size > MAX_IMPORT_BYTES:
+        await message.answer("Fayl juda katta (maksimum 2 MB).")
+        return
+
+    buf = io.BytesIO()
+    await bot.download(doc, destination=buf)
+    buf.seek(0)
+    try:
+        with io.TextIOWrapper(buf, encoding="utf-8-sig") as lines:
+            questions, errors = parse_questions(doc.file_name or "", lines)
+    except UnicodeDecodeError:
+        await message.answer("Fayl UTF-8 kodlashda bo‘lishi kerak.")
+        return
+
+    if errors:
+        shown = errors[:20]
+        more = f"\n… yana {len(errors) - len(shown)} ta xato" if len(errors) > len(shown) else ""
+        await message.answer(
+            "❌ Faylda xatolar bor, test yaratilmadi:\n\n" + "\n".join(shown) + more
+            + "\n\nTuzatib, faylni qayta yuboring."
+        )
+        return
+
+    data = await state.get_data()
+
+    # test + barcha savollar bitta tranzaksiyada (savollar bitta executemany)
+    async with sessionmaker() as session:
+        public_id = await allocate_public_id(session)
+        test = Test(
+            public_id=public_id,
+            title=data["title"],
+            duration_sec=data["duration_sec"],
+            created_by_admin_id=message.from_user.id,
+            is_active=True,
+        )
+        session.add(test)
+        await session.flush()
+        await session.execute(
+            insert(Question),
+            [
+                {
+                    "test_id": test.id,
+                    "order_index": i,
+                    "q_text": q.q_text,
+                    "a_text": q.a_text,
+                    "b_text": q.b_text,
+                    "c_text": q.c_text,
+                    "d_text": q.d_text,
+                    "correct": q.correct,
+                }
+                for i, q in enumerate(questions, start=1)
+            ],
+        )
+        await session.commit()
+
+    await state.clear()
+    await message.answer(f"🎉 Tayyor! Test ID: {public_id}\nSavollar: {len(questions)}")
+
+
+@router.message(ImportTestFSM.document)
+async def admin_import_not_document(message: Message):
+    await message.answer(f"Iltimos, fayl yuboring (ko‘pi bilan {MAX_QUESTIONS} ta savol).")
+
+
 # ===================== Tests List =====================
 
 @router.message(AdminOnly(), F.text == "📥 Testlar ro‘yxati")
@@ -239,7 +366,96 @@ async def admin_tests_list(message: Message, sessionmaker):
 async def admin_who_start(message: Message, state: FSMContext):
     await state.clear()
     await state.set_state(AdminWhoFSM.waiting_test_id)
-    await message.answer("Qaysi test? Test ID kiriting (masalan: T38471):")
+    await message.answer("Qaysi test? Test ID kiriting (masalan: T384712):")
+
+
+WHO_PAGE_SIZE = 20
+
+# test_id -> yakunlangan urinishlar soni (qisqa muddatga keshlanadi)
+_who_totals: LRUCache[int, int] = LRUCache(maxsize=1024, ttl=60)
+
+
+async def _who_total(session, test_id: int) -> int:
+    total = _who_totals.get(test_id)
+    if total is None:
+        q = await session.execute(
+            select(func.count(Attempt.id)).where(
+                Attempt.test_id == test_id, Attempt.status.in_(FINISHED_STATUSES)
+            )
+        )
+        # arxivdagilar ham (hammasi yakunlangan)
+        r = await session.execute(
+            select(func.count(AttemptArchive.id)).where(AttemptArchive.test_id == test_id)
+        )
+        total = int(q.scalar() or 0) + int(r.scalar() or 0)
+        _who_totals.set(test_id, total)
+    return total
+
+
+async def _who_rows(session, test_id: int, limit: int, before: int | None = None, after: int | None = None):
+    """Keyset sahifa: id kamayish tartibida. `before`/`after` — kursor (attempts.id)."""
+    parts = []
+    # har bir status uchun alohida (test_id, status, id) index oralig‘i — OFFSET yo‘q,
+    # shuning uchun keyingi sahifalar ham birinchisi kabi arzon; arxiv — (test_id, id) bo‘yicha
+    sources = [(Attempt, Attempt.status == status) for status in FINISHED_STATUSES]
+    sources.append((AttemptArchive, None))
+    for model, cond in sources:
+        q = select(
+            model.id, model.telegram_id, model.score, model.total, model.percent, model.status
+        ).where(model.test_id == test_id)
+        if cond is not None:
+            q = q.where(cond)
+        if after is not None:
+            q = q.where(model.id > after).order_by(model.id.asc())
+        else:
+            if before is not None:
+                q = q.where(model.id < before)
+            q = q.order_by(model.id.desc())
+        parts.append(select(q.limit(limit).subquery()))
+
+    page = union_all(*parts).subquery()
+    order = page.c.id.asc() if after is not None else page.c.id.desc()
+    aq = await session.execute(
+        select(page, User.full_name)
+        .join(User, page.c.telegram_id == User.telegram_id)
+        .order_by(order)
+        .limit(limit)
+    )
+    rows = aq.all()
+    if after is not None:
+        rows.reverse()
+    return rows
+
+
+async def _who_render(session, test: Test, page: int, page_size: int, cursor: str | None):
+    before = after = None
+    if cursor and cursor[0] == "n":
+        before = int(cursor[1:])
+    elif cursor and cursor[0] == "p":
+        after = int(cursor[1:])
+
+    # bitta ortiqcha qator — keyingi/oldingi sahifa bormi
+    rows = await _who_rows(session, test.id, page_size + 1, before=before, after=after)
+    more = len(rows) > page_size
+    if after is not None:
+        rows = rows[-page_size:]
+        has_prev, has_next = more, True
+    else:
+        rows = rows[:page_size]
+        has_prev, has_next = before is not None, more
+
+    if not rows:
+        return None, None
+
+    total = await _who_total(session, test.id)
+    pages = max(1, -(-total // page_size))
+    lines = [f"👥 {test.public_id} — urinishlar: {total} (sahifa {page}/{pages})\n"]
+    for r in rows:
+        lines.append(
+            f"• {r.full_name} (tg:{r.telegram_id}) — {r.score}/{r.total} ({r.percent}%) — {r.status}"
+        )
+    kb = kb_page(test.public_id, page, page_size, has_prev, has_next, first_id=rows[0].id, last_id=rows[-1].id)
+    return "\n".join(lines), kb
 
 
 @router.message(AdminWhoFSM.waiting_test_id)
@@ -254,25 +470,111 @@ async def admin_who_show(message: Message, state: FSMContext, sessionmaker):
             await message.answer("Test topilmadi.")
             return
 
-        aq = await session.execute(
-            select(Attempt, User)
-            .join(User, Attempt.telegram_id == User.telegram_id)
-            .where(Attempt.test_id == test.id, Attempt.status != "in_progress")
-            .order_by(Attempt.id.desc())
-            .limit(30)
-        )
-        rows = aq.all()
+        text, kb = await _who_render(session, test, 1, WHO_PAGE_SIZE, None)
 
-    if not rows:
+    if not text:
         await message.answer("Hali hech kim ishlamagan.")
         return
+    await message.answer(text, reply_markup=kb)
 
-    lines = [f"👥 {public_id} — oxirgi 30 urinish:\n"]
-    for att, user in rows:
-        lines.append(
-            f"• {user.full_name} (tg:{user.telegram_id}) — {att.score}/{att.total} ({att.percent}%) — {att.status}"
+
+@router.callback_query(AdminOnly(), F.data.startswith("who:"))
+async def admin_who_page(call: CallbackQuery, sessionmaker):
+    try:
+        _, public_id, page, page_size, cursor = call.data.split(":")
+        page, page_size = int(page), min(int(page_size), 100)
+        int(cursor[1:])
+    except Exception:
+        await call.answer("Xatolik: callback noto‘g‘ri")
+        return
+
+    async with sessionmaker() as session:
+        tq = await session.execute(select(Test).where(Test.public_id == public_id))
+        test = tq.scalar_one_or_none()
+        if not test:
+            await call.answer("Test topilmadi.")
+            return
+        text, kb = await _who_render(session, test, page, page_size, cursor)
+
+    if not text:
+        await call.answer("Boshqa natija yo‘q.")
+        return
+    with contextlib.suppress(TelegramBadRequest):  # "message is not modified"
+        await call.message.edit_text(text, reply_markup=kb)
+    await call.answer()
+
+
+# ===================== Item analytics =====================
+
+MESSAGE_LIMIT = 4000
+
+
+@router.message(AdminOnly(), F.text == "📈 Savollar tahlili")
+async def admin_analytics_start(message: Message, state: FSMContext):
+    await state.clear()
+    await state.set_state(AnalyticsFSM.waiting_test_id)
+    await message.answer("📈 Qaysi test tahlili? Test ID kiriting (masalan: T384712):")
+
+
+@router.message(AnalyticsFSM.waiting_test_id)
+async def admin_analytics_show(message: Message, state: FSMContext, sessionmaker):
+    public_id = (message.text or "").strip().upper()
+    await state.clear()
+
+    async with sessionmaker() as session:
+        tq = await session.execute(select(Test.id).where(Test.public_id == public_id))
+        test_id = tq.scalar_one_or_none()
+        if test_id is None:
+            await message.answer("Test topilmadi.")
+            return
+        report = await get_report(session, test_id)
+
+    snap = await get_test_snapshot(sessionmaker, test_id)
+    if not report.attempts or not snap:
+        await message.answer("Hali hech kim ishlamagan.")
+        return
+
+    # uzun testlar bir nechta xabarga bo‘linadi
+    chunk: list[str] = []
+    size = 0
+    for line in render_report(snap, report):
+        if size + len(line) + 1 > MESSAGE_LIMIT:
+            await message.answer("\n".join(chunk))
+            chunk, size = [], 0
+        chunk.append(line)
+        size += len(line) + 1
+    if chunk:
+        await message.answer("\n".join(chunk))
+
+
+# ===================== Certificates (batch) =====================
+
+@router.message(AdminOnly(), F.text == "🎓 Sertifikat berish")
+async def admin_cert_batch_start(message: Message, state: FSMContext):
+    await state.clear()
+    await state.set_state(CertBatchFSM.waiting_test_id)
+    await message.answer("🎓 Qaysi test bo‘yicha sertifikat berilsin? Test ID kiriting (masalan: T384712):")
+
+
+@router.message(CertBatchFSM.waiting_test_id)
+async def admin_cert_batch_run(message: Message, state: FSMContext, config, sessionmaker, certs):
+    public_id = (message.text or "").strip().upper()
+    await state.clear()
+
+    async with sessionmaker() as session:
+        tq = await session.execute(select(Test.id).where(Test.public_id == public_id))
+        test_id = tq.scalar_one_or_none()
+    if test_id is None:
+        await message.answer("Test topilmadi.")
+        return
+
+    count = await certs.start_batch(test_id, message.from_user.id)
+    if not count:
+        await message.answer(
+            f"Yangi sertifikat oladiganlar yo‘q (kamida {config.cert_min_percent}% kerak)."
         )
-    await message.answer("\n".join(lines))
+        return
+    await message.answer(f"🎓 {count} ta ishtirokchiga sertifikat yuborilmoqda. Tugagach xabar beraman.")
 
 
 # ===================== Delete Test =====================
@@ -281,7 +583,7 @@ async def admin_who_show(message: Message, state: FSMContext, sessionmaker):
 async def admin_delete_test_start(message: Message, state: FSMContext):
     await state.clear()
     await state.set_state(DeleteTestFSM.waiting_test_id)
-    await message.answer("🗑 Qaysi testni o‘chirasiz? Test ID kiriting (masalan: T89101):")
+    await message.answer("🗑 Qaysi testni o‘chirasiz? Test ID kiriting (masalan: T891014):")
 
 
 @router.message(DeleteTestFSM.waiting_test_id)
@@ -298,11 +600,18 @@ async def admin_delete_test_confirm(message: Message, state: FSMContext, session
 
         q_count = await session.execute(select(func.count(Question.id)).where(Question.test_id == test.id))
         a_count = await session.execute(select(func.count(Attempt.id)).where(Attempt.test_id == test.id))
+        r_count = await session.execute(
+            select(func.count(AttemptArchive.id)).where(AttemptArchive.test_id == test.id)
+        )
         questions = int(q_count.scalar() or 0)
-        attempts = int(a_count.scalar() or 0)
+        attempts = int(a_count.scalar() or 0) + int(r_count.scalar() or 0)
 
+        test_id = test.id
+        await stats.delete_test_stats(session, test_id)
+        await session.execute(delete(AttemptArchive).where(AttemptArchive.test_id == test_id))
         await session.delete(test)
         await session.commit()
+    invalidate_test(test_id)
 
     await message.answer(
         f"✅ O‘chirildi: {public_id}\n"
@@ -314,7 +623,7 @@ async def admin_delete_test_confirm(message: Message, state: FSMContext, session
 
 # ===================== Admin manage (add/remove) =====================
 
-@router.message(AdminOnly(), F.text == "👑 Admin qo‘shish")
+@router.message(SuperAdminOnly(), F.text == "👑 Admin qo‘shish")
 async def admin_add_start(message: Message, state: FSMContext):
     await state.clear()
     await state.update_data(mode="add")
@@ -322,7 +631,7 @@ async def admin_add_start(message: Message, state: FSMContext):
     await message.answer("Admin qilinadigan user telegram ID sini yuboring:")
 
 
-@router.message(AdminOnly(), F.text == "❌ Adminni olish")
+@router.message(SuperAdminOnly(), F.text == "❌ Adminni olish")
 async def admin_remove_start(message: Message, state: FSMContext):
     await state.clear()
     await state.update_data(mode="remove")
@@ -360,6 +669,7 @@ async def admin_manage_confirm(message: Message, state: FSMContext, sessionmaker
             user.is_admin = True
             user.is_superadmin = True
             await session.commit()
+            invalidate_identity(tg_id)
             await state.clear()
             await message.answer(f"✅ Admin qo‘shildi: {user.full_name} ({tg_id})")
             return
@@ -368,9 +678,34 @@ async def admin_manage_confirm(message: Message, state: FSMContext, sessionmaker
             user.is_admin = False
             user.is_superadmin = False
             await session.commit()
+            invalidate_identity(tg_id)
             await state.clear()
             await message.answer(f"❌ Adminlik olib tashlandi: {user.full_name} ({tg_id})")
             return
 
     await state.clear()
-    await message.answer("Xatolik: mode topilmadi. Qaytadan urinib ko‘ring.")
\ No newline at end of file
+    await message.answer("Xatolik: mode topilmadi. Qaytadan urinib ko‘ring.")
+
+
+# ===================== Broadcast =====================
+
+@router.message(SuperAdminOnly(), F.text == "📣 E'lon yuborish")
+async def admin_broadcast_start(message: Message, state: FSMContext):
+    await state.clear()
+    await state.set_state(BroadcastFSM.waiting_text)
+    await message.answer("📣 Barcha foydalanuvchilarga yuboriladigan matnni yozing (bekor qilish: 0):")
+
+
+@router.message(BroadcastFSM.waiting_text)
+async def admin_broadcast_text(message: Message, state: FSMContext, broadcaster):
+    text = (message.text or "").strip()
+    await state.clear()
+    if text == "0":
+        await message.answer("Bekor qilindi.")
+        return
+    if len(text) < 2:
+        await message.answer("Matn bo‘sh bo‘lmasin.")
+        return
+
+    broadcast_id = await broadcaster.create(text, created_by=message.from_user.id)
+    await message.answer(f"🚀 E'lon #{broadcast_id} yuborilmoqda. Tugagach xabar beraman.")
@@ -1,7 +1,8 @@
 from aiogram import Router, F
 from aiogram.filters import CommandStart
 from aiogram.types import Message
-from sqlalchemy import select
+from sqlalchemy import update
+from ..cache import get_identity, invalidate_identity
 from ..models import User
 from ..keyboards import kb_main_user, kb_main_admin
 
@@ -12,9 +13,15 @@ def is_admin(user_id: int, admin_ids: set[int]) -> bool:
 
 @router.message(CommandStart())
 async def start(message: Message, config, sessionmaker):
-    async with sessionmaker() as session:
-        q = await session.execute(select(User).where(User.telegram_id == message.from_user.id))
-        user = q.scalar_one_or_none()
+    ident = await get_identity(sessionmaker, message.from_user.id)
+    if ident.is_blocked:
+        # /start bosdi — demak botni qayta ochgan, e'lonlarni yana yuboramiz
+        async with sessionmaker() as session:
+            await session.execute(
+                update(User).where(User.telegram_id == message.from_user.id).values(is_blocked=False)
+            )
+            await session.commit()
+        invalidate_identity(message.from_user.id)
 
     if is_admin(message.from_user.id, config.admin_ids):
         await message.answer(
@@ -23,7 +30,7 @@ async def start(message: Message, config, sessionmaker):
         )
         return
 
-    if user:
+    if ident.registered:
         await message.answer("Salom! Menyudan foydalaning.", reply_markup=kb_main_user())
     else:
         await message.answer(
@@ -1,15 +1,23 @@
 from __future__ import annotations
 
+import contextlib
+
 from aiogram import Router, F
+from aiogram.filters import Command, CommandObject
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, CallbackQuery
-from sqlalchemy import select, func
+from sqlalchemy import select, union_all
 from datetime import timedelta
 
-from ..models import User, Test, Question, Attempt, Answer
-from ..keyboards import kb_main_user, kb_main_admin, kb_abcd
-from ..utils import now_utc, seconds_between
+from ..models import User, Test, Attempt, AttemptArchive
+from ..keyboards import kb_main_user, kb_main_admin, kb_abcd, kb_certificate, kb_history
+from ..utils import now_utc
+from ..attempts import AttemptResult, record_answer, finalize_attempt
+from .. import stats
+from ..shuffle import new_seed, to_canonical
+from ..cache import TestSnapshot, get_test_snapshot, get_identity, invalidate_identity
 
 router = Router()
 
@@ -27,50 +35,61 @@ class StartTestFSM(StatesGroup):
 
 # ===================== Helpers =====================
 
-async def _get_user(session, tg_id: int) -> User | None:
-    q = await session.execute(select(User).where(User.telegram_id == tg_id))
-    return q.scalar_one_or_none()
-
-
 def _main_kb_for(message: Message, config):
     return kb_main_admin() if message.from_user.id in config.admin_ids else kb_main_user()
 
 
-async def _send_question(target: Message | CallbackQuery, session, attempt: Attempt, q_index: int) -> bool:
-    q = await session.execute(
-        select(Question).where(
-            Question.test_id == attempt.test_id,
-            Question.order_index == q_index
-        )
-    )
-    question = q.scalar_one_or_none()
+async def _send_question(
+    target: Message | CallbackQuery,
+    snap: TestSnapshot,
+    attempt_id: int,
+    q_index: int,
+    total: int,
+    seed: int | None = None,
+    edit: bool = False,
+) -> bool:
+    question, order = snap.at(q_index, seed, total)
     if not question:
         return False
 
-    text = (
-        f"🧪 Savol {q_index}\n\n"
-        f"{question.q_text}\n\n"
-        f"A) {question.a_text}\n"
-        f"B) {question.b_text}\n"
-        f"C) {question.c_text}\n"
-        f"D) {question.d_text}\n"
-    )
-
+    text = question.render(q_index, order)
+    markup = kb_abcd(attempt_id, q_index)
     if isinstance(target, CallbackQuery):
-        await target.message.answer(text, reply_markup=kb_abcd(attempt.id, q_index))
+        if edit:
+            # oldingi savol xabarini tahrirlaymiz; bo‘lmasa (eski/o‘chirilgan xabar) yangisini yuboramiz
+            try:
+                await target.message.edit_text(text, reply_markup=markup)
+                return True
+            except TelegramBadRequest:
+                pass
+        await target.message.answer(text, reply_markup=markup)
     else:
-        await target.answer(text, reply_markup=kb_abcd(attempt.id, q_index))
+        await target.answer(text, reply_markup=markup)
     return True
 
 
+def _result_text(result: AttemptResult) -> str:
+    text = (
+        f"✅ Test tugadi!\n"
+        f"Natija: {result.score}/{result.total} ({result.percent}%)\n"
+        f"⏱ Sarflangan vaqt: {result.time_spent_sec}s"
+    )
+    if result.better_than is not None:
+        text += f"\n📊 Siz ishtirokchilarning {result.better_than}% idan yaxshiroq natija ko‘rsatdingiz."
+    return text
+
+
+def _result_kb(config, attempt_id: int, result: AttemptResult):
+    return kb_certificate(attempt_id) if result.percent >= config.cert_min_percent else None
+
+
 # ===================== Registration =====================
 
 @router.message(F.text == "📝 Ro‘yxatdan o‘tish")
 async def reg_start(message: Message, state: FSMContext, config, sessionmaker):
-    async with sessionmaker() as session:
-        user = await _get_user(session, message.from_user.id)
+    ident = await get_identity(sessionmaker, message.from_user.id)
 
-    if user:
+    if ident.registered:
         await message.answer(
             "Siz allaqachon ro‘yxatdan o‘tgansiz ✅",
             reply_markup=_main_kb_for(message, config),
@@ -109,6 +128,7 @@ async def reg_phone(message: Message, state: FSMContext, config, sessionmaker):
             )
         )
         await session.commit()
+    invalidate_identity(message.from_user.id)
 
     await state.clear()
     await message.answer("Ro‘yxatdan o‘tdingiz ✅", reply_markup=_main_kb_for(message, config))
@@ -116,38 +136,147 @@ async def reg_phone(message: Message, state: FSMContext, config, sessionmaker):
 
 # ===================== Results =====================
 
+HISTORY_PAGE_SIZE = 10
+
+
+async def _history_rows(session, telegram_id: int, limit: int, before: int | None = None, after: int | None = None):
+    # (telegram_id, id) index bo‘yicha keyset — sahifa narxi tarix uzunligiga bog‘liq emas;
+    # eski urinishlar arxivda (archive.py), ikkala jadvaldan ham `limit` tadan olinadi
+    parts = []
+    for model in (Attempt, AttemptArchive):
+        q = select(
+            model.id, model.test_id, model.score, model.total, model.percent, model.time_spent_sec, model.status
+        ).where(model.telegram_id == telegram_id, model.status != "in_progress")
+        if after is not None:
+            q = q.where(model.id > after).order_by(model.id.asc())
+        else:
+            if before is not None:
+                q = q.where(model.id < before)
+            q = q.order_by(model.id.desc())
+        parts.append(select(q.limit(limit).subquery()))
+
+    page = union_all(*parts).subquery()
+    order = page.c.id.asc() if after is not None else page.c.id.desc()
+    q = await session.execute(
+        select(page, Test.public_id)
+        .join(Test, page.c.test_id == Test.id)
+        .order_by(order)
+        .limit(limit)
+    )
+    rows = q.all()
+    if after is not None:
+        rows.reverse()
+    return rows
+
+
+async def _history_render(session, telegram_id: int, page: int, cursor: str | None):
+    before = after = None
+    if cursor and cursor[0] == "n":
+        before = int(cursor[1:])
+    elif cursor and cursor[0] == "p":
+        after = int(cursor[1:])
+
+    us = await stats.get_user_stats(session, telegram_id)
+    if us is None or not us.attempts:
+        return None, None
+
+    rows = await _history_rows(session, telegram_id, HISTORY_PAGE_SIZE + 1, before=before, after=after)
+    more = len(rows) > HISTORY_PAGE_SIZE
+    if after is not None:
+        rows = rows[-HISTORY_PAGE_SIZE:]
+        has_prev, has_next = more, True
+    else:
+        rows = rows[:HISTORY_PAGE_SIZE]
+        has_prev, has_next = before is not None, more
+    if not rows:
+        return None, None
+
+    pages = max(1, -(-us.attempts // HISTORY_PAGE_SIZE))
+    lines = [
+        "📊 Natijalaringiz\n",
+        f"Urinishlar: {us.attempts} (timeout: {us.timeouts})",
+        f"Testlar: {us.tests}",
+        f"O‘rtacha: {us.percent_sum // us.attempts}%  •  Eng yaxshi: {us.best_percent}%\n",
+        f"Tarix (sahifa {page}/{pages}):",
+    ]
+    for r in rows:
+        lines.append(
+            f"• {r.public_id} — {r.score}/{r.total} ({r.percent}%) — {r.time_spent_sec}s — {r.status}"
+        )
+    kb = kb_history(page, has_prev, has_next, first_id=rows[0].id, last_id=rows[-1].id)
+    return "\n".join(lines), kb
+
+
 @router.message(F.text == "📊 Natijalarim")
 async def my_results(message: Message, config, sessionmaker):
+    ident = await get_identity(sessionmaker, message.from_user.id)
+    if not ident.registered:
+        await message.answer(
+            "Avval ro‘yxatdan o‘ting: 📝 Ro‘yxatdan o‘tish",
+            reply_markup=_main_kb_for(message, config),
+        )
+        return
+
     async with sessionmaker() as session:
-        user = await _get_user(session, message.from_user.id)
-        if not user:
-            await message.answer(
-                "Avval ro‘yxatdan o‘ting: 📝 Ro‘yxatdan o‘tish",
-                reply_markup=_main_kb_for(message, config),
-            )
+        text, kb = await _history_render(session, message.from_user.id, 1, None)
+
+    if not text:
+        await message.answer("Hali natijalar yo‘q.")
+        return
+    await message.answer(text, reply_markup=kb)
+
+
+@router.callback_query(F.data.startswith("hist:"))
+async def my_results_page(call: CallbackQuery, sessionmaker):
+    try:
+        _, page, cursor = call.data.split(":")
+        page = int(page)
+        int(cursor[1:])
+    except Exception:
+        await call.answer("Xatolik: callback noto‘g‘ri")
+        return
+
+    async with sessionmaker() as session:
+        text, kb = await _history_render(session, call.from_user.id, page, cursor)
+
+    if not text:
+        await call.answer("Boshqa natija yo‘q.")
+        return
+    with contextlib.suppress(TelegramBadRequest):  # "message is not modified"
+        await call.message.edit_text(text, reply_markup=kb)
+    await call.answer()
+
+
+# ===================== Leaderboard =====================
+
+@router.message(Command("top"))
+async def test_top(message: Message, command: CommandObject, sessionmaker):
+    public_id = (command.args or "").strip().upper()
+    if not public_id:
+        await message.answer("Foydalanish: /top T38471")
+        return
+
+    async with sessionmaker() as session:
+        tq = await session.execute(select(Test.id, Test.title).where(Test.public_id == public_id))
+        test = tq.one_or_none()
+        if not test:
+            await message.answer("Test topilmadi.")
             return
 
-        q = await session.execute(
-            select(Attempt, Test)
-            .join(Test, Attempt.test_id == Test.id)
-            .where(
-                Attempt.telegram_id == user.telegram_id,
-                Attempt.status != "in_progress",
-            )
-            .order_by(Attempt.id.desc())
-            .limit(10)
-        )
-        rows = q.all()
+        rows = await stats.top(session, test.id, limit=10)
+        count = await stats.participants(session, test.id)
+        mine = await stats.user_rank(session, test.id, message.from_user.id)
 
     if not rows:
-        await message.answer("Hali natijalar yo‘q.")
+        await message.answer(f"🏆 {public_id} — {test.title}\nHali natijalar yo‘q.")
         return
 
-    lines = ["📊 Oxirgi natijalaringiz (10 ta):\n"]
-    for att, test in rows:
-        lines.append(
-            f"• {test.public_id} — {att.score}/{att.total} ({att.percent}%) — {att.time_spent_sec}s — {att.status}"
-        )
+    lines = [f"🏆 {public_id} — {test.title}", f"Ishtirokchilar: {count}\n"]
+    for i, r in enumerate(rows, start=1):
+        lines.append(f"{i}. {r.full_name} — {r.score}/{r.total} ({r.percent}%) — {r.time_spent_sec}s")
+    if mine:
+        rank, percent = mine
+        lines.append(f"\nSizning o‘rningiz: {rank} ({percent}%)")
     await message.answer("\n".join(lines))
 
 
@@ -155,10 +284,9 @@ async def my_results(message: Message, config, sessionmaker):
 
 @router.message(F.text == "🧪 Test ishlash")
 async def test_start(message: Message, state: FSMContext, config, sessionmaker):
-    async with sessionmaker() as session:
-        user = await _get_user(session, message.from_user.id)
+    ident = await get_identity(sessionmaker, message.from_user.id)
 
-    if not user:
+    if not ident.registered:
         await message.answer(
             "Avval ro‘yxatdan o‘ting: 📝 Ro‘yxatdan o‘tish",
             reply_markup=_main_kb_for(message, config),
@@ -166,11 +294,11 @@ async def test_start(message: Message, state: FSMContext, config, sessionmaker):
         return
 
     await state.set_state(StartTestFSM.waiting_test_id)
-    await message.answer("Test ID ni kiriting (masalan: T38471):")
+    await message.answer("Test ID ni kiriting (masalan: T384712):")
 
 
 @router.message(StartTestFSM.waiting_test_id)
-async def test_id_received(message: Message, state: FSMContext, config, sessionmaker):
+async def test_id_received(message: Message, state: FSMContext, config, sessionmaker, sweeper, journal=None):
     public_id = (message.text or "").strip().upper()
 
     async with sessionmaker() as session:
@@ -183,11 +311,8 @@ async def test_id_received(message: Message, state: FSMContext, config, sessionm
             await message.answer("Bunday test topilmadi ❌ ID ni tekshirib qayta yuboring.")
             return
 
-        # count questions
-        qc = await session.execute(
-            select(func.count(Question.id)).where(Question.test_id == test.id)
-        )
-        total = int(qc.scalar() or 0)
+        snap = await get_test_snapshot(sessionmaker, test.id, session)
+        total = snap.total if snap else 0
         if total == 0:
             await message.answer("Bu testda savollar yo‘q (admin hali kiritmagan).")
             return
@@ -199,30 +324,29 @@ async def test_id_received(message: Message, state: FSMContext, config, sessionm
             started_at=now_utc(),
             total=total,
             status="in_progress",
+            shuffle_seed=new_seed() if config.shuffle_questions else None,
         )
         session.add(attempt)
         await session.commit()
         await session.refresh(attempt)
 
-        # important: these values needed after session close
-        test_title = test.title
-        test_minutes = test.duration_sec // 60
         attempt_id = attempt.id
+        seed = attempt.shuffle_seed
 
+    sweeper.schedule(attempt_id, attempt.started_at + timedelta(seconds=snap.duration_sec))
+    if journal:
+        journal.track(attempt_id)
     await state.clear()
     await message.answer(
-        f"✅ Test boshlandi: {test_title}\n⏳ Vaqt: {test_minutes} daqiqa\nSavollar ketma-ket chiqadi."
+        f"✅ Test boshlandi: {snap.title}\n⏳ Vaqt: {snap.duration_sec // 60} daqiqa\nSavollar ketma-ket chiqadi."
     )
-
-    async with sessionmaker() as session:
-        a = await session.get(Attempt, attempt_id)
-        await _send_question(message, session, a, 1)
+    await _send_question(message, snap, attempt_id, 1, total, seed)
 
 
 # ===================== Answer callback =====================
 
 @router.callback_query(F.data.startswith("ans:"))
-async def answer_callback(call: CallbackQuery, config, sessionmaker):
+async def answer_callback(call: CallbackQuery, config, sessionmaker, journal=None):
     try:
         _, attempt_id, q_index, chosen = call.data.split(":")
         attempt_id = int(attempt_id)
@@ -245,82 +369,96 @@ async def answer_callback(call: CallbackQuery, config, sessionmaker):
             await call.answer("Bu test sizniki emas.")
             return
 
-        test = await session.get(Test, attempt.test_id)
-        if not test:
+        snap = await get_test_snapshot(sessionmaker, attempt.test_id, session)
+        if not snap:
             await call.answer("Test topilmadi.")
             return
 
+        if attempt.status != "in_progress":
+            await call.answer("Bu test yakunlangan.")
+            return
+
         # time check
-        deadline = attempt.started_at + timedelta(seconds=test.duration_sec)
-        if now_utc() > deadline:
-            attempt.finished_at = now_utc()
-            attempt.status = "timeout"
-            attempt.time_spent_sec = seconds_between(attempt.started_at, attempt.finished_at)
-            attempt.percent = int(round((attempt.score / max(attempt.total, 1)) * 100))
-            await session.commit()
-
-            await call.message.answer(
-                f"⏰ Vaqt tugadi! Test yakunlandi (timeout).\n"
-                f"Natija: {attempt.score}/{attempt.total} ({attempt.percent}%)"
-            )
+        now = now_utc()
+        deadline = attempt.started_at + timedelta(seconds=snap.duration_sec)
+        if now > deadline:
+            if journal:
+                # buferdagi javoblar ballga qo‘shilsin; flush kutilganda handler ulanishni
+                # band qilib turmasin — session yopiladi, finalize yangi ulanish oladi
+                await session.close()
+                await journal.flush()
+                journal.forget(attempt_id)
+            result = await finalize_attempt(session, attempt, "timeout", now)
+            if result:
+                await call.message.answer(
+                    f"⏰ Vaqt tugadi! Test yakunlandi (timeout).\n"
+                    f"Natija: {result.score}/{result.total} ({result.percent}%)",
+                    reply_markup=_result_kb(config, attempt_id, result),
+                )
             await call.answer()
             return
 
-        # get question
-        qq = await session.execute(
-            select(Question).where(
-                Question.test_id == attempt.test_id,
-                Question.order_index == q_index
-            )
-        )
-        question = qq.scalar_one_or_none()
+        # get question; tugmadagi harf -> asl harf (aralashtirilgan bo‘lsa), DB'ga asl harf yoziladi
+        question, order = snap.at(q_index, attempt.shuffle_seed, attempt.total)
         if not question:
             await call.answer("Savol topilmadi")
             return
+        chosen = to_canonical(order, chosen)
 
-        # prevent double-answer
-        exists = await session.execute(
-            select(Answer).where(
-                Answer.attempt_id == attempt.id,
-                Answer.question_id == question.id
-            )
+        # javob + ball (+ oxirgi savolda yakunlash) — bitta tranzaksiya, bitta commit;
+        # jurnal yoqilgan bo‘lsa — buferga, ko‘p javob bitta commit'da
+        next_index = q_index + 1
+        answer = dict(
+            question_id=question.id,
+            chosen=chosen,
+            is_correct=(chosen == question.correct),
+            finish=next_index > attempt.total,
+            now=now,
         )
-        if exists.scalar_one_or_none():
-            await call.answer("Bu savolga javob berilgandi.")
-            return
+        if not journal:
+            result = await record_answer(session, attempt, **answer)
 
-        is_correct = (chosen == question.correct.upper())
+    if journal:
+        # session yopilgandan keyin — flush kutilganda handler ulanishni band qilib turmasin
+        result = await journal.record(attempt, **answer)
 
-        session.add(
-            Answer(
-                attempt_id=attempt.id,
-                question_id=question.id,
-                chosen=chosen,
-                is_correct=is_correct,
-            )
-        )
-        if is_correct:
-            attempt.score += 1
+    if result is None:
+        await call.answer("Bu savolga javob berilgandi.")
+        return
 
-        await session.commit()
+    if result.finished:
+        await call.message.answer(_result_text(result), reply_markup=_result_kb(config, attempt_id, result))
+        await call.answer()
+        return
 
-        # next question?
-        next_index = q_index + 1
-        if next_index > attempt.total:
-            attempt.finished_at = now_utc()
-            attempt.status = "finished"
-            attempt.time_spent_sec = seconds_between(attempt.started_at, attempt.finished_at)
-            attempt.percent = int(round((attempt.score / max(attempt.total, 1)) * 100))
-            await session.commit()
-
-            await call.message.answer(
-                f"✅ Test tugadi!\n"
-                f"Natija: {attempt.score}/{attempt.total} ({attempt.percent}%)\n"
-                f"⏱ Sarflangan vaqt: {attempt.time_spent_sec}s"
-            )
-            await call.answer()
-            return
+    await call.answer("Qabul qilindi ✅")
+    # send next
+    await _send_question(
+        call, snap, attempt_id, next_index, attempt.total, attempt.shuffle_seed, edit=config.question_edit_mode
+    )
+
+
+# ===================== Certificate =====================
+
+@router.callback_query(F.data.startswith("cert:"))
+async def certificate_callback(call: CallbackQuery, config, sessionmaker, certs):
+    try:
+        attempt_id = int(call.data.split(":")[1])
+    except Exception:
+        await call.answer("Xatolik: callback noto‘g‘ri")
+        return
+
+    async with sessionmaker() as session:
+        # eski urinish arxivda bo‘lishi mumkin — sertifikat tugmasi baribir ishlasin
+        attempt = await session.get(Attempt, attempt_id) or await session.get(AttemptArchive, attempt_id)
+
+    if not attempt or attempt.telegram_id != call.from_user.id:
+        await call.answer("Bu test sizniki emas.")
+        return
+    if not certs.eligible(attempt.status, attempt.percent):
+        await call.answer(f"Sertifikat uchun kamida {config.cert_min_percent}% kerak.", show_alert=True)
+        return
 
-        await call.answer("Qabul qilindi ✅")
-        # send next
-        await _send_question(call, session, attempt, next_index)
\ No newline at end of file
+    await call.answer("⏳ Sertifikat tayyorlanmoqda...")
+    if not await certs.send(call.from_user.id, attempt_id):
+        await call.message.answer("❌ Bu urinish uchun sertifikat berib bo‘lmadi.")
@@ -0,0 +1,172 @@
+"""
+Vaqti tugagan urinishlarni fonda yopuvchi scheduler.
+
+Ochiq urinishlarning deadline'lari (started_at + Test.duration_sec) min-heap'da
+saqlanadi: task faqat eng yaqin deadline'gacha uxlaydi, jadvalni so‘rab turmaydi.
+Muddati o‘tganlar bitta tranzaksiyada (bitta UPDATE ... RETURNING) `timeout`
+qilinadi. Reytingga faqat shu UPDATE haqiqatan yopgan urinishlar qo‘shiladi, foydalanuvchiga xabar esa Outbox navbatiga qo‘yiladi. Javoblar jurnali
+yoqilgan bo‘lsa, undan oldin bufer bazaga yoziladi. Oldinroq tugagan
+urinishlar heap'dan o‘chirilmaydi — navbati kelganda `status` tekshiruvida shunchaki
+tashlab ketiladi.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import heapq
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, select, update
+
+from . import stats
+from .attempts import percent_sql
+from .models import Attempt, Test
+from .outbound import Outbox
+from .utils import now_utc
+
+log = logging.getLogger(__name__)
+
+
+class TimeoutSweeper:
+    def __init__(self, outbox: Outbox, sessionmaker, batch_size: int = 500, journal=None, owns=None):
+        self.outbox = outbox
+        self.sessionmaker = sessionmaker
+        self.batch_size = batch_size
+        self.journal = journal
+        # shard rejimi: telegram_id -> shu worker'gami (None — hammasi)
+        self.owns = owns
+
+        self._heap: list[tuple[datetime, int]] = []
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._heap)
+
+    async def start(self) -> None:
+        await self._load()
+        self._task = asyncio.create_task(self._run())
+
+    async def reload(self, owns=None) -> None:
+        """Shard'lar o‘zgarganda: heap yangi egalik bo‘yicha qayta yig‘iladi."""
+        self.owns = owns
+        await self._load()
+        self._wake.set()
+
+    async def _load(self) -> None:
+        async with self.sessionmaker() as session:
+            q = await session.execute(
+                select(Attempt.id, Attempt.telegram_id, Attempt.started_at, Test.duration_sec)
+                .join(Test, Attempt.test_id == Test.id)
+                .where(Attempt.status == "in_progress")
+            )
+            heap = [
+                (started_at + timedelta(seconds=duration_sec), attempt_id)
+                for attempt_id, telegram_id, started_at, duration_sec in q.all()
+                if self.owns is None or self.owns(telegram_id)
+            ]
+        heapq.heapify(heap)
+        self._heap = heap
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    def schedule(self, attempt_id: int, deadline: datetime) -> None:
+        earliest = self._heap[0][0] if self._heap else None
+        heapq.heappush(self._heap, (deadline, attempt_id))
+        if earliest is None or deadline < earliest:
+            self._wake.set()
+
+    async def _run(self) -> None:
+        while True:
+            self._wake.clear()
+            if not self._heap:
+                await self._wake.wait()
+                continue
+
+            delay = (self._heap[0][0] - now_utc()).total_seconds()
+            if delay > 0:
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wake.wait(), timeout=delay)
+                continue
+
+            now = now_utc()
+            due: list[int] = []
+            while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+                due.append(heapq.heappop(self._heap)[1])
+
+            try:
+                await self.expire(due)
+            except Exception:
+                log.exception("Timeout sweep xatosi")
+                # keyinroq qayta urinib ko‘ramiz
+                for attempt_id in due:
+                    heapq.heappush(self._heap, (now + timedelta(seconds=5), attempt_id))
+
+    async def expire(self, attempt_ids: list[int]) -> int:
+        if self.journal:
+            await self.journal.flush()
+            for attempt_id in attempt_ids:
+                self.journal.forget(attempt_id)
+
+        async with self.sessionmaker() as session:
+            q = await session.execute(
+                select(
+                    Attempt.id, Attempt.test_id, Attempt.telegram_id, Attempt.started_at,
+                    Test.duration_sec,
+                )
+                .join(Test, Attempt.test_id == Test.id)
+                .where(Attempt.id.in_(attempt_ids), Attempt.status == "in_progress")
+            )
+            rows = q.all()
+            if not rows:
+                return 0
+
+            deadlines = {r.id: r.started_at + timedelta(seconds=r.duration_sec) for r in rows}
+            spent = {r.id: r.duration_sec for r in rows}
+            # RETURNING: faqat shu UPDATE yopgan urinishlar. Oraliqda tap bilan tugagan
+            # yoki boshqa worker yopgan urinish ikkinchi marta hisoblanmaydi
+            q = await session.execute(
+                update(Attempt)
+                .where(Attempt.id.in_(deadlines), Attempt.status == "in_progress")
+                .values(
+                    status="timeout",
+                    finished_at=case(deadlines, value=Attempt.id),
+                    time_spent_sec=case(spent, value=Attempt.id),
+                    percent=percent_sql(Attempt.score),
+                )
+                .returning(Attempt.id, Attempt.score, Attempt.total, Attempt.percent)
+                .execution_options(synchronize_session=False)
+            )
+            closed = {r.id: r for r in q.all()}
+            rows = [r for r in rows if r.id in closed]
+            for r in rows:
+                c = closed[r.id]
+                await stats.record_finish(
+                    session,
+                    test_id=r.test_id,
+                    telegram_id=r.telegram_id,
+                    attempt_id=r.id,
+                    status="timeout",
+                    score=c.score,
+                    total=c.total,
+                    percent=c.percent,
+                    time_spent_sec=spent[r.id],
+                    finished_at=deadlines[r.id],
+                )
+            await session.commit()
+
+        for r in rows:
+            c = closed[r.id]
+            self.outbox.send_message(
+                r.telegram_id,
+                f"⏰ Vaqt tugadi! Test yakunlandi (timeout).\n"
+                f"Natija: {c.score}/{c.total} ({c.percent}%)",
+            )
+        return len(rows)
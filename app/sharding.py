@@ -0,0 +1,478 @@
+"""
+Gorizontal kengayish: bitta ingress + N ta worker jarayon (SHARD_WORKERS=N).
+
+Ingress (`run_ingress`) update'larni bitta joydan oladi (polling yoki webhook)
+va chat id bo‘yicha consistent hashing (`HashRing`) bilan worker'larga
+taqsimlaydi. Natijada bitta chatning FSM holati, keshlar va xabarlar tartibi
+bitta worker ichida qoladi. Worker — oddiy `python -m app.main` jarayoni
+(`SHARD_NAME` bilan). U update'larni localhost'dagi ichki HTTP endpoint orqali
+oladi (`serve_worker`).
+
+- Har bir worker uchun alohida navbat va yuboruvchi task bor. Update'lar kelish
+  tartibida, to‘plam qilib yuboriladi. Worker qayta ishga tushayotgan bo‘lsa,
+  yuborish qayta uriniladi va update yo‘qolmaydi.
+- Worker qo‘shish/olib tashlash: SIGUSR1 / SIGUSR2 (ingress jarayoniga).
+  1. Yangi worker ishga tushiriladi.
+  2. Ingress yangi update'larni ushlab turadi.
+  3. Navbatlar bo‘shaguncha kutadi.
+  4. Hamma worker'lar "drain" qiladi: ishlayotgan handler'lar tugaydi,
+     javoblar jurnali va FSM storage bazaga yoziladi, e'lonlar checkpoint qilinadi.
+  5. Halqa almashtiriladi.
+  6. Qolganlar sweeper, e'lon va keshlarini yangi halqaga moslaydi.
+  7. Olib tashlangan worker to‘xtatiladi.
+  8. Ushlab turilgan update'lar yangi egalariga yuboriladi.
+  Hammasi yoki hech narsa: 1–6 da xato bo‘lsa (spawn, drain timeout'i), yangi
+  worker'lar to‘xtatiladi, hamma eski halqada davom etadi va xato log'ga yoziladi.
+  Ochiq urinishlarning holati bazada bo‘lgani uchun chat boshqa worker'ga
+  o‘tsa ham test davom etadi.
+- Kutilmaganda yiqilgan worker shu nom bilan qayta ishga tushiriladi; uddalanmasa,
+  1–30s backoff bilan qayta uriniladi. Uning javoblar jurnali
+  (`ANSWER_JOURNAL_PATH.<nom>`) qayta o‘ynaladi.
+
+Cheklovlar:
+- FSM faqat `sql` storage bilan. Chat boshqa worker'ga o‘tganda holat bazadan o‘qiladi.
+- Test snapshot (30s) va foydalanuvchi (admin huquqi, blok; 10s) keshlari
+  worker'lar orasida qisqa TTL bilan yangilanadi.
+- Telegram global limiti worker'lar soniga bo‘linadi.
+"""
+from __future__ import annotations
+
+import asyncio
+import bisect
+import contextlib
+import hashlib
+import logging
+import os
+import signal
+import sys
+from dataclasses import dataclass, field
+from typing import Iterable
+
+import aiohttp
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+
+from . import cache, metrics
+
+log = logging.getLogger(__name__)
+
+FORWARD_BATCH = 100
+# /shard/drain in-flight handler'larni kutadi (retry-after'da uxlayotganlari ham)
+DRAIN_TIMEOUT = 300
+SNAPSHOT_TTL = 30
+IDENTITY_TTL = 10
+
+
+# ===================== Hash ring =====================
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Virtual node'li consistent hashing: worker qo‘shilsa/olinsa chatlarning ~1/N qismi ko‘chadi."""
+
+    def __init__(self, nodes: Iterable[str], replicas: int = 128):
+        self.nodes = tuple(nodes)
+        if not self.nodes:
+            raise ValueError("HashRing kamida bitta node talab qiladi")
+        points = sorted((_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(replicas))
+        self._keys = [p for p, _ in points]
+        self._owners = [n for _, n in points]
+
+    def node_for(self, key: int) -> str:
+        i = bisect.bisect(self._keys, _hash(str(key))) % len(self._keys)
+        return self._owners[i]
+
+    def owns(self, node: str):
+        return lambda key: self.node_for(key) == node
+
+
+def chat_key(update: dict) -> int:
+    """Update'ning chat id'si (yo‘q bo‘lsa foydalanuvchi id'si, u ham bo‘lmasa 0)."""
+    for kind, obj in update.items():
+        if kind == "update_id" or not isinstance(obj, dict):
+            continue
+        chat = obj.get("chat") or (obj.get("message") or {}).get("chat")
+        if chat:
+            return chat["id"]
+        user = obj.get("from") or obj.get("user")
+        if user:
+            return user["id"]
+    return 0
+
+
+# ===================== Ingress =====================
+
+@dataclass(eq=False)
+class _Worker:
+    name: str
+    port: int
+    queue: asyncio.Queue = field(default_factory=asyncio.Queue)
+    proc: asyncio.subprocess.Process | None = None
+    sender: asyncio.Task | None = None
+    watcher: asyncio.Task | None = None
+    stopping: bool = False
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+
+class ShardIngress:
+    def __init__(self, config, http: aiohttp.ClientSession):
+        self.config = config
+        self.http = http
+        self.workers: dict[str, _Worker] = {}
+        self.ring: HashRing | None = None
+
+        self._held: list[dict] | None = None  # rebalance paytida kelgan update'lar
+        self._lock = asyncio.Lock()
+
+    @property
+    def depth(self) -> int:
+        return sum(w.queue.qsize() for w in self.workers.values()) + len(self._held or ())
+
+    # ---------- routing ----------
+
+    def route(self, update: dict) -> None:
+        if self._held is not None:
+            self._held.append(update)
+            return
+        self.workers[self.ring.node_for(chat_key(update))].queue.put_nowait(update)
+
+    async def _send_loop(self, worker: _Worker) -> None:
+        delay = 0.1
+        while True:
+            batch = [await worker.queue.get()]
+            while len(batch) < FORWARD_BATCH and not worker.queue.empty():
+                batch.append(worker.queue.get_nowait())
+            while True:
+                try:
+                    async with self.http.post(f"{worker.url}/shard/updates", json=batch) as resp:
+                        resp.raise_for_status()
+                    delay = 0.1
+                    break
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    # worker qayta ishga tushmoqda — update'lar navbatda kutadi
+                    log.warning("Shard %s: yuborilmadi (%s), %.1fs dan keyin qayta", worker.name, e, delay)
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, 5)
+            for _ in batch:
+                worker.queue.task_done()
+
+    # ---------- processes ----------
+
+    async def _spawn(self, worker: _Worker, nodes: tuple[str, ...]) -> None:
+        env = dict(
+            os.environ,
+            SHARD_NAME=worker.name,
+            SHARD_NODES=",".join(nodes),
+            SHARD_PORT=str(worker.port),
+        )
+        # alohida session: terminaldagi Ctrl+C worker'larga emas, faqat ingress'ga boradi
+        worker.proc = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "app.main", env=env, start_new_session=True
+        )
+        await self._wait_healthy(worker)
+        if worker.sender is None:
+            worker.sender = asyncio.create_task(self._send_loop(worker))
+        worker.watcher = asyncio.create_task(self._watch(worker))
+        log.info("Shard %s ishga tushdi (pid=%s, port=%s)", worker.name, worker.proc.pid, worker.port)
+
+    async def _wait_healthy(self, worker: _Worker, timeout: float = 120) -> None:
+        deadline = asyncio.get_running_loop().time() + timeout
+        while True:
+            if worker.proc.returncode is not None:
+                raise RuntimeError(f"Shard {worker.name} ishga tushmadi (exit {worker.proc.returncode})")
+            with contextlib.suppress(aiohttp.ClientError, asyncio.TimeoutError):
+                async with self.http.get(f"{worker.url}/shard/health") as resp:
+                    if resp.status == 200:
+                        return
+            if asyncio.get_running_loop().time() > deadline:
+                raise RuntimeError(f"Shard {worker.name} {timeout}s ichida tayyor bo‘lmadi")
+            await asyncio.sleep(0.2)
+
+    async def _watch(self, worker: _Worker) -> None:
+        code = await worker.proc.wait()
+        if worker.stopping:
+            return
+        log.error("Shard %s kutilmaganda to‘xtadi (exit %s), qayta ishga tushiramiz", worker.name, code)
+        delay = 1
+        # qayta ishga tushmaguncha urinamiz: shu paytda update'lar navbatda kutadi
+        while not worker.stopping:
+            await asyncio.sleep(delay)
+            try:
+                await self._spawn(worker, self.ring.nodes)
+                return
+            except Exception:
+                delay = min(delay * 2, 30)
+                log.exception("Shard %s qayta ishga tushmadi, %ss dan keyin yana", worker.name, delay)
+                if worker.proc and worker.proc.returncode is None:
+                    worker.proc.kill()
+                    await worker.proc.wait()
+
+    async def _terminate(self, worker: _Worker) -> None:
+        worker.stopping = True
+        if worker.proc and worker.proc.returncode is None:
+            worker.proc.send_signal(signal.SIGTERM)
+            try:
+                await asyncio.wait_for(worker.proc.wait(), timeout=60)
+            except asyncio.TimeoutError:
+                worker.proc.kill()
+                await worker.proc.wait()
+        for task in (worker.sender, worker.watcher):
+            if task:
+                task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await task
+
+    async def _post_all(self, path: str, payload: dict, workers=None, timeout: float | None = None) -> None:
+        kwargs = {"timeout": aiohttp.ClientTimeout(total=timeout)} if timeout else {}
+
+        async def one(worker: _Worker) -> None:
+            async with self.http.post(f"{worker.url}{path}", json=payload, **kwargs) as resp:
+                resp.raise_for_status()
+
+        await asyncio.gather(*(one(w) for w in (workers or self.workers.values())))
+
+    # ---------- membership ----------
+
+    def _free_name(self) -> tuple[str, int]:
+        i = 0
+        while f"w{i}" in self.workers:
+            i += 1
+        return f"w{i}", self.config.shard_base_port + i
+
+    async def start(self, count: int) -> None:
+        names = [f"w{i}" for i in range(count)]
+        self.ring = HashRing(names)
+        for i, name in enumerate(names):
+            self.workers[name] = _Worker(name, self.config.shard_base_port + i)
+        await asyncio.gather(*(self._spawn(w, self.ring.nodes) for w in self.workers.values()))
+
+    async def resize(self, delta: int) -> None:
+        async with self._lock:
+            nodes = list(self.ring.nodes)
+            added: list[_Worker] = []
+            removed: list[_Worker] = []
+            if delta > 0:
+                for _ in range(delta):
+                    name, port = self._free_name()
+                    worker = self.workers[name] = _Worker(name, port)
+                    nodes.append(name)
+                    added.append(worker)
+                # yangi worker'lar tayyor bo‘lguncha hech narsa o‘zgarmaydi
+                try:
+                    await asyncio.gather(*(self._spawn(w, tuple(nodes)) for w in added))
+                except Exception:
+                    log.exception("Shard'lar: yangi worker ishga tushmadi, o‘lcham o‘zgarmaydi")
+                    await self._discard(added)
+                    return
+            else:
+                keep = max(1, len(nodes) + delta)
+                removed = [self.workers[n] for n in nodes[keep:]]
+                nodes = nodes[:keep]
+            if not added and not removed:
+                return
+
+            old = self.ring.nodes
+            log.info("Shard'lar: %s -> %s", list(old), nodes)
+            self._held = []
+            try:
+                await asyncio.gather(*(w.queue.join() for w in self.workers.values()))
+                await self._post_all("/shard/drain", {}, timeout=DRAIN_TIMEOUT)
+                self.ring = HashRing(nodes)
+                await self._post_all("/shard/ring", {"nodes": list(nodes)}, [self.workers[n] for n in nodes])
+            except Exception:
+                # hammasi yoki hech narsa: eski halqa tiklanadi, worker'lar unda davom etadi
+                log.exception("Shard'lar: o‘lcham o‘zgarmadi, eski halqaga qaytamiz")
+                self.ring = HashRing(old)
+                await self._discard(added)
+                try:
+                    await self._post_all("/shard/ring", {"nodes": list(old)})
+                except Exception:
+                    log.exception("Shard'lar: eski halqani worker'larga yuborib bo‘lmadi")
+            else:
+                await self._discard(removed)
+            finally:
+                held, self._held = self._held, None
+                for update in held:
+                    self.route(update)
+
+    async def _discard(self, workers: list[_Worker]) -> None:
+        for worker in workers:
+            await self._terminate(worker)
+            del self.workers[worker.name]
+
+    async def stop(self) -> None:
+        for worker in self.workers.values():
+            worker.stopping = True
+        # navbatdagilarni yetkazib, keyin worker'larni to‘xtatamiz
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(
+                asyncio.gather(*(w.queue.join() for w in self.workers.values())), timeout=10
+            )
+        await asyncio.gather(*(self._terminate(w) for w in self.workers.values()))
+
+
+async def _poll(bot: Bot, ingress: ShardIngress, allowed_updates: list[str]) -> None:
+    offset = None
+    while True:
+        try:
+            updates = await bot.get_updates(offset=offset, timeout=30, allowed_updates=allowed_updates)
+        except Exception as e:
+            log.warning("getUpdates xatosi: %s", e)
+            await asyncio.sleep(1)
+            continue
+        for update in updates:
+            ingress.route(update.model_dump(mode="json", by_alias=True, exclude_none=True))
+            offset = update.update_id + 1
+
+
+async def run_ingress(config, bot: Bot, allowed_updates: list[str], app: web.Application) -> None:
+    """Ingress jarayoni: worker'larni boshqaradi va update'larni ularga taqsimlaydi."""
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30)) as http:
+        ingress = ShardIngress(config, http)
+        await ingress.start(config.shard_workers)
+        metrics.REGISTRY.gauge("shard_workers", "Worker jarayonlar soni", lambda: len(ingress.workers))
+        metrics.REGISTRY.gauge("shard_ingress_depth", "Worker'larga yuborilmagan update'lar", lambda: ingress.depth)
+
+        loop = asyncio.get_running_loop()
+        tasks: set[asyncio.Task] = set()
+
+        def resize_done(task: asyncio.Task) -> None:
+            tasks.discard(task)
+            if not task.cancelled() and task.exception():
+                log.error("Shard'lar: o‘lcham o‘zgartirish xatosi", exc_info=task.exception())
+
+        def resize(delta: int) -> None:
+            task = asyncio.create_task(ingress.resize(delta))
+            tasks.add(task)
+            task.add_done_callback(resize_done)
+
+        loop.add_signal_handler(signal.SIGUSR1, resize, 1)
+        loop.add_signal_handler(signal.SIGUSR2, resize, -1)
+        stop = asyncio.Event()
+        loop.add_signal_handler(signal.SIGTERM, stop.set)
+        loop.add_signal_handler(signal.SIGINT, stop.set)
+
+        if config.delivery_mode == "webhook":
+            async def webhook(request: web.Request) -> web.Response:
+                if request.headers.get("X-Telegram-Bot-Api-Secret-Token") != config.webhook_secret:
+                    return web.Response(status=401)
+                ingress.route(await request.json())
+                return web.Response()
+
+            app.router.add_post(config.webhook_path, webhook)
+
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, host="0.0.0.0", port=int(os.getenv("PORT", "10000"))).start()
+
+        poller = None
+        try:
+            if config.delivery_mode == "webhook":
+                await bot.set_webhook(
+                    config.webhook_url, secret_token=config.webhook_secret, allowed_updates=allowed_updates
+                )
+            else:
+                await bot.delete_webhook()
+                poller = asyncio.create_task(_poll(bot, ingress, allowed_updates))
+            await stop.wait()
+        finally:
+            if poller:
+                poller.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await poller
+            await runner.cleanup()
+            for task in list(tasks):
+                with contextlib.suppress(Exception):
+                    await task
+            await ingress.stop()
+
+
+# ===================== Worker =====================
+
+async def serve_worker(dp: Dispatcher, bot: Bot, config, limiter=None) -> None:
+    """Worker jarayoni: ingress'dan update'larni oladi. SIGTERM'gacha ishlaydi."""
+    name = config.shard_name
+    state = {"ring": HashRing(config.shard_nodes or (name,))}
+    inflight: set[asyncio.Task] = set()
+    cache.set_snapshot_ttl(SNAPSHOT_TTL)
+    cache.set_identity_ttl(IDENTITY_TTL)
+
+    def owns(key: int) -> bool:
+        return state["ring"].node_for(key) == name
+
+    def apply_rate() -> None:
+        if limiter:
+            limiter.global_bucket.rate = config.outbound_global_rate / len(state["ring"].nodes)
+
+    apply_rate()
+
+    async def health(_request):
+        return web.Response(text="ok")
+
+    async def updates(request: web.Request) -> web.Response:
+        for raw in await request.json():
+            task = asyncio.create_task(dp.feed_raw_update(bot, raw))
+            inflight.add(task)
+            task.add_done_callback(inflight.discard)
+        return web.Response()
+
+    async def drain(_request):
+        if inflight:
+            await asyncio.gather(*list(inflight), return_exceptions=True)
+        if dp.get("journal"):
+            await dp["journal"].flush()
+        if hasattr(dp.storage, "flush"):
+            await dp.storage.flush()
+        # e'lonlar kursorini saqlab to‘xtaydi; yangi halqada egasi davom ettiradi
+        await dp["broadcaster"].stop()
+        return web.Response()
+
+    async def ring(request: web.Request) -> web.Response:
+        state["ring"] = HashRing((await request.json())["nodes"])
+        apply_rate()
+        # ko‘chgan chatlar uchun eski nusxalar qolmasin: hammasi bazadan qayta o‘qiladi
+        if hasattr(dp.storage, "reset_cache"):
+            dp.storage.reset_cache()
+        if dp.get("journal"):
+            dp["journal"].forget_all()
+        await dp["sweeper"].reload(owns)
+        await dp["broadcaster"].resume_all(owns)
+        return web.Response()
+
+    async def metrics_view(_request):
+        return web.Response(
+            text=await metrics.REGISTRY.render(),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
+
+    app = web.Application()
+    app.router.add_get("/shard/health", health)
+    app.router.add_post("/shard/updates", updates)
+    app.router.add_post("/shard/drain", drain)
+    app.router.add_post("/shard/ring", ring)
+    app.router.add_get("/metrics", metrics_view)
+
+    stop = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host="127.0.0.1", port=config.shard_port).start()
+    try:
+        await stop.wait()
+    finally:
+        await runner.cleanup()
+        if inflight:
+            await asyncio.gather(*list(inflight), return_exceptions=True)
+
+
+def worker_owns(config):
+    """Shard worker'da: shu worker'ga tegishli chatlar predikati (aks holda None)."""
+    if not config.shard_name:
+        return None
+    return HashRing(config.shard_nodes or (config.shard_name,)).owns(config.shard_name)
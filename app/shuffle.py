@@ -0,0 +1,58 @@
+"""
+Har bir urinish uchun savollar va variantlar tartibini aralashtirish.
+
+Urinishda faqat bitta son saqlanadi: `Attempt.shuffle_seed` (31 bit). Tartib undan
+har safar hisoblanadi, nusxa ham, qo‘shimcha qator ham yo‘q:
+
+- savollar tartibi: [0, total) oralig‘ining kalitli permutatsiyasi (Feistel +
+  cycle-walking, xuddi public_ids dagidek). Bitta pozitsiya uchun O(1), butun
+  ro‘yxatni qurish shart emas;
+- variantlar: A–D ning 24 ta permutatsiyasidan biri, (seed, savol id) xeshi bo‘yicha.
+
+Bazaga (`answers.chosen`) doim asl harf yoziladi. Shu sababli tahlil va ball
+hisobi aralashtirishdan bexabar. `shuffle_seed` NULL bo‘lsa, tartib asl holida qoladi.
+"""
+from __future__ import annotations
+
+import hashlib
+import itertools
+import secrets
+
+LETTERS = "ABCD"
+_OPTION_ORDERS = tuple("".join(p) for p in itertools.permutations(LETTERS))
+_ROUNDS = 4
+
+
+def new_seed() -> int:
+    # Integer ustun PostgreSQL'da ham 32 bitli — musbat 31 bit
+    return secrets.randbits(31)
+
+
+def _hash(seed: int, tag: str) -> int:
+    return int.from_bytes(hashlib.blake2b(f"{seed}:{tag}".encode(), digest_size=8).digest(), "big")
+
+
+def question_slot(seed: int, total: int, position: int) -> int:
+    """1 dan boshlangan pozitsiyadagi savolning asl indeksi (0 dan, order_index tartibida)."""
+    if total <= 1:
+        return position - 1
+    half_bits = max(1, ((total - 1).bit_length() + 1) // 2)
+    mask = (1 << half_bits) - 1
+    x = position - 1
+    # domen (2^(2h) < 4·total) oraliqdan katta: chiqib ketsa yana aylantiramiz
+    while True:
+        left, right = x >> half_bits, x & mask
+        for r in range(_ROUNDS):
+            left, right = right, left ^ (_hash(seed, f"q{total}:{r}:{right}") & mask)
+        x = (left << half_bits) | right
+        if x < total:
+            return x
+
+
+def option_order(seed: int, question_id: int) -> str:
+    """Ko‘rsatiladigan A, B, C, D tugmalari ortidagi asl harflar (masalan, "CADB")."""
+    return _OPTION_ORDERS[_hash(seed, f"o{question_id}") % len(_OPTION_ORDERS)]
+
+
+def to_canonical(order: str, shown: str) -> str:
+    return order[LETTERS.index(shown)]
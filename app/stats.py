@@ -0,0 +1,229 @@
+"""
+Test bo‘yicha reyting, persentil va foydalanuvchi statistikasi — `attempts`
+jadvalini skanerlamasdan.
+
+Urinish yakunlanganda, shu tranzaksiya ichida `record_finish` chaqiriladi:
+- `test_best` — har foydalanuvchining eng yaxshi natijasi (foiz ↓, vaqt ↑);
+- `test_score_hist` — shu eng yaxshi foizlarning 0..100 gistogrammasi;
+- `user_stats` — foydalanuvchi bo‘yicha yig‘ma (urinishlar, o‘rtacha, eng yaxshi).
+
+Persentil va o‘rin gistogrammadan (≤101 qator), top-k esa indeks bo‘yicha o‘qiladi.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import case, delete, func, insert, select, union, union_all, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .db import dialect_insert
+from .models import FINISHED_STATUSES, Attempt, AttemptArchive, TestBest, TestScoreHist, User, UserStats
+
+
+@dataclass(frozen=True, slots=True)
+class TopRow:
+    full_name: str
+    score: int
+    total: int
+    percent: int
+    time_spent_sec: int
+
+
+async def _hist_add(session: AsyncSession, test_id: int, percent: int, delta: int) -> None:
+    table = TestScoreHist.__table__
+    await session.execute(
+        dialect_insert(table)
+        .values(test_id=test_id, percent=percent, count=delta)
+        .on_conflict_do_update(
+            index_elements=["test_id", "percent"],
+            set_={"count": table.c.count + delta},
+        )
+    )
+
+
+async def _user_stats_add(
+    session: AsyncSession, telegram_id: int, status: str, percent: int, new_test: bool, finished_at: datetime,
+) -> None:
+    table = UserStats.__table__
+    timeout = 1 if status == "timeout" else 0
+    await session.execute(
+        dialect_insert(table)
+        .values(
+            telegram_id=telegram_id, attempts=1, timeouts=timeout, percent_sum=percent,
+            best_percent=percent, tests=int(new_test), last_finished_at=finished_at,
+        )
+        .on_conflict_do_update(
+            index_elements=["telegram_id"],
+            set_={
+                "attempts": table.c.attempts + 1,
+                "timeouts": table.c.timeouts + timeout,
+                "percent_sum": table.c.percent_sum + percent,
+                "best_percent": case((table.c.best_percent < percent, percent), else_=table.c.best_percent),
+                "tests": table.c.tests + int(new_test),
+                "last_finished_at": finished_at,
+            },
+        )
+    )
+
+
+async def record_finish(
+    session: AsyncSession,
+    *,
+    test_id: int,
+    telegram_id: int,
+    attempt_id: int,
+    status: str,
+    score: int,
+    total: int,
+    percent: int,
+    time_spent_sec: int,
+    finished_at: datetime,
+) -> None:
+    """Yakunlangan urinishni reyting va foydalanuvchi statistikasiga qo‘shadi. Commit chaqiruvchida."""
+    values = dict(
+        attempt_id=attempt_id,
+        score=score,
+        total=total,
+        percent=percent,
+        time_spent_sec=time_spent_sec,
+        finished_at=finished_at,
+    )
+    new_test = await _record_best(session, test_id, telegram_id, values)
+    await _user_stats_add(session, telegram_id, status, percent, new_test, finished_at)
+
+
+async def _record_best(session: AsyncSession, test_id: int, telegram_id: int, values: dict) -> bool:
+    """`test_best` va gistogramma. True — foydalanuvchi bu testni birinchi marta yakunladi."""
+    percent, time_spent_sec = values["percent"], values["time_spent_sec"]
+    key = (TestBest.test_id == test_id, TestBest.telegram_id == telegram_id)
+
+    q = await session.execute(select(TestBest.percent, TestBest.time_spent_sec).where(*key))
+    old = q.one_or_none()
+    if old is None:
+        ins = (
+            dialect_insert(TestBest.__table__)
+            .values(test_id=test_id, telegram_id=telegram_id, **values)
+            .on_conflict_do_nothing(index_elements=["test_id", "telegram_id"])
+        )
+        if (await session.execute(ins)).rowcount == 1:
+            await _hist_add(session, test_id, percent, 1)
+            return True
+        # parallel yakunlangan urinish qo‘shib ulgurdi — qayta solishtiramiz
+        old = (await session.execute(select(TestBest.percent, TestBest.time_spent_sec).where(*key))).one()
+
+    if (percent, -time_spent_sec) <= (old.percent, -old.time_spent_sec):
+        return False
+
+    await session.execute(
+        update(TestBest)
+        .where(*key)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    if percent != old.percent:
+        await _hist_add(session, test_id, old.percent, -1)
+        await _hist_add(session, test_id, percent, 1)
+    return False
+
+
+async def _hist_counts(session: AsyncSession, test_id: int, percent: int) -> tuple[int, int, int]:
+    """(kamroq, ko‘proq, jami) — berilgan foizga nisbatan ishtirokchilar soni."""
+    h = TestScoreHist
+    q = await session.execute(
+        select(
+            func.coalesce(func.sum(case((h.percent < percent, h.count), else_=0)), 0),
+            func.coalesce(func.sum(case((h.percent > percent, h.count), else_=0)), 0),
+            func.coalesce(func.sum(h.count), 0),
+        ).where(h.test_id == test_id)
+    )
+    below, above, total = q.one()
+    return int(below), int(above), int(total)
+
+
+async def better_than(session: AsyncSession, test_id: int, percent: int) -> int | None:
+    """Boshqa ishtirokchilarning necha foizidan yaxshiroq. None — solishtirishga hech kim yo‘q."""
+    below, _, total = await _hist_counts(session, test_id, percent)
+    # o‘zi ham gistogrammada (eng yaxshi natijasi >= percent), uni hisobga olmaymiz
+    others = total - 1
+    if others <= 0:
+        return None
+    return below * 100 // others
+
+
+async def participants(session: AsyncSession, test_id: int) -> int:
+    q = await session.execute(
+        select(func.coalesce(func.sum(TestScoreHist.count), 0)).where(TestScoreHist.test_id == test_id)
+    )
+    return int(q.scalar())
+
+
+async def user_rank(session: AsyncSession, test_id: int, telegram_id: int) -> tuple[int, int] | None:
+    """(o‘rin, foiz) — foydalanuvchining eng yaxshi natijasi bo‘yicha; teng foizlilar bir o‘rinda."""
+    q = await session.execute(
+        select(TestBest.percent).where(TestBest.test_id == test_id, TestBest.telegram_id == telegram_id)
+    )
+    percent = q.scalar_one_or_none()
+    if percent is None:
+        return None
+    _, above, _ = await _hist_counts(session, test_id, percent)
+    return above + 1, percent
+
+
+async def top(session: AsyncSession, test_id: int, limit: int = 10) -> list[TopRow]:
+    q = await session.execute(
+        select(User.full_name, TestBest.score, TestBest.total, TestBest.percent, TestBest.time_spent_sec)
+        .join(User, User.telegram_id == TestBest.telegram_id)
+        .where(TestBest.test_id == test_id)
+        .order_by(TestBest.percent.desc(), TestBest.time_spent_sec, TestBest.attempt_id)
+        .limit(limit)
+    )
+    return [TopRow(*row) for row in q.all()]
+
+
+async def get_user_stats(session: AsyncSession, telegram_id: int) -> UserStats | None:
+    return await session.get(UserStats, telegram_id)
+
+
+def user_stats_rebuild(telegram_ids=None, exclude_test_id: int | None = None):
+    """`attempts` (+ arxiv) dan `user_stats` qatorlarini qayta hisoblovchi INSERT ... SELECT (migratsiya, test o‘chirish)."""
+    parts = []
+    for model in (Attempt, AttemptArchive):
+        part = select(
+            model.telegram_id, model.test_id, model.status, model.percent,
+            func.coalesce(model.finished_at, model.started_at).label("at"),
+        ).where(model.status.in_(FINISHED_STATUSES))
+        if telegram_ids is not None:
+            part = part.where(model.telegram_id.in_(telegram_ids))
+        if exclude_test_id is not None:
+            part = part.where(model.test_id != exclude_test_id)
+        parts.append(part)
+    u = union_all(*parts).subquery()
+    q = select(
+        u.c.telegram_id,
+        func.count(),
+        func.sum(case((u.c.status == "timeout", 1), else_=0)),
+        func.sum(u.c.percent),
+        func.max(u.c.percent),
+        func.count(u.c.test_id.distinct()),
+        func.max(u.c.at),
+    ).group_by(u.c.telegram_id)
+    return insert(UserStats.__table__).from_select(
+        ["telegram_id", "attempts", "timeouts", "percent_sum", "best_percent", "tests", "last_finished_at"], q
+    )
+
+
+async def delete_test_stats(session: AsyncSession, test_id: int) -> None:
+    await session.execute(delete(TestBest).where(TestBest.test_id == test_id))
+    await session.execute(delete(TestScoreHist).where(TestScoreHist.test_id == test_id))
+
+    # shu testni ishlaganlarning yig‘masi testsiz qayta hisoblanadi (faqat ular, kam qator)
+    q = await session.execute(union(
+        select(Attempt.telegram_id).where(Attempt.test_id == test_id),
+        select(AttemptArchive.telegram_id).where(AttemptArchive.test_id == test_id),
+    ))
+    affected = q.scalars().all()
+    for i in range(0, len(affected), 500):
+        chunk = affected[i: i + 500]
+        await session.execute(delete(UserStats).where(UserStats.telegram_id.in_(chunk)))
+        await session.execute(user_stats_rebuild(chunk, exclude_test_id=test_id))
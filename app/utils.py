@@ -1,11 +1,11 @@
-import random
 from datetime import datetime
 
-def make_test_public_id() -> str:
-    return f"T{random.randint(10000, 99999)}"
-
 def now_utc() -> datetime:
     return datetime.utcnow()
 
 def seconds_between(a: datetime, b: datetime) -> int:
-    return int((b - a).total_seconds())
\ No newline at end of file
+    return int((b - a).total_seconds())
+
+def percent_of(score: int, total: int) -> int:
+    # butun sonlarda yarmini yuqoriga yaxlitlash (SQL'dagi ifoda bilan bir xil)
+    return (score * 200 + total) // (2 * total) if total > 0 else 0
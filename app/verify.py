@@ -0,0 +1,125 @@
+"""
+Sertifikatni tekshirish sahifasi: GET /verify/{serial}
+
+- Seriya raqamining HMAC imzosi bazaga murojaat qilmasdan tekshiriladi —
+  soxta/tasodifiy raqamlar bazaga yetib bormaydi.
+- Natija (topilgan ham, topilmagan ham) jarayon ichidagi LRU'da saqlanadi,
+  bir vaqtdagi bir xil so‘rovlar bitta DB so‘rovini kutadi. Link preview
+  crawler'lari mashhur sertifikatlarni qayta-qayta so‘rasa ham baza tinch qoladi.
+- Javob `Cache-Control`/`ETag` bilan qaytadi (sertifikat o‘zgarmaydi).
+- `?format=json` yoki `Accept: application/json` — JSON, aks holda HTML.
+"""
+from __future__ import annotations
+
+import asyncio
+import html
+
+from aiohttp import web
+from sqlalchemy import select
+
+from .cache import LRUCache
+from .certificates import parse_serial
+from .models import Certificate
+
+FOUND_MAX_AGE = 86400
+MISSING_MAX_AGE = 60
+
+_PAGE = """<!doctype html>
+<html lang="uz"><head><meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{title}</title>
+<style>body{{font-family:sans-serif;max-width:560px;margin:40px auto;padding:0 16px;color:#1f2933}}
+.ok{{color:#1a7f37}}.bad{{color:#b42318}}td{{padding:4px 12px 4px 0}}</style>
+</head><body>{body}</body></html>"""
+
+
+class CertificateVerifier:
+    def __init__(self, sessionmaker, secret: str, cache_size: int = 10_000, ttl: float = 600):
+        self.sessionmaker = sessionmaker
+        self.secret = secret
+        # serial -> ma'lumot; {} — imzo to‘g‘ri, lekin sertifikat berilmagan
+        self._cache: LRUCache[str, dict] = LRUCache(maxsize=cache_size, ttl=ttl)
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    async def _load(self, serial: str) -> dict:
+        async with self.sessionmaker() as session:
+            q = await session.execute(select(Certificate).where(Certificate.serial == serial))
+            cert = q.scalar_one_or_none()
+        if not cert:
+            return {}
+        return {
+            "serial": cert.serial,
+            "full_name": cert.full_name,
+            "test": cert.test_title,
+            "score": cert.score,
+            "total": cert.total,
+            "percent": cert.percent,
+            "issued_at": cert.issued_at.date().isoformat(),
+        }
+
+    async def lookup(self, serial: str) -> dict | None:
+        """None — imzo noto‘g‘ri; {} — sertifikat topilmadi."""
+        serial = (serial or "").strip().upper()
+        if parse_serial(self.secret, serial) is None:
+            return None
+
+        data = self._cache.get(serial)
+        if data is not None:
+            return data
+
+        fut = self._inflight.get(serial)
+        if fut is not None:
+            return await asyncio.shield(fut)
+
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[serial] = fut
+        try:
+            data = await self._load(serial)
+            self._cache.set(serial, data)
+            fut.set_result(data)
+            return data
+        except BaseException as e:
+            fut.set_exception(e)
+            fut.exception()  # kutuvchi bo‘lmasa "never retrieved" ogohlantirishi chiqmasin
+            raise
+        finally:
+            del self._inflight[serial]
+
+    async def handle(self, request: web.Request) -> web.Response:
+        serial = request.match_info["serial"].strip().upper()
+        data = await self.lookup(serial)
+        found = bool(data)
+
+        etag = f'"{serial}:{int(found)}"'
+        headers = {
+            "Cache-Control": f"public, max-age={FOUND_MAX_AGE if found else MISSING_MAX_AGE}",
+            "ETag": etag,
+        }
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers=headers)
+
+        status = 200 if found else 404
+        wants_json = request.query.get("format") == "json" or "application/json" in request.headers.get("Accept", "")
+        if wants_json:
+            return web.json_response({"valid": found, **(data or {})}, status=status, headers=headers)
+        return web.Response(text=_render_html(serial, data), content_type="text/html", status=status, headers=headers)
+
+
+def _render_html(serial: str, data: dict | None) -> str:
+    if not data:
+        body = (
+            f"<h2 class=bad>❌ Sertifikat topilmadi</h2>"
+            f"<p>Seriya raqami: <b>{html.escape(serial)}</b></p>"
+        )
+        return _PAGE.format(title="Sertifikat topilmadi", body=body)
+
+    rows = [
+        ("F.I.Sh.", data["full_name"]),
+        ("Test", data["test"]),
+        ("Natija", f"{data['score']}/{data['total']} ({data['percent']}%)"),
+        ("Sana", data["issued_at"]),
+        ("Seriya raqami", data["serial"]),
+    ]
+    table = "".join(f"<tr><td>{k}</td><td><b>{html.escape(str(v))}</b></td></tr>" for k, v in rows)
+    body = f"<h2 class=ok>✅ Sertifikat haqiqiy</h2><table>{table}</table>"
+    return _PAGE.format(title="Sertifikat haqiqiy", body=body)
@@ -0,0 +1,150 @@
+"""
+DB profilini alohida o‘lchash: bot/handler'larsiz, faqat engine + SQLite fayl.
+
+Yozuvchilar imtihondagi javob tranzaksiyasini takrorlaydi (answers'ga INSERT +
+attempts'da UPDATE + commit), o‘quvchilar bir vaqtda urinishni o‘qiydi.
+Natija: commit/sek, yozish va o‘qish latency (p50/p99), "database is locked" soni.
+
+    python -m bench.dbprofile --profile default
+    python -m bench.dbprofile --profile tuned --writers 20 --readers 20
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import OperationalError
+
+from app.db import EngineProfile, create_tables, get_engine, init_engine
+from app.models import Answer, Attempt, Question, Test, User
+
+
+def _percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def _seed(sessionmaker, attempts: int, questions: int) -> tuple[list[int], list[int]]:
+    now = datetime.now(timezone.utc)
+    async with sessionmaker() as session:
+        test = Test(public_id="T00001", title="Bench", duration_sec=3600, created_by_admin_id=1)
+        session.add(test)
+        await session.flush()
+        qs = [
+            Question(
+                test_id=test.id, order_index=i, q_text="?", a_text="a", b_text="b",
+                c_text="c", d_text="d", correct="A",
+            )
+            for i in range(1, questions + 1)
+        ]
+        session.add_all(qs)
+        atts = []
+        for i in range(attempts):
+            session.add(User(telegram_id=10_000 + i, full_name=f"u{i}", phone="0"))
+            atts.append(Attempt(
+                test_id=test.id, telegram_id=10_000 + i, started_at=now,
+                total=questions, status="in_progress",
+            ))
+        session.add_all(atts)
+        await session.commit()
+        return [a.id for a in atts], [q.id for q in qs]
+
+
+async def run(args) -> dict:
+    path = tempfile.mktemp(suffix=".sqlite3", dir=args.dir or None)
+    profile = EngineProfile(tuned=args.profile == "tuned")
+    sessionmaker = init_engine(f"sqlite+aiosqlite:///{path}", profile)
+    await create_tables()
+    attempt_ids, question_ids = await _seed(sessionmaker, args.writers, args.questions)
+
+    write_lat: list[float] = []
+    read_lat: list[float] = []
+    locked = 0
+    stop = asyncio.Event()
+
+    async def writer(attempt_id: int) -> None:
+        nonlocal locked
+        for question_id in question_ids:
+            start = time.perf_counter()
+            try:
+                async with sessionmaker() as session:
+                    session.add(Answer(attempt_id=attempt_id, question_id=question_id, chosen="A", is_correct=True))
+                    await session.execute(
+                        update(Attempt).where(Attempt.id == attempt_id).values(score=Attempt.score + 1)
+                    )
+                    await session.commit()
+            except OperationalError:
+                locked += 1
+                continue
+            write_lat.append(time.perf_counter() - start)
+
+    async def reader() -> None:
+        nonlocal locked
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                async with sessionmaker() as session:
+                    await session.execute(select(Attempt).where(Attempt.id == random.choice(attempt_ids)))
+            except OperationalError:
+                locked += 1
+                continue
+            read_lat.append(time.perf_counter() - start)
+
+    readers = [asyncio.create_task(reader()) for _ in range(args.readers)]
+    start = time.perf_counter()
+    await asyncio.gather(*(writer(a) for a in attempt_ids))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await asyncio.gather(*readers)
+    await get_engine().dispose()
+
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    return {
+        "profile": args.profile,
+        "writers": args.writers,
+        "readers": args.readers,
+        "commits": len(write_lat),
+        "commits_per_sec": round(len(write_lat) / elapsed, 1),
+        "write_p50_ms": round(_percentile(write_lat, 0.50) * 1000, 2),
+        "write_p99_ms": round(_percentile(write_lat, 0.99) * 1000, 2),
+        "reads_per_sec": round(len(read_lat) / elapsed, 1),
+        "read_p50_ms": round(_percentile(read_lat, 0.50) * 1000, 2),
+        "read_p99_ms": round(_percentile(read_lat, 0.99) * 1000, 2),
+        "locked": locked,
+    }
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description="SQLite engine profili benchmarki")
+    p.add_argument("--profile", choices=("tuned", "default"), default="tuned")
+    p.add_argument("--writers", type=int, default=20)
+    p.add_argument("--readers", type=int, default=10)
+    p.add_argument("--questions", type=int, default=50, help="har bir yozuvchi uchun commit'lar")
+    p.add_argument("--dir", default="", help="DB fayl katalogi (standart: tizim temp)")
+    p.add_argument("--json", action="store_true")
+    args = p.parse_args()
+    random.seed(1)
+
+    result = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(result))
+        return
+    width = max(len(k) for k in result)
+    for key, value in result.items():
+        print(f"{key:<{width}}  {value}")
+
+
+if __name__ == "__main__":
+    main()